@@ -0,0 +1,214 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.views import View
+from rest_framework import status
+
+from .authentication import TokenExpired, aresolve_token
+from .conditional import aall_post_etag, auser_data_etag, not_modified, set_etag
+from .feed_cache import FEED_ROW_FIELDS, aget_public_page, apost_rows, merge_rows, private_posts
+from .like_buffer import get_like_buffer
+from .likes import aset_like
+from .models import Like, Post
+from .pagination import InvalidPage, build_page, decode_id_cursor, get_page_size
+from .serializers import InvalidFields, PostSerializer, UserSerializer, parse_fields
+from .streaming import json_response
+from .user_stats import aget_stats, stats_data
+
+
+class AsyncTokenView(View):
+    """
+    Base class for native async endpoints served through blog_project/asgi.py.
+
+    Mirrors TokenAPIView: same Token header, same 400/401 bodies and the same
+    compact JSON, but runs on the event loop and resolves the token with the
+    async ORM.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Token authenticated like the DRF views, which are CSRF exempt too
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            return await self.http_method_not_allowed(request, *args, **kwargs)
+
+        # Check if token is present in the request header
+        token = request.headers.get('Token')
+        if not token:
+            return json_response({
+                "status": 400,
+                "message": "Token is required in the request header"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            custom_token = await aresolve_token(token)
+        except TokenExpired:
+            return json_response({
+                "status": 401,
+                "message": "Token has expired"
+            }, status=status.HTTP_401_UNAUTHORIZED)
+        if custom_token is None:
+            return json_response({
+                "status": 401,
+                "message": "Invalid token"
+            }, status=status.HTTP_401_UNAUTHORIZED)
+
+        request.user = custom_token.user
+        request.auth = custom_token
+        return await handler(request, *args, **kwargs)
+
+
+# get all post
+class AsyncPostListView(AsyncTokenView):
+    async def get(self, request):
+        user = request.user
+
+        try:
+            last_id = decode_id_cursor(request.GET.get('cursor'))
+            page_size = get_page_size(request.GET)
+            fields = parse_fields(request.GET.get('fields'), FEED_ROW_FIELDS)
+        except (InvalidPage, InvalidFields) as e:
+            return json_response({
+                "status": 400,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        etag = await aall_post_etag(user, last_id, page_size, fields)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        public_rows, public_total = await aget_public_page(last_id, page_size + 1, fields)
+        own_private = private_posts(user)
+        private_rows = await apost_rows(own_private, last_id, page_size + 1, fields)
+        total_post = public_total + await own_private.acount()
+
+        posts_data, next_cursor = build_page(merge_rows(public_rows, private_rows, page_size + 1), page_size)
+        like_buffer = get_like_buffer()
+        if like_buffer is not None:
+            like_buffer.apply_pending_counts(posts_data, 'likes_count')
+
+        return set_etag(json_response({
+            "status": status.HTTP_200_OK,
+            "message": "Posts fetched successfully",
+            "total_post": total_post,
+            "data": posts_data,
+            "next": next_cursor
+        }), etag)
+
+
+# show a specific user data
+class AsyncUserDataView(AsyncTokenView):
+    async def get(self, request):
+        user = request.user
+
+        if not user.is_active:
+            return json_response({
+                "status": 404,
+                "message": "User not found"
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            fields = parse_fields(request.GET.get('fields'), PostSerializer.Meta.fields)
+        except InvalidFields as e:
+            return json_response({
+                "status": 400,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        etag = await auser_data_etag(user, fields)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        max_posts = getattr(settings, 'USER_DATA_MAX_POSTS', 100)
+        user_posts = Post.objects.filter(user=user, is_active=True).only(
+            *PostSerializer.source_fields(fields)
+        ).order_by('-id')[:max_posts]
+
+        posts_data = PostSerializer([post async for post in user_posts], many=True, fields=fields).data
+        like_buffer = get_like_buffer()
+        if like_buffer is not None:
+            like_buffer.apply_pending_counts(posts_data, 'total_likes')
+
+        return set_etag(json_response({
+            "status": status.HTTP_200_OK,
+            "message": "User data fetched successfully",
+            "user": UserSerializer(user).data,
+            "stats": stats_data(await aget_stats(user)),
+            "posts": posts_data
+        }), etag)
+
+
+#add like
+class AsyncLikeView(AsyncTokenView):
+    async def post(self, request):
+        user = request.user
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return json_response({
+                "status": 400,
+                "message": "Request body must be a JSON object"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Check if required fields are present
+        required_fields = ['like', 'post_id']
+        missing_fields = [field for field in required_fields if field not in data]
+
+        if missing_fields:
+            return json_response({
+                "status": 400,
+                "message": f"{', '.join(missing_fields)} {'is' if len(missing_fields) == 1 else 'are'} required fields"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        like = data.get('like')
+        post_id = data.get('post_id')
+
+        # Check if the post exists
+        try:
+            post = await Post.objects.only('id').aget(pk=post_id)
+        except (Post.DoesNotExist, ValueError, TypeError):
+            return json_response({
+                "status": 400,
+                "message": "Post does not exist"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Check if the like value is valid
+        if not isinstance(like, bool):
+            return json_response({
+                "status": 400,
+                "message": "Invalid value for 'like'. It should be a boolean (True/False)"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        like_buffer = get_like_buffer()
+        try:
+            if like_buffer is not None:
+                stored_like = False
+                if like_buffer.pending_like(user.id, post.id) is None:
+                    stored_like = bool(
+                        await Like.objects.filter(post_id=post.id, user_id=user.id)
+                        .values_list('like', flat=True).afirst()
+                    )
+                # The spool write fsyncs, which must not block the event loop
+                await sync_to_async(like_buffer.add, thread_sensitive=False)(user.id, post.id, like, stored_like)
+            else:
+                await aset_like(post.id, user.id, like)
+            return json_response({
+                "status": 200,
+                "message": "Like updated successfully"
+            })
+        except Exception as e:
+            return json_response({
+                "status": 500,
+                "message": f"An error occurred: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,224 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import CustomToken
+
+
+class TokenCache:
+    """
+    In-process LRU cache of resolved tokens.
+
+    Entries hold the CustomToken together with its User (fetched in one
+    joined query) and expire after `ttl` seconds. Callers always get copies,
+    so a view mutating `request.user` never leaks into other requests.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            custom_token, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._discard(token)
+                return None
+            self._entries.move_to_end(token)
+        custom_token = copy.copy(custom_token)
+        custom_token.user = copy.copy(custom_token.user)
+        return custom_token
+
+    def set(self, custom_token):
+        token = custom_token.token
+        with self._lock:
+            self._entries[token] = (custom_token, time.monotonic() + self.ttl)
+            self._entries.move_to_end(token)
+            self._tokens_by_user[custom_token.user_id] = token
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+
+    def touch(self, token, last_used_at):
+        """Record a renewal on the cached entry so this process does not renew again."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                entry[0].last_used_at = last_used_at
+
+    def discard(self, token):
+        with self._lock:
+            self._discard(token)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            token = self._tokens_by_user.get(user_id)
+            if token is not None:
+                self._discard(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _discard(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            user_id = entry[0].user_id
+            if self._tokens_by_user.get(user_id) == token:
+                del self._tokens_by_user[user_id]
+
+
+token_cache = TokenCache(
+    maxsize=getattr(settings, 'TOKEN_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'TOKEN_CACHE_TTL', 60),
+)
+
+
+class TokenExpired(Exception):
+    pass
+
+
+def is_expired(custom_token, now):
+    """
+    Check TOKEN_ABSOLUTE_TTL (since the token was issued) and
+    TOKEN_SLIDING_TTL (since its last renewal) against the loaded token;
+    either setting may be None to disable it.
+    """
+    absolute_ttl = getattr(settings, 'TOKEN_ABSOLUTE_TTL', None)
+    if absolute_ttl is not None and custom_token.created_at <= now - timedelta(seconds=absolute_ttl):
+        return True
+    sliding_ttl = getattr(settings, 'TOKEN_SLIDING_TTL', None)
+    if sliding_ttl is not None and custom_token.last_used_at <= now - timedelta(seconds=sliding_ttl):
+        return True
+    return False
+
+
+def renewal_cutoff(custom_token, now):
+    """Return the cutoff for a due sliding renewal of `custom_token`, or None."""
+    if getattr(settings, 'TOKEN_SLIDING_TTL', None) is None:
+        return None
+    cutoff = now - timedelta(seconds=getattr(settings, 'TOKEN_RENEWAL_INTERVAL', 300))
+    return cutoff if custom_token.last_used_at <= cutoff else None
+
+
+def fetch_token(token):
+    tokens = CustomToken.objects.select_related('user')
+    try:
+        custom_token = tokens.get(token=token)
+    except CustomToken.DoesNotExist:
+        custom_token = None
+    # A token created or renewed moments ago may not have reached a read
+    # replica yet
+    if tokens.db != DEFAULT_DB_ALIAS and (custom_token is None or is_expired(custom_token, timezone.now())):
+        try:
+            custom_token = tokens.using(DEFAULT_DB_ALIAS).get(token=token)
+        except CustomToken.DoesNotExist:
+            return None
+    return custom_token
+
+
+def resolve_token(token):
+    """
+    Return the CustomToken (with its user loaded) for `token`, or None.
+
+    Expiry is checked on the token already in hand, so it costs no query.
+    Raises TokenExpired for an expired token; one that looks expired in the
+    cache is re-read first, since another process may have renewed it.
+    """
+    now = timezone.now()
+    custom_token = token_cache.get(token)
+    if custom_token is None or is_expired(custom_token, now):
+        custom_token = fetch_token(token)
+        if custom_token is None:
+            token_cache.discard(token)
+            return None
+        if is_expired(custom_token, now):
+            token_cache.discard(token)
+            raise TokenExpired()
+        token_cache.set(custom_token)
+        custom_token = token_cache.get(token)
+
+    cutoff = renewal_cutoff(custom_token, now)
+    if cutoff is not None:
+        # Conditional, so workers renewing the same token write it once
+        CustomToken.objects.filter(pk=custom_token.pk, last_used_at__lte=cutoff).update(last_used_at=now)
+        custom_token.last_used_at = now
+        token_cache.touch(token, now)
+    return custom_token
+
+
+class CustomTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates requests carrying a `Token` header against CustomToken.
+
+    Requests without the header are left anonymous so the view can decide how
+    to answer them; an unknown token fails authentication with a 401.
+    """
+
+    def authenticate(self, request):
+        token = request.headers.get('Token')
+        if not token:
+            return None
+
+        try:
+            custom_token = resolve_token(token)
+        except TokenExpired:
+            raise AuthenticationFailed('Token has expired')
+        if custom_token is None:
+            raise AuthenticationFailed('Invalid token')
+        return (custom_token.user, custom_token)
+
+    def authenticate_header(self, request):
+        return 'Token'
+
+
+async def afetch_token(token):
+    tokens = CustomToken.objects.select_related('user')
+    try:
+        custom_token = await tokens.aget(token=token)
+    except CustomToken.DoesNotExist:
+        custom_token = None
+    if tokens.db != DEFAULT_DB_ALIAS and (custom_token is None or is_expired(custom_token, timezone.now())):
+        try:
+            custom_token = await tokens.using(DEFAULT_DB_ALIAS).aget(token=token)
+        except CustomToken.DoesNotExist:
+            return None
+    return custom_token
+
+
+async def aresolve_token(token):
+    """Async variant of resolve_token() for native async views."""
+    now = timezone.now()
+    custom_token = token_cache.get(token)
+    if custom_token is None or is_expired(custom_token, now):
+        custom_token = await afetch_token(token)
+        if custom_token is None:
+            token_cache.discard(token)
+            return None
+        if is_expired(custom_token, now):
+            token_cache.discard(token)
+            raise TokenExpired()
+        token_cache.set(custom_token)
+        custom_token = token_cache.get(token)
+
+    cutoff = renewal_cutoff(custom_token, now)
+    if cutoff is not None:
+        await CustomToken.objects.filter(pk=custom_token.pk, last_used_at__lte=cutoff).aupdate(last_used_at=now)
+        custom_token.last_used_at = now
+        token_cache.touch(token, now)
+    return custom_token
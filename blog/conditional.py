@@ -0,0 +1,99 @@
+import hashlib
+
+from django.db.models import Count, Max, Q, Sum
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .feed_cache import aget_feed_version, get_feed_version, private_posts
+from .like_buffer import get_like_buffer
+from .models import User
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha256(repr(parts).encode()).hexdigest()[:32])
+
+
+def like_counts_version():
+    # Likes buffered in this process are merged into the responses it serves
+    like_buffer = get_like_buffer()
+    return None if like_buffer is None else like_buffer.counts_version
+
+
+def representation(last_id=None, page_size=None, fields=None, stream=False):
+    # Each page, field subset and the streamed body are separate representations
+    return (last_id, page_size, tuple(sorted(fields)) if fields else None, bool(stream))
+
+
+def post_state(**extra):
+    # Aggregates that change when a post is added, edited or deactivated
+    return {'count': Count('id'), 'last_update': Max('updated_at'), **extra}
+
+
+def all_post_etag(user, last_id=None, page_size=None, fields=None, stream=False):
+    """
+    Validator for one all_post page, from the feed version (bumped by every
+    post and like write, and the key of the cached public pages) plus one
+    aggregate over the caller's own private posts.
+    """
+    own = private_posts(user).aggregate(**post_state())
+    return make_etag(
+        'all_post', user.id, representation(last_id, page_size, fields, stream),
+        get_feed_version(), own['count'], own['last_update'], like_counts_version()
+    )
+
+
+async def aall_post_etag(user, last_id=None, page_size=None, fields=None):
+    own = await private_posts(user).aaggregate(**post_state())
+    return make_etag(
+        'all_post', user.id, representation(last_id, page_size, fields),
+        await aget_feed_version(), own['count'], own['last_update'], like_counts_version()
+    )
+
+
+def user_state():
+    # Aggregates over the user row joined to its active posts. updated_at is
+    # read here rather than from the token cache, whose copy of the user can
+    # lag behind an update made through another worker for TOKEN_CACHE_TTL.
+    active = Q(post__is_active=True)
+    return {
+        'updated_at': Max('updated_at'),
+        'count': Count('post', filter=active),
+        'last_update': Max('post__updated_at', filter=active),
+        'likes': Sum('post__like_count', filter=active),
+    }
+
+
+def user_data_etag(user, fields=None):
+    """
+    Validator for user_data, from the feed version and one aggregate over
+    the user row and the caller's active posts, so edits made without
+    bumping the feed version are still noticed.
+    """
+    own = User.objects.filter(pk=user.pk).aggregate(**user_state())
+    return make_etag(
+        'user_data', user.id, representation(fields=fields), own['updated_at'], get_feed_version(),
+        own['count'], own['last_update'], own['likes'], like_counts_version()
+    )
+
+
+async def auser_data_etag(user, fields=None):
+    own = await User.objects.filter(pk=user.pk).aaggregate(**user_state())
+    return make_etag(
+        'user_data', user.id, representation(fields=fields), own['updated_at'], await aget_feed_version(),
+        own['count'], own['last_update'], own['likes'], like_counts_version()
+    )
+
+
+def not_modified(request, etag):
+    """Return a 304 response when the request's If-None-Match matches `etag`, else None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        set_etag(response, etag)
+    return response
+
+
+def set_etag(response, etag):
+    response.headers['ETag'] = etag
+    # Responses differ per Token
+    patch_vary_headers(response, ('Token',))
+    return response
@@ -0,0 +1,81 @@
+import contextvars
+import itertools
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_pinned_to_primary = contextvars.ContextVar('blog_pinned_to_primary', default=False)
+_round_robin = itertools.count()
+
+_health = {}  # alias -> (healthy, checked_at)
+_health_lock = threading.Lock()
+
+
+def pin_to_primary(pinned=True):
+    """Send this request's reads to the primary; returns a token for unpin()."""
+    return _pinned_to_primary.set(pinned)
+
+
+def unpin(token):
+    _pinned_to_primary.reset(token)
+
+
+def is_pinned_to_primary():
+    return _pinned_to_primary.get()
+
+
+def replica_is_healthy(alias):
+    """Cached connectivity check; a replica that fails it is skipped for a while."""
+    interval = getattr(settings, 'REPLICA_HEALTH_CHECK_INTERVAL', 10)
+    now = time.monotonic()
+    healthy, checked_at = _health.get(alias, (None, 0.0))
+    if healthy is not None and now - checked_at < interval:
+        return healthy
+
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        healthy = True
+    except Exception:
+        healthy = False
+    with _health_lock:
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+def reset_replica_health():
+    with _health_lock:
+        _health.clear()
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads to the DATABASE_REPLICAS aliases and writes to the primary.
+
+    Reads stay on the primary while the request is pinned to it (see
+    ReadYourWritesMiddleware), inside transactions, and whenever no replica
+    passes its health check.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or is_pinned_to_primary():
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction must see the transaction's own writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        start = next(_round_robin)
+        for offset in range(len(replicas)):
+            alias = replicas[(start + offset) % len(replicas)]
+            if replica_is_healthy(alias):
+                return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
@@ -0,0 +1,152 @@
+import heapq
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F, Q
+
+from .models import Post
+
+FEED_VERSION_KEY = 'blog:feed:version'
+FEED_FIELDS = ('id', 'title', 'description', 'content')
+# Keys of a feed row, in order; any subset can be asked for with fields=
+FEED_ROW_FIELDS = FEED_FIELDS + ('likes_count',)
+
+
+def get_feed_cache():
+    return caches[getattr(settings, 'FEED_CACHE_ALIAS', 'default')]
+
+
+def get_feed_version():
+    cache = get_feed_cache()
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        # Start from the clock rather than 1, so a version key that got
+        # evicted never comes back as a version that still has entries.
+        cache.add(FEED_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(FEED_VERSION_KEY)
+    return version
+
+
+async def aget_feed_version():
+    cache = get_feed_cache()
+    version = await cache.aget(FEED_VERSION_KEY)
+    if version is None:
+        await cache.aadd(FEED_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = await cache.aget(FEED_VERSION_KEY)
+    return version
+
+
+def bump_feed_version():
+    """Invalidate every cached public feed page; call after post or like writes."""
+    cache = get_feed_cache()
+    try:
+        cache.incr(FEED_VERSION_KEY)
+    except ValueError:
+        get_feed_version()
+
+
+async def abump_feed_version():
+    cache = get_feed_cache()
+    try:
+        await cache.aincr(FEED_VERSION_KEY)
+    except ValueError:
+        await aget_feed_version()
+
+
+def visible_posts(user):
+    return Post.objects.filter(Q(is_active=True) & (Q(user_id=user) | Q(private=False)))
+
+
+def public_posts():
+    return Post.objects.filter(is_active=True, private=False)
+
+
+def private_posts(user):
+    # Own posts that public_posts() leaves out (private is nullable)
+    return Post.objects.filter(user=user, is_active=True).exclude(private=False)
+
+
+def post_rows_queryset(queryset, last_id, limit, fields=None):
+    """Feed rows below `last_id`, reading only the columns behind `fields`."""
+    fields = fields or FEED_ROW_FIELDS
+    if last_id is not None:
+        queryset = queryset.filter(id__lt=last_id)
+    columns = [name for name in fields if name in FEED_FIELDS]
+    annotations = {'likes_count': F('like_count')} if 'likes_count' in fields else {}
+    return queryset.order_by('-id').values(*columns, **annotations)[:limit]
+
+
+def post_rows(queryset, last_id, limit, fields=None):
+    return list(post_rows_queryset(queryset, last_id, limit, fields))
+
+
+async def apost_rows(queryset, last_id, limit, fields=None):
+    return [row async for row in post_rows_queryset(queryset, last_id, limit, fields)]
+
+
+def merge_rows(public_rows, private_rows, limit):
+    """Merge the public and own-private rows, both ordered by `-id`."""
+    rows = heapq.merge(public_rows, private_rows, key=lambda row: -row['id'])
+    return list(islice(rows, limit))
+
+
+def public_page_key(version, last_id, limit, fields):
+    key = f'blog:feed:{version}:public:{last_id or 0}:{limit}'
+    if fields and tuple(fields) != FEED_ROW_FIELDS:
+        key += ':' + ','.join(fields)
+    return key
+
+
+def get_public_page(last_id, limit, fields=None):
+    """
+    Return up to `limit` public feed rows below `last_id` and the public total.
+
+    Both are shared by every caller and cached under the current feed
+    version, so they are recomputed only after a post or like write. Each
+    `fields` subset is cached separately. Misses are read from the primary:
+    a lagging replica would otherwise cache a page from before the write that
+    bumped the version, for every caller, until FEED_CACHE_TIMEOUT.
+    """
+    cache = get_feed_cache()
+    timeout = getattr(settings, 'FEED_CACHE_TIMEOUT', 300)
+    version = get_feed_version()
+
+    page_key = public_page_key(version, last_id, limit, fields)
+    count_key = f'blog:feed:{version}:public_count'
+    cached = cache.get_many([page_key, count_key])
+
+    rows = cached.get(page_key)
+    if rows is None:
+        rows = post_rows(public_posts().using(DEFAULT_DB_ALIAS), last_id, limit, fields)
+        cache.set(page_key, rows, timeout)
+
+    total = cached.get(count_key)
+    if total is None:
+        total = public_posts().using(DEFAULT_DB_ALIAS).count()
+        cache.set(count_key, total, timeout)
+    return rows, total
+
+
+async def aget_public_page(last_id, limit, fields=None):
+    """Async variant of get_public_page()."""
+    cache = get_feed_cache()
+    timeout = getattr(settings, 'FEED_CACHE_TIMEOUT', 300)
+    version = await aget_feed_version()
+
+    page_key = public_page_key(version, last_id, limit, fields)
+    count_key = f'blog:feed:{version}:public_count'
+    cached = await cache.aget_many([page_key, count_key])
+
+    rows = cached.get(page_key)
+    if rows is None:
+        rows = await apost_rows(public_posts().using(DEFAULT_DB_ALIAS), last_id, limit, fields)
+        await cache.aset(page_key, rows, timeout)
+
+    total = cached.get(count_key)
+    if total is None:
+        total = await public_posts().using(DEFAULT_DB_ALIAS).acount()
+        await cache.aset(count_key, total, timeout)
+    return rows, total
@@ -0,0 +1,72 @@
+import threading
+from concurrent import futures
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class HashingPoolBusy(Exception):
+    pass
+
+
+class PasswordHashingPool:
+    """
+    Bounded worker pool for password hashing.
+
+    At most `workers` hashes run at once and at most `queue_size` more may
+    wait for a worker; anything beyond that is refused with HashingPoolBusy
+    instead of piling up request threads behind PBKDF2.
+    """
+
+    def __init__(self, workers=2, queue_size=8, timeout=10):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created lazily so forked WSGI workers each start their own threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = futures.ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix='password-hashing',
+                    )
+        return self._executor
+
+    def make_password(self, raw_password):
+        return self._run(make_password, raw_password)
+
+    def check_password(self, raw_password, encoded, setter=None):
+        """
+        Like django.contrib.auth.hashers.check_password(), but `setter` is
+        called on the calling thread, so it saves through the request's
+        database connection rather than the worker's.
+        """
+        outdated = []
+        valid = self._run(check_password, raw_password, encoded, outdated.append)
+        if valid and outdated and setter is not None:
+            setter(raw_password)
+        return valid
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolBusy()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except futures.TimeoutError:
+            raise HashingPoolBusy()
+
+password_hashing_pool = PasswordHashingPool(
+    workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 2),
+    queue_size=getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', 8),
+    timeout=getattr(settings, 'PASSWORD_HASHING_TIMEOUT', 10),
+)
@@ -0,0 +1,315 @@
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .likes import upsert_likes, writable_likes
+
+logger = logging.getLogger(__name__)
+
+
+class LikeBuffer:
+    """
+    Write-behind buffer for likes.
+
+    Accepted likes are kept per (user_id, post_id), so the last write wins,
+    and appended to a spool file (fsynced) before they are acknowledged. A
+    background thread flushes them to the database with upsert_likes() when
+    `max_pending` entries are waiting or every `flush_interval` seconds, then
+    rewrites the spool with whatever is still pending.
+
+    Each entry also remembers the like value the database had when it was
+    first buffered, so read paths can add the pending like_count changes on
+    top of what they read (see pending_count_delta()). Only this process
+    sees them: other workers read the likes once they are flushed.
+
+    Entries whose post or user was deleted before the flush are dropped. If
+    writing the rest fails, they are retried post by post, so one entry
+    that cannot be written does not hold back the others.
+    """
+
+    def __init__(self, spool_dir, max_pending=500, flush_interval=1.0, fsync=True):
+        self.spool_dir = Path(spool_dir)
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.spool_path = self.spool_dir / f'likes-{os.getpid()}.ndjson'
+
+        self._entries = {}  # (user_id, post_id) -> [like, like value in the database]
+        self._post_deltas = {}  # post_id -> pending like_count change
+        self.counts_version = 0  # bumped whenever _post_deltas changes (see blog.conditional)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._spool = None
+        self._thread = None
+        self._stopped = False
+
+        self.flushed = 0
+        self.dropped = 0
+        self.last_flush_at = None
+        self.last_error = None
+
+    # -- lifecycle --------------------------------------------------------
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+            self._spool = open(self.spool_path, 'a', encoding='utf-8')
+            fcntl.flock(self._spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # A process that died with the same pid (common after a container
+            # restart) left its entries in our own spool; keep them before
+            # the spool is rewritten below
+            for entry in read_spool(self.spool_path):
+                self._remember(*entry)
+            claims, entries = claim_orphaned_spools(self.spool_dir, exclude=self.spool_path)
+            for entry in entries:
+                self._remember(*entry)
+            self._rewrite_spool()
+            release_spools(claims)
+            self._thread = threading.Thread(target=self._run, name='like-buffer', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            close_old_connections()
+
+    # -- writes -----------------------------------------------------------
+
+    def add(self, user_id, post_id, like, stored_like):
+        """
+        Buffer `like` for (user_id, post_id); `stored_like` is the value the
+        database currently holds for that pair (False if there is no row).
+        """
+        self.add_many({(user_id, post_id): like}, {(user_id, post_id): stored_like})
+
+    def add_many(self, likes, stored_likes):
+        """
+        Buffer every like in `likes` ((user_id, post_id) -> like) with one
+        spool write. `stored_likes` holds the database values of the pairs
+        that are not pending yet; missing pairs have no row (False).
+        """
+        if self._thread is None:
+            self.start()
+        entries = [
+            (user_id, post_id, like, stored_likes.get((user_id, post_id), False))
+            for (user_id, post_id), like in likes.items()
+        ]
+        with self._lock:
+            self._append_spool(entries)
+            for entry in entries:
+                self._remember(*entry)
+            if len(self._entries) >= self.max_pending:
+                self._wakeup.set()
+
+    def _remember(self, user_id, post_id, like, stored_like):
+        key = (user_id, post_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [stored_like, stored_like]
+        self._change_delta(post_id, int(like) - int(entry[0]))
+        entry[0] = like
+
+    def _change_delta(self, post_id, change):
+        if not change:
+            return
+        self.counts_version += 1
+        delta = self._post_deltas.get(post_id, 0) + change
+        if delta:
+            self._post_deltas[post_id] = delta
+        else:
+            del self._post_deltas[post_id]
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch = {key: entry[0] for key, entry in self._entries.items()}
+            if not batch:
+                return 0
+            try:
+                writable = writable_likes(batch)
+            except Exception as e:
+                self._failed(e, batch)
+                return 0
+            written = self._write(writable)
+
+            with self._lock:
+                for key in batch.keys() - writable.keys():
+                    # The post or user is gone, so the like can never be written
+                    entry = self._entries.pop(key)
+                    self._change_delta(key[1], int(entry[1]) - int(entry[0]))
+                for key, flushed_like in written.items():
+                    entry = self._entries[key]
+                    # Drop what the database now holds; anything liked again
+                    # since the snapshot stays pending on the new base value
+                    self._change_delta(key[1], int(entry[1]) - int(flushed_like))
+                    entry[1] = flushed_like
+                    if entry[0] == flushed_like:
+                        del self._entries[key]
+                self._rewrite_spool()
+            self.flushed += len(written)
+            self.dropped += len(batch) - len(writable)
+            self.last_flush_at = time.time()
+            if len(written) == len(writable):
+                self.last_error = None
+            return len(written)
+
+    def _write(self, likes):
+        """Write `likes` with upsert_likes() and return the entries that were written."""
+        if not likes:
+            return {}
+        try:
+            upsert_likes(likes)
+            return likes
+        except Exception as e:
+            self._failed(e, likes)
+        by_post = {}
+        for key, like in likes.items():
+            by_post.setdefault(key[1], {})[key] = like
+        if len(by_post) == 1:
+            return {}
+        written = {}
+        for group in by_post.values():
+            try:
+                upsert_likes(group)
+            except Exception as e:
+                # Stays pending and is tried again on the next flush
+                self._failed(e, group)
+                continue
+            written.update(group)
+        return written
+
+    def _failed(self, error, likes):
+        self.last_error = f"{type(error).__name__}: {error}"
+        logger.exception("Flushing %d buffered likes failed", len(likes))
+
+    # -- spool ------------------------------------------------------------
+
+    def _append_spool(self, entries):
+        self._spool.write(''.join(json.dumps(list(entry)) + '\n' for entry in entries))
+        self._spool.flush()
+        if self.fsync:
+            os.fsync(self._spool.fileno())
+
+    def _rewrite_spool(self):
+        # Truncate in place so the flock held on the file is kept
+        self._spool.seek(0)
+        self._spool.truncate()
+        for (user_id, post_id), (like, stored_like) in self._entries.items():
+            self._spool.write(json.dumps([user_id, post_id, like, stored_like]) + '\n')
+        self._spool.flush()
+        if self.fsync:
+            os.fsync(self._spool.fileno())
+
+    # -- reads ------------------------------------------------------------
+
+    def pending_like(self, user_id, post_id):
+        with self._lock:
+            entry = self._entries.get((user_id, post_id))
+            return None if entry is None else entry[0]
+
+    def pending_count_delta(self, post_id):
+        return self._post_deltas.get(post_id, 0)
+
+    def apply_pending_counts(self, rows, field):
+        """Add pending like_count changes to serialized post rows in place."""
+        if not self._post_deltas:
+            return rows
+        for row in rows:
+            delta = self._post_deltas.get(row['id'])
+            if delta and field in row:
+                row[field] += delta
+        return rows
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._entries),
+                "posts_with_pending_counts": len(self._post_deltas),
+                "flushed": self.flushed,
+                "dropped": self.dropped,
+                "last_flush_at": self.last_flush_at,
+                "last_error": self.last_error,
+                "spool": str(self.spool_path),
+            }
+
+
+def read_spool(path):
+    """Return the buffered (user_id, post_id, like, stored_like) entries of a spool file."""
+    entries = []
+    with open(path, encoding='utf-8') as spool:
+        for line in spool:
+            try:
+                entries.append(tuple(json.loads(line)))
+            except ValueError:
+                # A torn last line from a crash mid-write was never acknowledged
+                continue
+    return entries
+
+
+def claim_orphaned_spools(spool_dir, exclude=None):
+    """
+    Lock the spool files of processes that died and return their entries.
+
+    Live processes hold an exclusive flock on their own spool, so any file
+    that can be locked here belongs to nobody. The returned claims keep the
+    files locked; pass them to release_spools() once the entries are safe.
+    """
+    claims, entries = [], []
+    for path in sorted(Path(spool_dir).glob('likes-*.ndjson')):
+        if path == exclude:
+            continue
+        spool = open(path, 'a+', encoding='utf-8')
+        try:
+            fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            spool.close()
+            continue
+        claims.append((path, spool))
+        entries.extend(read_spool(path))
+    return claims, entries
+
+
+def release_spools(claims):
+    for path, spool in claims:
+        path.unlink()
+        spool.close()
+
+
+_like_buffer = None
+_like_buffer_lock = threading.Lock()
+
+
+def get_like_buffer():
+    """Return the process-wide LikeBuffer, or None when LIKE_WRITE_BEHIND is off."""
+    global _like_buffer
+    if not getattr(settings, 'LIKE_WRITE_BEHIND', False):
+        return None
+    if _like_buffer is None:
+        with _like_buffer_lock:
+            if _like_buffer is None:
+                _like_buffer = LikeBuffer(
+                    spool_dir=settings.LIKE_BUFFER_SPOOL_DIR,
+                    max_pending=getattr(settings, 'LIKE_BUFFER_MAX_PENDING', 500),
+                    flush_interval=getattr(settings, 'LIKE_BUFFER_FLUSH_INTERVAL', 1.0),
+                    fsync=getattr(settings, 'LIKE_BUFFER_FSYNC', True),
+                )
+    return _like_buffer
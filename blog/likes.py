@@ -0,0 +1,174 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .feed_cache import abump_feed_version, bump_feed_version
+from .models import Like, Post, User
+from .trending import alikes_changed, likes_changed
+from .user_stats import alike_count_changed, like_count_changed
+
+
+def set_like(post, user, like):
+    """
+    Create or flip `user`'s like on `post` and keep Post.like_count in step.
+
+    The flip is a conditional UPDATE (`like=not like`), so two concurrent
+    requests setting the same value cannot both count it. The post row is
+    locked first, as upsert_likes() does, so the two never wait on each
+    other in opposite orders. Returns the change applied to the post's
+    like_count (-1, 0 or 1).
+    """
+    with transaction.atomic():
+        lock_posts([post.pk])
+        like_instance, created = Like.objects.get_or_create(
+            post=post,
+            user=user,
+            defaults={'like': like, 'created_at': timezone.now()}
+        )
+        if created:
+            delta = 1 if like else 0
+        else:
+            changed = Like.objects.filter(pk=like_instance.pk, like=not like).update(
+                like=like, updated_at=timezone.now()
+            )
+            delta = (1 if like else -1) if changed else 0
+
+        if delta:
+            Post.objects.filter(pk=post.pk).update(like_count=F('like_count') + delta)
+            like_count_changed({post.pk: delta})
+            likes_changed({post.pk: delta})
+            transaction.on_commit(bump_feed_version)
+    return delta
+
+
+def lock_posts(post_ids):
+    """
+    Lock the rows of `post_ids`, in id order, until the end of the
+    transaction and return the ids that exist.
+    """
+    return list(Post.objects.select_for_update().filter(pk__in=post_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def likes_condition(keys):
+    """A filter matching the Like rows of the (user_id, post_id) pairs in `keys`."""
+    post_ids_by_user = {}
+    for user_id, post_id in keys:
+        post_ids_by_user.setdefault(user_id, []).append(post_id)
+    condition = Q()
+    for user_id, post_ids in post_ids_by_user.items():
+        condition |= Q(user_id=user_id, post_id__in=post_ids)
+    return condition
+
+
+def stored_likes(keys):
+    """The like values stored for the (user_id, post_id) pairs in `keys`, read in one query."""
+    if not keys:
+        return {}
+    return {
+        (user_id, post_id): like
+        for user_id, post_id, like in Like.objects.filter(likes_condition(keys)).values_list('user_id', 'post_id', 'like')
+    }
+
+
+def writable_likes(likes):
+    """The entries of `likes` whose post and user still exist, in two queries."""
+    post_ids = set(Post.objects.filter(pk__in={post_id for _, post_id in likes}).values_list('pk', flat=True))
+    user_ids = set(User.objects.filter(pk__in={user_id for user_id, _ in likes}).values_list('pk', flat=True))
+    return {key: like for key, like in likes.items() if key[0] in user_ids and key[1] in post_ids}
+
+
+def upsert_likes(likes):
+    """
+    Write many likes at once and keep Post.like_count in step.
+
+    `likes` maps `(user_id, post_id)` to the wanted like value. The posts
+    are locked first: SELECT ... FOR UPDATE cannot lock like rows that do
+    not exist yet, so without it two batches inserting the same new pair
+    would both count it. The current rows are then read in one query to
+    work out the like_count changes, every row is written with a single
+    INSERT ... ON CONFLICT DO UPDATE on (post, user), and the counts are
+    adjusted with one UPDATE.
+    Returns the like_count change per post id.
+    """
+    if not likes:
+        return {}
+
+    now = timezone.now()
+    with transaction.atomic():
+        lock_posts({post_id for _, post_id in likes})
+        current = stored_likes(likes)
+
+        deltas = {}
+        for key, like in likes.items():
+            before = current.get(key, False)
+            if like != before:
+                post_id = key[1]
+                deltas[post_id] = deltas.get(post_id, 0) + (1 if like else -1)
+
+        Like.objects.bulk_create(
+            [
+                Like(user_id=user_id, post_id=post_id, like=like, created_at=now, updated_at=now)
+                for (user_id, post_id), like in likes.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['post', 'user'],
+            update_fields=['like', 'updated_at'],
+        )
+
+        deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+        apply_like_count_deltas(deltas)
+        likes_changed(deltas, now)
+        if deltas:
+            transaction.on_commit(bump_feed_version)
+    return deltas
+
+
+def apply_like_count_deltas(deltas):
+    """
+    Add `deltas[post_id]` to each post's like_count in one UPDATE, and to
+    the authors' UserStats.total_likes.
+    """
+    if not deltas:
+        return
+    Post.objects.filter(pk__in=deltas).update(
+        like_count=F('like_count') + Case(
+            *[When(pk=post_id, then=Value(delta)) for post_id, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+    like_count_changed(deltas)
+
+
+async def aset_like(post_id, user_id, like):
+    """
+    Async variant of set_like() built on the async ORM.
+
+    Without async transactions the like row is written first (a conditional
+    flip, or an insert guarded by the (post, user) unique constraint) and the
+    counter is adjusted afterwards; recount_likes repairs the rare drift a
+    crash between the two statements can leave.
+    """
+    delta = 0
+    for _ in range(2):
+        changed = await Like.objects.filter(post_id=post_id, user_id=user_id, like=not like).aupdate(
+            like=like, updated_at=timezone.now()
+        )
+        if changed:
+            delta = 1 if like else -1
+            break
+        try:
+            await Like.objects.acreate(post_id=post_id, user_id=user_id, like=like, created_at=timezone.now())
+        except IntegrityError:
+            # The row exists: either it already holds `like`, or a concurrent
+            # request created it with the opposite value and the next flip wins
+            continue
+        delta = 1 if like else 0
+        break
+
+    if delta:
+        await Post.objects.filter(pk=post_id).aupdate(like_count=F('like_count') + delta)
+        await alike_count_changed(post_id, delta)
+        await alikes_changed(post_id, delta)
+        await abump_feed_version()
+    return delta
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ._bench import summarize
+
+# (label, method, sync path, async path, body)
+ENDPOINTS = [
+    ('all_post', 'GET', '/all_post/', '/async/all_post/', None),
+    ('user_data', 'GET', '/user_data/', '/async/user_data/', None),
+    ('add_like', 'POST', '/add_like/', '/async/add_like/', {'like': True}),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve blog_project.asgi under uvicorn and compare the sync DRF endpoints with their "
+        "native async variants at high concurrency. Runs against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token', required=True, help="Token header of an existing user.")
+        parser.add_argument('--post-id', type=int, help="Post to like for the add_like endpoints.")
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per endpoint.")
+        parser.add_argument('--workers', type=int, default=1, help="uvicorn worker processes.")
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--throttle', action='store_true',
+                            help="Keep THROTTLE_RATES; by default throttling is off so every request is served.")
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise CommandError("bench_asgi needs uvicorn: pip install uvicorn")
+
+        with tempfile.TemporaryDirectory() as settings_dir:
+            server = subprocess.Popen(
+                [
+                    sys.executable, '-m', 'uvicorn', 'blog_project.asgi:application',
+                    '--port', str(options['port']), '--workers', str(options['workers']),
+                    '--no-access-log', '--log-level', 'warning',
+                ],
+                env=server_env(settings_dir, options['throttle']),
+            )
+            try:
+                wait_for_port(options['port'])
+                results = asyncio.run(self.run_all(options))
+            finally:
+                server.terminate()
+                server.wait()
+
+        for label, variants in results.items():
+            for variant, result in variants.items():
+                self.stdout.write(
+                    f"{label:<10} {variant:<5} {result['throughput_rps']:>9.1f} req/s  "
+                    f"p50={result['p50_ms']}ms p99={result['p99_ms']}ms errors={result['errors']}"
+                )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    async def run_all(self, options):
+        results = {}
+        for label, method, sync_path, async_path, body in ENDPOINTS:
+            if body is not None:
+                if options['post_id'] is None:
+                    continue
+                body = {**body, 'post_id': options['post_id']}
+            results[label] = {}
+            for variant, path in (('sync', sync_path), ('async', async_path)):
+                results[label][variant] = await load(
+                    options['port'], method, path, options['token'], body,
+                    options['concurrency'], options['duration'],
+                )
+        return results
+
+
+def server_env(settings_dir, throttle):
+    """
+    The server's environment. Unless `throttle` is set it loads the current
+    settings with THROTTLE_RATES emptied, the way bench_endpoints overrides
+    them, so the runs measure the views rather than 429 and 503 responses.
+    """
+    env = {**os.environ}
+    if throttle:
+        return env
+    with open(os.path.join(settings_dir, 'bench_asgi_settings.py'), 'w') as module:
+        module.write(f"from {settings.SETTINGS_MODULE} import *  # noqa\nTHROTTLE_RATES = {{}}\n")
+    env['DJANGO_SETTINGS_MODULE'] = 'bench_asgi_settings'
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [settings_dir, os.getcwd(), env.get('PYTHONPATH')]))
+    return env
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError(f"uvicorn did not start listening on port {port}")
+
+
+async def load(port, method, path, token, body, concurrency, duration):
+    """Keep `concurrency` keep-alive connections busy for `duration` seconds."""
+    payload = json.dumps(body).encode() if body is not None else b''
+    request = (
+        f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nToken: {token}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+    ).encode() + payload
+    samples, errors = [], 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                writer.write(request)
+                await writer.drain()
+                status = await read_response(reader)
+                samples.append((time.perf_counter() - start) * 1000)
+                if status >= 400:
+                    errors += 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            errors += 1
+        finally:
+            writer.close()
+
+    started = time.monotonic()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    result = summarize(samples)
+    result.update(throughput_rps=round(len(samples) / elapsed, 1), errors=errors)
+    return result
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status
@@ -0,0 +1,272 @@
+import io
+import itertools
+import json
+import platform
+import random
+import time
+from contextlib import nullcontext
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import get_resolver
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from blog.models import CustomToken, Post, User
+
+from ._bench import summarize, test_database
+from .seed_blog import WORDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with seed_blog and drive every endpoint in blog/urls.py "
+        "through the Django test client. Reports throughput, p50/p95/p99 latency and queries "
+        "per request for each endpoint, optionally as JSON for comparing runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--likes', type=int, default=50000)
+        parser.add_argument('--content-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=200, help="Timed requests per endpoint.")
+        parser.add_argument('--warmup', type=int, default=10, help="Untimed requests per endpoint first.")
+        parser.add_argument('--query-samples', type=int, default=5,
+                            help="Extra requests per endpoint run with query capture on.")
+        parser.add_argument('--endpoints', nargs='+', metavar='NAME', help="Only these URL names.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--throttle', action='store_true',
+                            help="Keep THROTTLE_RATES; by default throttling is off so every request is served.")
+        parser.add_argument('--compare', help="A previous --output file to print p50 and p99 changes against.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as previous:
+                baseline = json.load(previous)
+
+        throttling = nullcontext() if options['throttle'] else override_settings(THROTTLE_RATES={})
+        with test_database(), throttling:
+            call_command(
+                'seed_blog', users=options['users'], posts=options['posts'], likes=options['likes'],
+                content_size=options['content_size'], seed=options['seed'], stdout=io.StringIO(),
+            )
+            scenarios = Scenarios(random.Random(options['seed']))
+            wanted = options['endpoints'] or list(scenarios.endpoints)
+            unknown = set(wanted) - set(scenarios.endpoints)
+            if unknown:
+                raise CommandError(f"No scenario for: {', '.join(sorted(unknown))}")
+            uncovered = set(url_names()) - set(scenarios.endpoints)
+            if uncovered:
+                self.stderr.write(f"Endpoints without a scenario: {', '.join(sorted(uncovered))}")
+
+            results = {
+                'meta': {
+                    'started_at': timezone.now().isoformat(),
+                    'database': connection.vendor,
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'options': {key: options[key] for key in (
+                        'users', 'posts', 'likes', 'content_size', 'seed', 'iterations', 'warmup', 'query_samples'
+                    )},
+                },
+                'endpoints': {},
+            }
+            for name in wanted:
+                result = run_endpoint(scenarios.client, scenarios.endpoints[name], options)
+                results['endpoints'][name] = result
+                self.stdout.write(
+                    f"{name:<16} {result['throughput_rps']:>8.1f} req/s  p50={result['p50_ms']}ms "
+                    f"p95={result['p95_ms']}ms p99={result['p99_ms']}ms  queries={result['queries']} "
+                    f"errors={result['errors']}"
+                )
+
+        if baseline is not None:
+            self.print_comparison(baseline, results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    def print_comparison(self, baseline, results):
+        self.stdout.write("\nchange against baseline (negative is faster):")
+        for name, result in results['endpoints'].items():
+            before = baseline.get('endpoints', {}).get(name)
+            if not before:
+                continue
+            changes = []
+            for key in ('p50_ms', 'p99_ms'):
+                if before[key]:
+                    changes.append(f"{key}={100 * (result[key] - before[key]) / before[key]:+.1f}%")
+            changes.append(f"queries {before['queries']} -> {result['queries']}")
+            self.stdout.write(f"{name:<16} {'  '.join(changes)}")
+
+
+def url_names():
+    return [pattern.name for pattern in get_resolver('blog.urls').url_patterns if pattern.name]
+
+
+def run_endpoint(client, scenario, options):
+    samples, errors = [], 0
+    for _ in range(options['warmup']):
+        send(client, scenario())
+
+    for _ in range(options['iterations']):
+        # Building the request (and any rows it needs) is not timed
+        request = scenario()
+        start = time.perf_counter()
+        response = send(client, request)
+        samples.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+
+    query_counts = []
+    for _ in range(options['query_samples']):
+        request = scenario()
+        with CaptureQueriesContext(connection) as queries:
+            send(client, request)
+        query_counts.append(len(queries))
+
+    result = summarize(samples)
+    result.update(
+        throughput_rps=round(len(samples) / (sum(samples) / 1000), 1) if samples else 0.0,
+        errors=errors,
+        queries=round(sum(query_counts) / len(query_counts), 2) if query_counts else None,
+        queries_max=max(query_counts, default=None),
+    )
+    return result
+
+
+def send(client, request):
+    method, path, data, token = request
+    if method == 'get':
+        response = client.get(path, data, HTTP_TOKEN=token)
+    else:
+        response = getattr(client, method)(path, data, content_type='application/json', HTTP_TOKEN=token)
+    if getattr(response, 'streaming', False):
+        b''.join(response.streaming_content)
+    return response
+
+
+class Scenarios:
+    """
+    One request factory per URL name. Each call returns (method, path, data,
+    token) for a fresh request against the seeded data; requests that
+    consume rows (delete_user, delete_post) create them first.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.client = Client()
+        self.counter = itertools.count()
+        self.password = make_password('password')
+        self.login_email = None
+        self.tokens = dict(CustomToken.objects.values_list('user_id', 'token'))
+        self.user_ids = list(self.tokens)
+        # The busiest author makes user_data and post_update the worst case
+        self.author_id = (
+            Post.objects.values('user_id').annotate(posts=Count('id')).order_by('-posts')[0]['user_id']
+        )
+        self.author = User.objects.get(id=self.author_id)
+        self.author_posts = list(Post.objects.filter(user_id=self.author_id).values_list('id', flat=True))
+        self.post_ids = list(Post.objects.filter(is_active=True, private=False).values_list('id', flat=True))
+
+        self.endpoints = {
+            'add_user': self.add_user,
+            'login': self.login,
+            'add_post': self.add_post,
+            'add_like': self.add_like('/add_like/'),
+            'add_likes': self.add_likes,
+            'user_data': self.read('/user_data/'),
+            'user_update': self.user_update,
+            'post_update': self.post_update,
+            'all_post': self.read('/all_post/'),
+            'search_post': self.search_post,
+            'trending': lambda: ('get', '/trending/', {}, self.random_token()),
+            'analytics_post_likes': self.analytics_post_likes,
+            'analytics_top_authors': lambda: ('get', '/analytics/top_authors/', {}, self.random_token()),
+            'delete_user': self.delete_user,
+            'delete_post': self.delete_post,
+            'async_add_like': self.add_like('/async/add_like/'),
+            'async_user_data': self.read('/async/user_data/'),
+            'async_all_post': self.read('/async/all_post/'),
+            'metrics': lambda: ('get', '/metrics', {}, None),
+        }
+
+    def unique(self):
+        return f'bench-{next(self.counter)}-{get_random_string(6)}'
+
+    def random_token(self):
+        return self.tokens[self.rng.choice(self.user_ids)]
+
+    def add_user(self):
+        name = self.unique()
+        return 'post', '/add_user/', {
+            'username': name, 'email': f'{name}@example.com', 'password': 'password', 'age': 30, 'bio': ''
+        }, None
+
+    def login(self):
+        # Reissues the author's token, so log in as a user no other scenario uses
+        if self.login_email is None:
+            self.login_email = f'{self.unique()}@example.com'
+            User.objects.create(username='bench-login', email=self.login_email, password=self.password, age=30, bio='')
+        return 'post', '/login/', {'email': self.login_email, 'password': 'password'}, None
+
+    def add_post(self):
+        return 'post', '/add_post/', {
+            'title': self.unique(), 'description': 'bench', 'content': 'bench ' * 300
+        }, self.random_token()
+
+    def add_like(self, path):
+        def scenario():
+            return 'post', path, {
+                'post_id': self.rng.choice(self.post_ids), 'like': self.rng.random() < 0.8
+            }, self.random_token()
+        return scenario
+
+    def add_likes(self):
+        return 'post', '/add_likes/', {'likes': [
+            {'post_id': post_id, 'like': self.rng.random() < 0.8}
+            for post_id in self.rng.sample(self.post_ids, min(50, len(self.post_ids)))
+        ]}, self.random_token()
+
+    def read(self, path):
+        def scenario():
+            return 'get', path, {}, self.tokens[self.author_id]
+        return scenario
+
+    def user_update(self):
+        return 'put', '/user_update/', {
+            'username': self.author.username, 'email': self.author.email, 'age': self.rng.randint(18, 80),
+            'bio': 'bench',
+        }, self.tokens[self.author_id]
+
+    def post_update(self):
+        return 'put', '/post_update/', {
+            'post_id': self.rng.choice(self.author_posts), 'title': self.unique(), 'description': 'edited',
+            'content': 'edited ' * 300,
+        }, self.tokens[self.author_id]
+
+    def search_post(self):
+        return 'get', '/search_post/', {'q': ' '.join(self.rng.sample(WORDS, 2))}, self.random_token()
+
+    def analytics_post_likes(self):
+        return 'get', '/analytics/post_likes/', {'post_id': self.rng.choice(self.post_ids)}, self.random_token()
+
+    def delete_user(self):
+        name = self.unique()
+        user = User.objects.create(
+            username=name, email=f'{name}@example.com', password=self.password, age=30, bio=''
+        )
+        return 'delete', '/delete_user/', {}, CustomToken.generate_token(user).token
+
+    def delete_post(self):
+        post = Post.objects.create(user_id=self.author_id, title=self.unique(), description='d', content='c')
+        return 'delete', '/delete_post/', {'post_id': post.id}, self.tokens[self.author_id]
@@ -0,0 +1,86 @@
+import json
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from blog.models import Post, User
+from blog.renderers import FastJSONRenderer, orjson
+from blog.serializers import PostSerializer, UserSerializer
+
+from ._bench import summarize, timed
+
+
+class Command(BaseCommand):
+    help = (
+        "Time DRF's JSONRenderer against blog.renderers.FastJSONRenderer on all_post and "
+        "user_data shaped payloads of growing size. Needs no database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000])
+        parser.add_argument('--content-size', type=int, default=512, help="Characters of content per post.")
+        parser.add_argument(
+            '--budget', type=int, default=2000000,
+            help="Posts rendered per renderer and payload; sets the iterations for each size.",
+        )
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write("orjson is not installed: FastJSONRenderer falls back to the stdlib path.")
+
+        renderers = (('drf', JSONRenderer()), ('fast', FastJSONRenderer()))
+        results = {}
+        for size in options['sizes']:
+            iterations = max(3, min(1000, options['budget'] // size))
+            for label, payload in build_payloads(size, options['content_size']).items():
+                expected = renderers[0][1].render(payload)
+                assert renderers[1][1].render(payload) == expected, f"{label}: renderers disagree"
+
+                result = results.setdefault(label, {}).setdefault(str(size), {'bytes': len(expected)})
+                for name, renderer in renderers:
+                    result[name] = summarize(timed(lambda: renderer.render(payload), iterations))
+                self.stdout.write(
+                    f"{label:<9} posts={size:<7} {len(expected) / 2**20:8.1f} MiB  "
+                    f"drf p50={result['drf']['p50_ms']}ms fast p50={result['fast']['p50_ms']}ms  "
+                    f"x{result['drf']['p50_ms'] / max(result['fast']['p50_ms'], 0.001):.1f}"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+
+def build_payloads(size, content_size):
+    """Response bodies of all_post and user_data as the views build them."""
+    content = ('lorem ipsum dolor sit amet ' * (content_size // 27 + 1))[:content_size]
+    rows = [
+        {
+            'id': i,
+            'title': f'Post number {i}',
+            'description': 'A short description of the post',
+            'content': content,
+            'likes_count': i % 97,
+        }
+        for i in range(size, 0, -1)
+    ]
+    user = User(id=1, username='author', email='author@example.com', age=30, bio='Writes posts', is_active=True)
+    posts = [
+        Post(id=row['id'], title=row['title'], description=row['description'], content=content, like_count=row['likes_count'])
+        for row in rows
+    ]
+    return {
+        'all_post': {
+            "status": 200,
+            "message": "Posts fetched successfully",
+            "total_post": size,
+            "data": rows,
+            "next": "eyJpZCI6MX0",
+        },
+        'user_data': {
+            "status": 200,
+            "message": "User data fetched successfully",
+            "user": UserSerializer(user).data,
+            "posts": PostSerializer(posts, many=True).data,
+        },
+    }
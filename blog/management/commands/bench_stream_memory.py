@@ -0,0 +1,69 @@
+import gc
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from blog.models import CustomToken, Post, User
+
+from ._bench import test_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the peak memory of all_post returning N posts in one buffered response "
+        "and in stream mode, for growing N."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+        parser.add_argument('--content-size', type=int, default=4096, help="Bytes of content per post.")
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        content = 'x' * options['content_size']
+
+        with test_database(), override_settings(
+            FEED_MAX_PAGE_SIZE=sizes[-1], FEED_STREAM_MAX_PAGE_SIZE=sizes[-1]
+        ):
+            user = User.objects.create(
+                username='bench', email='bench@example.com', password='bench-password', age=30, bio=''
+            )
+            token = CustomToken.generate_token(user).token
+            client = Client()
+
+            created = 0
+            for size in sizes:
+                Post.objects.bulk_create(
+                    [
+                        Post(user=user, title=f'bench post {i}', description='bench', content=content)
+                        for i in range(created, size)
+                    ],
+                    batch_size=1000,
+                )
+                created = size
+
+                buffered = peak_memory(lambda: client.get(
+                    '/all_post/', {'page_size': size}, HTTP_TOKEN=token
+                ).content)
+                streamed = peak_memory(lambda: sum(
+                    len(chunk) for chunk in client.get(
+                        '/all_post/', {'page_size': size, 'stream': 1}, HTTP_TOKEN=token
+                    ).streaming_content
+                ))
+                self.stdout.write(
+                    f"posts={size:<7} buffered peak={buffered / 2**20:8.1f} MiB  "
+                    f"stream peak={streamed / 2**20:8.1f} MiB"
+                )
+
+
+def peak_memory(func):
+    """Peak Python heap allocated while running `func`, in bytes."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import models
+
+from blog.models import User
+
+from ._bench import summarize, test_database, timed
+
+
+def legacy_save(self, *args, **kwargs):
+    # User.save() as it was before: hash on every save, hashed or not
+    self.password = make_password(self.password)
+    models.Model.save(self, *args, **kwargs)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare saving a profile change through User.save() with the old always-hash save() "
+        "and the current one. The user_update endpoint no longer calls save() at all (it runs "
+        "a queryset update), so this times the model method directly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        with test_database():
+            User.objects.create(username='bench', email='bench@example.com', password='bench-password', age=30, bio='')
+
+            def update():
+                user = User.objects.get(email='bench@example.com')
+                user.bio = 'bio'
+                user.save()
+
+            with mock.patch.object(User, 'save', legacy_save):
+                before = summarize(timed(update, iterations))
+            after = summarize(timed(update, iterations))
+
+        for label, result in (('before', before), ('after', after)):
+            self.stdout.write(
+                f"{label:<6} mean={result['mean_ms']}ms p50={result['p50_ms']}ms "
+                f"p95={result['p95_ms']}ms p99={result['p99_ms']}ms"
+            )
+        if after['mean_ms']:
+            self.stdout.write(f"speedup x{before['mean_ms'] / after['mean_ms']:.1f}")
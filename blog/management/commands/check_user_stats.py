@@ -0,0 +1,59 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from blog.models import User, UserStats
+from blog.user_stats import STATS_FIELDS, compute_stats, rebuild_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare UserStats with a from-scratch count for a random sample of users. Fails when "
+        "any sampled summary has drifted, unless --repair rebuilds them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=1000, help="Users to check.")
+        parser.add_argument('--seed', type=int, help="Random seed for picking the sample.")
+        parser.add_argument('--repair', action='store_true', help="Rebuild the drifted summaries.")
+
+    def handle(self, *args, **options):
+        user_ids = self.sample(options['sample'], random.Random(options['seed']))
+        stored = {
+            row['user_id']: row
+            for row in UserStats.objects.filter(user_id__in=user_ids).values('user_id', *STATS_FIELDS)
+        }
+        drifted = []
+        for user_id, expected in compute_stats(user_ids).items():
+            row = stored.get(user_id)
+            # A missing summary is built on first read, so it is not drift
+            if row is None:
+                continue
+            wrong = [field for field in STATS_FIELDS if row[field] != expected[field]]
+            if wrong:
+                drifted.append(user_id)
+                self.stdout.write(f"user {user_id}: " + ', '.join(
+                    f"{field} {row[field]} != {expected[field]}" for field in wrong
+                ))
+
+        if drifted and options['repair']:
+            rebuild_stats(drifted)
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drifted)} of {len(stored)} checked users"))
+        elif drifted:
+            raise CommandError(f"{len(drifted)} of {len(stored)} checked users have drifted")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(stored)} checked users are consistent"))
+
+    def sample(self, size, rng):
+        """Up to `size` distinct user ids, each the first id at or above a random point."""
+        bounds = User.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            return []
+        user_ids = set()
+        for _ in range(size):
+            user_id = User.objects.filter(id__gte=rng.randint(bounds['low'], bounds['high'])).order_by('id').values_list(
+                'id', flat=True
+            ).first()
+            user_ids.add(user_id)
+        return sorted(user_ids)
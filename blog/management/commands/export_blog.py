@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from blog.transfer import export_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream all users, posts and likes to an NDJSON file (one record per line), reading "
+        "in keyset batches so memory stays flat. Load it with import_blog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or - for stdout.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        def progress(name, exported):
+            self.stderr.write(f"{name}s: {exported} exported")
+
+        records = export_records(options['batch_size'], progress=progress)
+        if options['path'] == '-':
+            for record in records:
+                sys.stdout.buffer.write(record)
+            sys.stdout.buffer.flush()
+        else:
+            with open(options['path'], 'wb') as output:
+                output.writelines(records)
+            self.stderr.write(self.style.SUCCESS(f"Exported to {options['path']}"))
@@ -0,0 +1,50 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.transfer import Importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Load an export_blog NDJSON file in chunked transactions. Rows get new ids and their "
+        "foreign keys are remapped unless --keep-ids is given (which uses COPY on PostgreSQL). "
+        "An interrupted import resumes from its checkpoint file when run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--keep-ids', action='store_true',
+                            help="Keep the exported ids; for loading into an empty database.")
+        parser.add_argument('--no-copy', action='store_true', help="Use bulk_create even on PostgreSQL.")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: <path>.checkpoint).")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint.")
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint'] or options['path'] + '.checkpoint'
+        if options['restart'] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        def progress(name, total, line):
+            self.stderr.write(f"{name}s: {total} imported (line {line})")
+
+        importer = Importer(
+            options['path'], checkpoint,
+            batch_size=options['batch_size'],
+            keep_ids=options['keep_ids'],
+            use_copy=not options['no_copy'],
+            progress=progress,
+        )
+        if importer.load_checkpoint():
+            self.stderr.write(f"Resuming from line {importer.line} of {options['path']}")
+        try:
+            totals = importer.run()
+        except ValueError as e:
+            raise CommandError(f"{options['path']}: {e}")
+
+        os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['user']} users, {totals['post']} posts and {totals['like']} likes. "
+            f"Run rebuild_user_stats, recompute_trending and rollup_likes to fill the derived tables."
+        ))
@@ -0,0 +1,51 @@
+import fcntl
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.like_buffer import claim_orphaned_spools, read_spool, release_spools
+from blog.likes import upsert_likes
+
+
+class Command(BaseCommand):
+    help = "Inspect the write-behind like spool files, and optionally flush those left by dead processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flush-orphaned', action='store_true',
+                            help="Write the likes of spools no live process owns to the database.")
+        parser.add_argument('--show', type=int, default=0, metavar='N',
+                            help="Print the first N pending likes of each spool.")
+
+    def handle(self, *args, **options):
+        spool_dir = Path(settings.LIKE_BUFFER_SPOOL_DIR)
+        paths = sorted(spool_dir.glob('likes-*.ndjson'))
+        if not paths:
+            self.stdout.write(f"No spool files in {spool_dir}")
+
+        for path in paths:
+            entries = read_spool(path)
+            pending = {(user_id, post_id): like for user_id, post_id, like, _ in entries}
+            owner = "live" if is_locked(path) else "orphaned"
+            self.stdout.write(f"{path.name}: {owner}, {len(entries)} lines, {len(pending)} pending likes")
+            for (user_id, post_id), like in list(pending.items())[:options['show']]:
+                self.stdout.write(f"  user={user_id} post={post_id} like={like}")
+
+        if options['flush_orphaned']:
+            claims, entries = claim_orphaned_spools(spool_dir)
+            likes = {(user_id, post_id): like for user_id, post_id, like, _ in entries}
+            deltas = upsert_likes(likes)
+            release_spools(claims)
+            self.stdout.write(self.style.SUCCESS(
+                f"Flushed {len(likes)} likes, like_count changed on {len(deltas)} posts"
+            ))
+
+
+def is_locked(path):
+    with open(path, 'a+', encoding='utf-8') as spool:
+        try:
+            fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(spool, fcntl.LOCK_UN)
+        return False
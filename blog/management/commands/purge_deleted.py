@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog.models import Like, Post, User
+from blog.purge import Purger
+
+
+class Command(BaseCommand):
+    help = (
+        "Move users, posts and likes deleted more than --days ago into the archive tables "
+        "(or hard-delete them with --mode delete), in small throttled transactions. A purged "
+        "user's posts go with them, live ones included. Safe to interrupt and run again; run "
+        "it from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'PURGE_DELETED_AFTER_DAYS', 30))
+        parser.add_argument('--mode', choices=('archive', 'delete'), default='archive')
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'PURGE_BATCH_SIZE', 500))
+        parser.add_argument('--pause', type=float, default=getattr(settings, 'PURGE_BATCH_PAUSE', 0.1),
+                            help="Seconds to sleep after every batch.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be purged.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            users = User.objects.filter(deleted_at__lt=cutoff)
+            posts = Post.objects.filter(deleted_at__lt=cutoff)
+            self.stdout.write(
+                f"Deleted before {cutoff:%Y-%m-%d %H:%M}: {users.count()} users, "
+                f"{posts.count() + Post.objects.filter(user__in=users).exclude(deleted_at__lt=cutoff).count()} "
+                f"posts, {Like.objects.filter(deleted_at__lt=cutoff).count()} likes "
+                f"(plus the likes of those posts and users)"
+            )
+            return
+
+        def progress(kind, total, last_id):
+            self.stdout.write(f"{kind}: {total} {options['mode']}d (last id {last_id})")
+
+        totals = Purger(
+            cutoff,
+            archive=options['mode'] == 'archive',
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            progress=progress,
+        ).run()
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['users']} users, {totals['posts']} posts and {totals['likes']} likes "
+            f"{options['mode']}d"
+        ))
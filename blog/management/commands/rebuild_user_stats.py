@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.models import User
+from blog.user_stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute UserStats for every user from blog_post, in batches. Run it once after "
+        "migrating (user_data otherwise builds each summary on first read) and to repair drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep after every batch.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        rebuilt = 0
+
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+            rebuild_stats(user_ids)
+            rebuilt += len(user_ids)
+            self.stdout.write(f"rebuilt {rebuilt} users (last id {last_id})")
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {rebuilt} users rebuilt"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from blog.trending import recompute_scores
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the trending scores from recent likes, undoing the drift of incremental "
+        "updates, and drop posts that have decayed out of TRENDING_WINDOW. Run it from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        def progress(written):
+            self.stdout.write(f"scores written: {written}")
+
+        written, dropped = recompute_scores(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Done: {written} scores written, {dropped} decayed rows dropped"))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from blog.models import Like, Post
+
+
+class Command(BaseCommand):
+    help = "Recount Post.like_count from the Like table and repair any drift, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        last_id = 0
+        checked = repaired = 0
+
+        while True:
+            with transaction.atomic():
+                # Lock the batch before counting: a like committed after the
+                # count then waits on the row lock and applies its own +/-1.
+                posts = list(
+                    Post.objects.select_for_update()
+                    .filter(id__gt=last_id)
+                    .order_by('id')
+                    .only('id', 'like_count')[:batch_size]
+                )
+                if not posts:
+                    break
+                last_id = posts[-1].id
+
+                counts = dict(
+                    Like.objects.filter(post_id__in=[post.id for post in posts], like=True)
+                    .values_list('post_id')
+                    .annotate(total=Count('id'))
+                    .order_by()
+                )
+                drifted = []
+                for post in posts:
+                    actual = counts.get(post.id, 0)
+                    if post.like_count != actual:
+                        post.like_count = actual
+                        drifted.append(post)
+                if drifted and not dry_run:
+                    Post.objects.bulk_update(drifted, ['like_count'])
+
+            checked += len(posts)
+            repaired += len(drifted)
+            self.stdout.write(f"checked {checked} posts, {'found' if dry_run else 'repaired'} {repaired} (last id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {checked} posts checked, {repaired} {'drifted' if dry_run else 'repaired'}"
+        ))
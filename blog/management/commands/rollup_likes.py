@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.rollups import reset_rollups, run_rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Count likes newer than the rollup watermark into the daily per-post and per-author "
+        "tables. The first run backfills in chunks and can be interrupted and resumed; after "
+        "that, run it from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'ROLLUP_BATCH_SIZE', 5000))
+        parser.add_argument('--lag', type=int, default=getattr(settings, 'ROLLUP_LAG', 60),
+                            help="Leave likes younger than this many seconds for the next run.")
+        parser.add_argument('--max-batches', type=int, help="Stop after this many batches.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep after every batch.")
+        parser.add_argument('--reset', action='store_true',
+                            help="Empty the rollups and start again from the first like.")
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            reset_rollups()
+            self.stdout.write("Rollups emptied")
+
+        def progress(scanned):
+            self.stdout.write(f"likes counted: {scanned}")
+
+        scanned = run_rollup(
+            batch_size=options['batch_size'],
+            lag=options['lag'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Done: {scanned} likes counted"))
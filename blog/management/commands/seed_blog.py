@@ -0,0 +1,137 @@
+import random
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.crypto import get_random_string
+
+from blog.feed_cache import bump_feed_version
+from blog.models import CustomToken, Like, Post, User
+from blog.rollups import run_rollup
+from blog.trending import recompute_scores
+from blog.user_stats import rebuild_stats
+
+WORDS = (
+    'django python postgres cache index query latency throughput cursor replica token like '
+    'feed stream json render async worker queue batch shard vacuum planner trigger search'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the configured database with synthetic users, posts and likes using chunked "
+        "bulk_create. Posts per author follow a Zipf distribution and likes per post a "
+        "power law, so a few authors and posts get most of the activity."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--likes', type=int, default=100000, help="Approximate number of Like rows.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows per bulk_create batch.")
+        parser.add_argument('--content-size', type=int, default=2000, help="Approximate characters of content.")
+        parser.add_argument('--author-skew', type=float, default=1.1,
+                            help="Zipf exponent of posts per author; 0 spreads posts evenly.")
+        parser.add_argument('--like-skew', type=float, default=1.5,
+                            help="Pareto shape of likes per post; smaller is more skewed (must be > 1).")
+        parser.add_argument('--private-ratio', type=float, default=0.1)
+        parser.add_argument('--unlike-ratio', type=float, default=0.1,
+                            help="Share of Like rows stored as like=False.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the distributions.")
+
+    def handle(self, *args, **options):
+        if options['like_skew'] <= 1:
+            raise CommandError("--like-skew must be greater than 1")
+        if options['users'] < 1 and (options['posts'] or options['likes']):
+            raise CommandError("Posts and likes need at least one user")
+
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        # Keeps titles and emails unique across runs against the same database
+        self.tag = uuid.uuid4().hex[:8]
+
+        started = time.perf_counter()
+        user_ids = self.seed_users(options['users'])
+        post_total, like_total = self.seed_posts_and_likes(user_ids, options)
+        for start in range(0, len(user_ids), self.chunk_size):
+            rebuild_stats(user_ids[start:start + self.chunk_size])
+        recompute_scores(batch_size=self.chunk_size)
+        # Seeded likes are committed, so nothing needs to be held back
+        run_rollup(batch_size=self.chunk_size, lag=0)
+        bump_feed_version()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(user_ids)} users, {post_total} posts and {like_total} likes in {elapsed:.1f}s "
+            f"(tag {self.tag})"
+        ))
+
+    def seed_users(self, count):
+        # bulk_create skips User.save(), so hash the shared password once here
+        password = make_password('password')
+        user_ids = []
+        for start in range(0, count, self.chunk_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        username=f'user{i}', email=f'seed-{self.tag}-{i}@example.com', password=password,
+                        age=self.rng.randint(18, 80), bio=self.words(12),
+                    )
+                    for i in range(start, min(start + self.chunk_size, count))
+                ])
+                CustomToken.objects.bulk_create([
+                    CustomToken(user=user, token=get_random_string(length=64)) for user in users
+                ])
+            user_ids.extend(user.id for user in users)
+            self.stdout.write(f"users: {len(user_ids)}/{count}")
+        return user_ids
+
+    def seed_posts_and_likes(self, user_ids, options):
+        count = options['posts']
+        author_weights = [1 / rank ** options['author_skew'] for rank in range(1, len(user_ids) + 1)]
+        # paretovariate(a) has mean a / (a - 1); scale it to the requested likes per post
+        shape = options['like_skew']
+        like_scale = (options['likes'] / count) / (shape / (shape - 1)) if count else 0
+        content_words = max(1, options['content_size'] // 7)
+
+        post_total = like_total = 0
+        for start in range(0, count, self.chunk_size):
+            size = min(self.chunk_size, count - start)
+            authors = self.rng.choices(user_ids, weights=author_weights, k=size)
+            likers = [
+                self.likers(user_ids, round(self.rng.paretovariate(shape) * like_scale), options['unlike_ratio'])
+                for _ in range(size)
+            ]
+            with transaction.atomic():
+                posts = Post.objects.bulk_create([
+                    Post(
+                        user_id=author,
+                        title=f'{self.words(4)} {self.tag}-{start + i}',
+                        description=self.words(20),
+                        content=self.words(content_words),
+                        private=self.rng.random() < options['private_ratio'],
+                        like_count=sum(like for _, like in post_likers),
+                    )
+                    for i, (author, post_likers) in enumerate(zip(authors, likers))
+                ])
+                likes = [
+                    Like(post_id=post.id, user_id=user_id, like=like)
+                    for post, post_likers in zip(posts, likers)
+                    for user_id, like in post_likers
+                ]
+                Like.objects.bulk_create(likes, batch_size=self.chunk_size)
+            post_total += len(posts)
+            like_total += len(likes)
+            self.stdout.write(f"posts: {post_total}/{count}, likes: {like_total}")
+        return post_total, like_total
+
+    def likers(self, user_ids, count, unlike_ratio):
+        return [
+            (user_id, self.rng.random() >= unlike_ratio)
+            for user_id in self.rng.sample(user_ids, min(count, len(user_ids)))
+        ]
+
+    def words(self, count):
+        return ' '.join(self.rng.choices(WORDS, k=count))
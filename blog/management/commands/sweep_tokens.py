@@ -0,0 +1,58 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog.models import CustomToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete tokens past TOKEN_ABSOLUTE_TTL or TOKEN_SLIDING_TTL in small batches, walking "
+        "the created_at and last_used_at indexes. Expired tokens are already refused, so this "
+        "only keeps blog_customtoken small; run it from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'TOKEN_SWEEP_BATCH_SIZE', 1000))
+        parser.add_argument('--pause', type=float, default=getattr(settings, 'TOKEN_SWEEP_BATCH_PAUSE', 0.1),
+                            help="Seconds to sleep after every batch.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the expired tokens.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        sweeps = []
+        absolute_ttl = getattr(settings, 'TOKEN_ABSOLUTE_TTL', None)
+        if absolute_ttl is not None:
+            sweeps.append(('created_at', now - timedelta(seconds=absolute_ttl)))
+        sliding_ttl = getattr(settings, 'TOKEN_SLIDING_TTL', None)
+        if sliding_ttl is not None:
+            sweeps.append(('last_used_at', now - timedelta(seconds=sliding_ttl)))
+
+        total = 0
+        for field, cutoff in sweeps:
+            # Same comparison as blog.authentication.is_expired()
+            expired = CustomToken.objects.filter(**{f'{field}__lte': cutoff})
+            if options['dry_run']:
+                self.stdout.write(f"{field}: {expired.count()} expired")
+                continue
+            total += self.sweep(expired, field, options['batch_size'], options['pause'])
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Done: {total} expired tokens deleted"))
+
+    def sweep(self, expired, field, batch_size, pause):
+        """Delete `expired` oldest first, one short statement per batch."""
+        deleted = 0
+        while True:
+            ids = list(expired.order_by(field).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            # Re-checks the cutoff, so a token renewed since the select survives
+            count, _ = expired.filter(id__in=ids).delete()
+            deleted += count
+            self.stdout.write(f"{field}: {deleted} deleted")
+            if pause:
+                time.sleep(pause)
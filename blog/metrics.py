@@ -0,0 +1,195 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+_current = contextvars.ContextVar('blog_request_metrics', default=None)
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+class RequestMetrics:
+    """SQL statistics of one sampled request, filled in by record_query()."""
+
+    __slots__ = ('queries', 'db_time', 'seen', 'duplicates')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.seen = set()
+        self.duplicates = 0
+
+    def add(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        # The same parametrized SQL twice in one request is N+1 shaped
+        if sql in self.seen:
+            self.duplicates += 1
+        else:
+            self.seen.add(sql)
+
+
+def collect():
+    """Start collecting SQL statistics for the current request; returns (metrics, reset token)."""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop_collecting(token):
+    _current.reset(token)
+
+
+def current_metrics():
+    """The RequestMetrics of the request being handled, or None if it is not sampled."""
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    # Installed on every connection; requests that are not sampled only pay
+    # for the context variable lookup
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add(sql, time.perf_counter() - start)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# Connections opened from here on, in any thread (the async ORM runs queries
+# on a worker thread with its own connections)
+connection_created.connect(install_query_recorder, dispatch_uid='blog.metrics.install_query_recorder')
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}  # labels -> [bucket counts..., overflow, sum, count]
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 3)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def expose(self, label_names):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self.series.items()):
+            base = format_labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{base}}} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{base}}} {series[-1]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.series = {}
+
+    def inc(self, labels, amount=1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def expose(self, label_names):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{{{format_labels(label_names, labels)}}} {value}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Per-process aggregates of the sampled requests, keyed by URL name.
+
+    Each worker process keeps its own registry, so Prometheus must scrape
+    every worker (or the numbers only describe the one that answered).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = Counter('blog_http_requests_total', 'Sampled requests by view and status code.')
+            self.duration = Histogram(
+                'blog_http_request_duration_seconds', 'Time spent handling sampled requests.', DURATION_BUCKETS
+            )
+            self.db_duration = Histogram(
+                'blog_db_duration_seconds', 'Time spent in SQL per sampled request.', DURATION_BUCKETS
+            )
+            self.queries = Histogram('blog_db_queries', 'SQL queries per sampled request.', QUERY_BUCKETS)
+            self.duplicates = Counter(
+                'blog_db_duplicate_queries_total', 'Repeated identical SQL statements within one request.'
+            )
+
+    def observe(self, view, status_code, duration, metrics):
+        with self._lock:
+            self.requests.inc((view, str(status_code)))
+            self.duration.observe((view,), duration)
+            self.db_duration.observe((view,), metrics.db_time)
+            self.queries.observe((view,), metrics.queries)
+            if metrics.duplicates:
+                self.duplicates.inc((view,), metrics.duplicates)
+
+    def expose(self):
+        with self._lock:
+            lines = self.requests.expose(('view', 'code'))
+            for histogram in (self.duration, self.db_duration, self.queries):
+                lines.extend(histogram.expose(('view',)))
+            lines.extend(self.duplicates.expose(('view',)))
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(names, values):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+def server_timing(duration, metrics):
+    return (
+        f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries, '
+        f'{metrics.duplicates} duplicates", app;dur={duration * 1000:.2f}'
+    )
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of the registry; see METRICS_BEARER_TOKEN.
+
+    Without a token the endpoint is only served with DEBUG on, so a
+    deployment that forgot to set one does not publish its metrics.
+    """
+    token = getattr(settings, 'METRICS_BEARER_TOKEN', None)
+    if not token and not settings.DEBUG:
+        raise Http404
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,229 @@
+import hashlib
+import math
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from .db_router import pin_to_primary, unpin
+from .metrics import collect, current_metrics, install_query_recorder, registry, server_timing, stop_collecting
+from .streaming import json_response
+from .throttling import load_shedder, throttle
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReadYourWritesMiddleware:
+    """
+    Keep a client's reads on the primary for a while after it writes.
+
+    Requests with unsafe methods always run against the primary. When one of
+    them succeeds, the client (identified by its Token header) is remembered
+    in a shared cache for READ_YOUR_WRITES_WINDOW seconds, and its reads in
+    that window skip the replicas, so it always sees its own posts and likes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'DATABASE_REPLICAS', []):
+            return self.get_response(request)
+
+        key = client_key(request)
+        sticky = key is not None and request.method in SAFE_METHODS and self.cache.get(key)
+        token = pin_to_primary(request.method not in SAFE_METHODS or bool(sticky))
+        try:
+            response = self.get_response(request)
+        finally:
+            unpin(token)
+
+        if self.should_stick(request, response, key):
+            self.cache.set(key, time.time(), timeout=self.window)
+        return response
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'DATABASE_REPLICAS', []):
+            return await self.get_response(request)
+
+        key = client_key(request)
+        sticky = key is not None and request.method in SAFE_METHODS and await self.cache.aget(key)
+        token = pin_to_primary(request.method not in SAFE_METHODS or bool(sticky))
+        try:
+            response = await self.get_response(request)
+        finally:
+            unpin(token)
+
+        if self.should_stick(request, response, key):
+            await self.cache.aset(key, time.time(), timeout=self.window)
+        return response
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'READ_YOUR_WRITES_CACHE_ALIAS', 'default')]
+
+    @property
+    def window(self):
+        return getattr(settings, 'READ_YOUR_WRITES_WINDOW', 5)
+
+    def should_stick(self, request, response, key):
+        return (
+            key is not None
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        )
+
+
+def client_key(request):
+    token = request.headers.get('Token')
+    if not token:
+        return None
+    return 'blog:ryw:' + hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+class QueryMetricsMiddleware:
+    """
+    Record SQL count, SQL time, duplicate queries and handling time per request.
+
+    A METRICS_SAMPLE_RATE share of requests is measured. Their numbers are
+    added to the per-view histograms served by /metrics and, unless
+    METRICS_SERVER_TIMING is off, sent back in a Server-Timing header.
+    Requests that are not sampled cost one random() call.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        # Connections this thread opened before the recorder was installed
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        metrics, token = collect()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_collecting(token)
+        return self.finish(request, response, time.perf_counter() - start, metrics)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        metrics, token = collect()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stop_collecting(token)
+        return self.finish(request, response, time.perf_counter() - start, metrics)
+
+    def sampled(self):
+        rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def finish(self, request, response, duration, metrics):
+        match = request.resolver_match
+        view = match.url_name or match.view_name if match else 'unresolved'
+        if view == 'metrics':
+            return response
+        registry.observe(view, response.status_code, duration, metrics)
+        if getattr(settings, 'METRICS_SERVER_TIMING', True):
+            response.headers['Server-Timing'] = server_timing(duration, metrics)
+        return response
+
+
+class ThrottleMiddleware:
+    """
+    Rate limit and shed the endpoints listed in THROTTLE_RATES.
+
+    Runs in process_view, after URL resolution but before the view resolves
+    the Token header, so a refused request never reaches the database. Over
+    budget clients get a 429; while the process is overloaded (see
+    blog.throttling.LoadShedder) throttled endpoints answer 503. Both carry
+    a Retry-After header.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.leave(request)
+        self.observe()
+        return response
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.leave(request)
+        self.observe()
+        return response
+
+    def leave(self, request):
+        if getattr(request, '_blog_in_flight', False):
+            load_shedder.leave()
+
+    def observe(self):
+        # Set by QueryMetricsMiddleware for sampled requests
+        metrics = current_metrics()
+        if metrics is not None:
+            load_shedder.observe(metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name
+        if url_name not in throttle.rates:
+            return None
+
+        # Only throttled requests count as in flight; cheap reads would
+        # otherwise push the count past SHED_MAX_IN_FLIGHT and shed every write
+        load_shedder.enter()
+        request._blog_in_flight = True
+        reason = load_shedder.reason()
+        if reason is not None:
+            response = json_response({
+                "status": 503,
+                "message": f"{reason}, please try again later"
+            }, status=503)
+            response.headers['Retry-After'] = '1'
+            return response
+
+        wait = throttle.wait(url_name, request)
+        if wait:
+            response = json_response({
+                "status": 429,
+                "message": "Too many requests, please slow down"
+            }, status=429)
+            response.headers['Retry-After'] = str(math.ceil(wait))
+            return response
+        return None
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_like_count(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Like = apps.get_model('blog', 'Like')
+    counts = (
+        Like.objects.filter(like=True)
+        .values('post_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    batch = []
+    for row in counts.iterator(chunk_size=1000):
+        batch.append(Post(id=row['post_id'], like_count=row['total']))
+        if len(batch) >= 1000:
+            Post.objects.bulk_update(batch, ['like_count'])
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, ['like_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_post_private'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_like_count, migrations.RunPython.noop),
+    ]
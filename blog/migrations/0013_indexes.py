@@ -0,0 +1,75 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_likes(apps, schema_editor):
+    # Concurrent get_or_create calls could leave several Like rows for the
+    # same (post, user); keep the most recently updated one.
+    Like = apps.get_model('blog', 'Like')
+    Post = apps.get_model('blog', 'Post')
+    duplicates = (
+        Like.objects.values('post_id', 'user_id')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    touched_posts = set()
+    for row in duplicates.iterator():
+        likes = Like.objects.filter(post_id=row['post_id'], user_id=row['user_id'])
+        keep = likes.order_by('-updated_at', '-id').first()
+        likes.exclude(pk=keep.pk).delete()
+        touched_posts.add(row['post_id'])
+    for post_id in touched_posts:
+        Post.objects.filter(pk=post_id).update(
+            like_count=Like.objects.filter(post_id=post_id, like=True).count()
+        )
+
+
+def dedupe_titles(apps, schema_editor):
+    # add_post and post_update check titles before writing, but not
+    # atomically; suffix later duplicates with their id so they stay unique.
+    Post = apps.get_model('blog', 'Post')
+    duplicates = (
+        Post.objects.values('title')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for row in duplicates.iterator():
+        posts = Post.objects.filter(title=row['title']).order_by('id')
+        for post in posts[1:]:
+            suffix = f' ({post.id})'
+            post.title = post.title[:100 - len(suffix)] + suffix
+            post.save(update_fields=['title'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_post_like_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_likes, migrations.RunPython.noop),
+        migrations.RunPython(dedupe_titles, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(condition=models.Q(('like', True)), fields=['post'], name='like_post_liked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_active', True), ('private', False)), fields=['-id'], name='post_public_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', '-id'], name='post_user_active_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('post', 'user'), name='like_post_user_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='post',
+            constraint=models.UniqueConstraint(fields=('title',), name='post_title_unique'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_deleted_at_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customtoken',
+            name='last_used_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='customtoken',
+            index=models.Index(fields=['created_at'], name='token_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customtoken',
+            index=models.Index(fields=['last_used_at'], name='token_last_used_at_idx'),
+        ),
+    ]
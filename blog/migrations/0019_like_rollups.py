@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_trendingscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAuthorLikes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author_id', models.BigIntegerField()),
+                ('day', models.DateField()),
+                ('likes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyPostLikes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.BigIntegerField()),
+                ('day', models.DateField()),
+                ('likes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailypostlikes',
+            constraint=models.UniqueConstraint(fields=('post_id', 'day'), name='daily_post_likes_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyauthorlikes',
+            index=models.Index(fields=['day', 'author_id', 'likes'], name='daily_author_likes_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyauthorlikes',
+            constraint=models.UniqueConstraint(fields=('author_id', 'day'), name='daily_author_likes_unique'),
+        ),
+    ]
@@ -1,8 +1,17 @@
 from django.db import models
-from django.contrib.auth.hashers import make_password, check_password
+from django.contrib.postgres.search import SearchVectorField
+from django.contrib.auth.hashers import make_password, check_password, identify_hasher
 from django.utils import timezone
 from django.utils.crypto import get_random_string
 
+def is_password_hashed(value):
+    try:
+        identify_hasher(value)
+    except ValueError:
+        return False
+    return True
+
+
 class User(models.Model):
     username = models.CharField(max_length=150)
     email = models.EmailField(unique=True)
@@ -14,28 +23,81 @@ class User(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # purge_deleted
+            models.Index(
+                fields=['deleted_at'], name='user_deleted_at_idx',
+                condition=models.Q(deleted_at__isnull=False),
+            ),
+        ]
 
     def save(self, *args, **kwargs):
-        self.password = make_password(self.password)
+        # Only raw passwords are hashed; an already hashed value is kept as is
+        if not is_password_hashed(self.password):
+            self.password = make_password(self.password)
         super().save(*args, **kwargs)
 
+    def set_password(self, raw_password):
+        self.password = make_password(raw_password)
+
     def check_password(self, raw_password):
-        return check_password(raw_password, self.password)
+        # Re-hash with the preferred hasher when the stored hash is outdated
+        def setter(raw_password):
+            self.set_password(raw_password)
+            self.save(update_fields=['password'])
+
+        return check_password(raw_password, self.password, setter)
 
     def __str__(self):
         return self.username
 
 
+class UserStats(models.Model):
+    """
+    Per-user summary shown by user_data, kept current by blog.user_stats on
+    every post and like write. rebuild_user_stats recomputes it from scratch.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    # All of the user's post rows, including soft-deleted ones
+    post_count = models.IntegerField(default=0)
+    # The rest only count active posts
+    active_post_count = models.IntegerField(default=0)
+    total_likes = models.IntegerField(default=0)
+    last_post_at = models.DateTimeField(null=True, blank=True)
+
+
 class CustomToken(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     token = models.CharField(max_length=64, unique=True)
     created_at = models.DateTimeField(default=timezone.now)
+    # Start of the sliding expiry window, moved forward at most once every
+    # TOKEN_RENEWAL_INTERVAL seconds (see blog.authentication)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # sweep_tokens
+            models.Index(fields=['created_at'], name='token_created_at_idx'),
+            models.Index(fields=['last_used_at'], name='token_last_used_at_idx'),
+        ]
 
     @classmethod
     def generate_token(cls, user):
         token = get_random_string(length=64)
         return cls.objects.create(user=user, token=token)
 
+    @classmethod
+    def reissue(cls, user):
+        """Give `user` a fresh token, replacing (and revoking) any previous one."""
+        now = timezone.now()
+        custom_token, _ = cls.objects.update_or_create(
+            user=user,
+            defaults={'token': get_random_string(length=64), 'created_at': now, 'last_used_at': now},
+        )
+        return custom_token
+
 
 class Post(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE,null=True)
@@ -44,14 +106,151 @@ class Post(models.Model):
     content = models.TextField()
     private = models.BooleanField(default=False,null=True)
     is_active = models.BooleanField(default=True,null=True)
+    # Number of Like rows with like=True, kept in step by blog.likes
+    like_count = models.IntegerField(default=0)
+    # Maintained by a database trigger on PostgreSQL (see 0014_post_search_vector)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['title'], name='post_title_unique'),
+        ]
+        indexes = [
+            # all_post public feed: active public posts, newest first
+            models.Index(
+                fields=['-id'], name='post_public_feed_idx',
+                condition=models.Q(is_active=True, private=False),
+            ),
+            # user_data and the caller's private posts in all_post
+            models.Index(
+                fields=['user', '-id'], name='post_user_active_idx',
+                condition=models.Q(is_active=True),
+            ),
+            # purge_deleted
+            models.Index(
+                fields=['deleted_at'], name='post_deleted_at_idx',
+                condition=models.Q(deleted_at__isnull=False),
+            ),
+        ]
+
+class TrendingScore(models.Model):
+    """
+    Time-decayed like score of a post, for the trending endpoint.
+
+    `score` is the log of the sum of exp(rate * (t - TRENDING_EPOCH)) over
+    the post's likes (see blog.trending). Decaying every score to the same
+    moment subtracts the same amount from each, so ordering by the stored
+    column is ordering by current score, and the index serves the top-K.
+    """
+
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='trending_score_idx'),
+        ]
+
 class Like(models.Model):
     like = models.BooleanField(default=False)
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
-    deleted_at = models.DateTimeField(null=True, blank=True)
\ No newline at end of file
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'user'], name='like_post_user_unique'),
+        ]
+        indexes = [
+            # like counts per post (recount_likes)
+            models.Index(fields=['post'], name='like_post_liked_idx', condition=models.Q(like=True)),
+            # purge_deleted
+            models.Index(
+                fields=['deleted_at'], name='like_deleted_at_idx',
+                condition=models.Q(deleted_at__isnull=False),
+            ),
+        ]
+
+
+# Rows moved out of the live tables by purge_deleted --mode archive. They keep
+# their original ids but no foreign keys or constraints, so archiving never
+# locks or checks the live tables; passwords are not archived.
+
+class ArchivedUser(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    username = models.CharField(max_length=150)
+    email = models.EmailField()
+    age = models.PositiveIntegerField()
+    bio = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    deleted_at = models.DateTimeField(null=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+
+class ArchivedPost(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user_id = models.BigIntegerField(null=True)
+    title = models.CharField(max_length=100)
+    description = models.TextField()
+    content = models.TextField()
+    private = models.BooleanField(null=True)
+    like_count = models.IntegerField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    deleted_at = models.DateTimeField(null=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+
+class ArchivedLike(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    post_id = models.BigIntegerField()
+    user_id = models.BigIntegerField()
+    like = models.BooleanField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    deleted_at = models.DateTimeField(null=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+
+# Daily like rollups, filled by rollup_likes (blog.rollups). Plain ids
+# rather than foreign keys, so history survives purge_deleted.
+
+class DailyPostLikes(models.Model):
+    post_id = models.BigIntegerField()
+    day = models.DateField()
+    likes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post_id', 'day'], name='daily_post_likes_unique'),
+        ]
+
+
+class DailyAuthorLikes(models.Model):
+    author_id = models.BigIntegerField()
+    day = models.DateField()
+    likes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['author_id', 'day'], name='daily_author_likes_unique'),
+        ]
+        indexes = [
+            # top authors over a range of days
+            models.Index(fields=['day', 'author_id', 'likes'], name='daily_author_likes_day_idx'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """The highest Like id a rollup has counted."""
+
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
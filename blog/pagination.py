@@ -0,0 +1,76 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+
+
+class InvalidPage(ValueError):
+    pass
+
+
+def encode_cursor(position):
+    """Encode a keyset position (a dict of column values) as an opaque string."""
+    raw = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidPage("Invalid cursor")
+    if not isinstance(position, dict):
+        raise InvalidPage("Invalid cursor")
+    return position
+
+
+def decode_id_cursor(cursor):
+    """Decode a cursor produced for an `-id` ordered listing."""
+    position = decode_cursor(cursor)
+    if position is None:
+        return None
+    last_id = position.get('id')
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        raise InvalidPage("Invalid cursor")
+    return last_id
+
+
+def get_page_size(params, default=None, maximum=None):
+    default = default or getattr(settings, 'FEED_PAGE_SIZE', 20)
+    maximum = maximum or getattr(settings, 'FEED_MAX_PAGE_SIZE', 100)
+    value = params.get('page_size')
+    if value in (None, ''):
+        return default
+    try:
+        page_size = int(value)
+    except ValueError:
+        raise InvalidPage("page_size must be a positive integer")
+    if page_size < 1:
+        raise InvalidPage("page_size must be a positive integer")
+    return min(page_size, maximum)
+
+
+def paginate_by_id(queryset, last_id, page_size):
+    """
+    Return one page of a queryset ordered by `-id` plus the next cursor.
+
+    The page is selected with `id < last_id` rather than OFFSET, so every page
+    costs the same index range scan no matter how deep the client has paged.
+    """
+    if last_id is not None:
+        queryset = queryset.filter(id__lt=last_id)
+    return build_page(list(queryset.order_by('-id')[:page_size + 1]), page_size)
+
+
+def build_page(rows, page_size):
+    """Trim `page_size + 1` rows ordered by `-id` to a page and its next cursor."""
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor({'id': last['id'] if isinstance(last, dict) else last.id})
+    return rows, next_cursor
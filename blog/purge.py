@@ -0,0 +1,119 @@
+import time
+
+from django.db import transaction
+
+from .feed_cache import bump_feed_version, public_posts
+from .likes import apply_like_count_deltas
+from .models import ArchivedLike, ArchivedPost, ArchivedUser, Like, Post, User
+from .user_stats import rebuild_stats
+
+ARCHIVE_FIELDS = {
+    User: (ArchivedUser, ('id', 'username', 'email', 'age', 'bio', 'created_at', 'updated_at', 'deleted_at')),
+    Post: (ArchivedPost, (
+        'id', 'user_id', 'title', 'description', 'content', 'private', 'like_count',
+        'created_at', 'updated_at', 'deleted_at',
+    )),
+    Like: (ArchivedLike, ('id', 'post_id', 'user_id', 'like', 'created_at', 'updated_at', 'deleted_at')),
+}
+
+
+class Purger:
+    """
+    Archive or hard-delete users, posts and likes soft-deleted before `cutoff`.
+
+    Work is done in batches of `batch_size` rows, each in its own short
+    transaction followed by a `pause`, so blog_post and blog_like are never
+    locked for long. Dependent rows go first (a post's likes before the post,
+    a user's posts and likes before the user), so no delete cascades over a
+    large set. Every committed batch is final, which makes an interrupted run
+    safe to start again: it continues with whatever is left.
+
+    Purging a user removes all of their posts, live ones included, along
+    with every like by or on them.
+    """
+
+    def __init__(self, cutoff, archive=True, batch_size=500, pause=0.0, progress=None):
+        self.cutoff = cutoff
+        self.archive = archive
+        self.batch_size = batch_size
+        self.pause = pause
+        self.progress = progress
+        self.totals = {'likes': 0, 'posts': 0, 'users': 0}
+
+    def run(self):
+        self.purge_likes(Like.objects.filter(deleted_at__lt=self.cutoff), adjust_counts=True)
+        self.purge_posts(Post.objects.filter(deleted_at__lt=self.cutoff))
+        self.purge_users(User.objects.filter(deleted_at__lt=self.cutoff))
+        return self.totals
+
+    def batches(self, queryset):
+        """Yield the ids of `queryset` in batches, in id order."""
+        last_id = 0
+        while True:
+            ids = list(
+                queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return
+            last_id = ids[-1]
+            yield ids
+
+    def purge_likes(self, queryset, adjust_counts):
+        """
+        Purge `queryset`'s likes. With `adjust_counts`, like_count is lowered
+        on the (live) posts that lose a like=True row.
+        """
+        for ids in self.batches(queryset):
+            with transaction.atomic():
+                likes = queryset.filter(id__in=ids).select_for_update()
+                deltas = {}
+                if adjust_counts:
+                    for post_id in likes.filter(like=True).values_list('post_id', flat=True):
+                        deltas[post_id] = deltas.get(post_id, 0) - 1
+                count = self.move(likes)
+                apply_like_count_deltas(deltas)
+                if deltas:
+                    transaction.on_commit(bump_feed_version)
+            self.done('likes', count, ids[-1])
+
+    def purge_posts(self, queryset):
+        for ids in self.batches(queryset):
+            self.purge_likes(Like.objects.filter(post_id__in=ids), adjust_counts=False)
+            with transaction.atomic():
+                user_ids = set(queryset.filter(id__in=ids).values_list('user_id', flat=True))
+                # A purged user's live posts are still in the cached feed
+                if public_posts().filter(id__in=ids).exists():
+                    transaction.on_commit(bump_feed_version)
+                # Likes added since the pass above would otherwise cascade
+                self.move(Like.objects.filter(post_id__in=ids))
+                count = self.move(queryset.filter(id__in=ids))
+                # post_count includes deleted posts, so it drops here
+                rebuild_stats(list(user_ids - {None}))
+            self.done('posts', count, ids[-1])
+
+    def purge_users(self, queryset):
+        for ids in self.batches(queryset):
+            self.purge_posts(Post.objects.filter(user_id__in=ids))
+            self.purge_likes(Like.objects.filter(user_id__in=ids), adjust_counts=True)
+            with transaction.atomic():
+                # Tokens are dropped with their users, never archived
+                count = self.move(queryset.filter(id__in=ids))
+            self.done('users', count, ids[-1])
+
+    def move(self, queryset):
+        """Copy the rows to their archive table (in archive mode) and delete them."""
+        if self.archive:
+            archive_model, fields = ARCHIVE_FIELDS[queryset.model]
+            archive_model.objects.bulk_create(
+                [archive_model(**row) for row in queryset.values(*fields)],
+                ignore_conflicts=True,
+            )
+        _, deleted = queryset.delete()
+        return deleted.get(queryset.model._meta.label, 0)
+
+    def done(self, kind, count, last_id):
+        self.totals[kind] += count
+        if self.progress is not None:
+            self.progress(kind, self.totals[kind], last_id)
+        if self.pause:
+            time.sleep(self.pause)
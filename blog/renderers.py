@@ -0,0 +1,44 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional accelerator, see FastJSONRenderer
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that serializes with orjson when it is installed.
+
+    Only the compact, non-indented, UTF-8 output that the API normally sends
+    takes the fast path. It produces the same bytes as JSONRenderer with two
+    exceptions: floats in exponent form drop the '+' (1e300, not 1e+300), and
+    NaN or Infinity become null instead of raising. Types orjson does not
+    handle itself (datetimes, Decimals, lazy strings, ...) go through DRF's
+    encoder, so they are formatted exactly as before. Anything orjson
+    rejects, and every other output style, is rendered by JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                # Leave datetimes and dataclasses to DRF's encoder
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except TypeError:
+            # Unsupported types and integers beyond 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same \u2028 / \u2029 escaping as JSONRenderer. Their last UTF-8 byte
+        # never occurs in ASCII, and a single-byte scan is much cheaper than
+        # the replace, so most bodies skip it.
+        if b'\xa8' in ret or b'\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
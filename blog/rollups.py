@@ -0,0 +1,150 @@
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DailyAuthorLikes, DailyPostLikes, Like, RollupWatermark, User
+
+WATERMARK = 'daily_likes'
+
+
+def rollup_batch(batch_size, lag):
+    """
+    Count the next `batch_size` likes past the watermark into the daily
+    rollups and move the watermark past them, in one transaction.
+
+    Likes are taken in id order and only while they are older than `lag`
+    seconds: an id is handed out before its row commits, so a newer id can
+    become visible before an older one, but not `lag` seconds later. Each
+    like counts once, on the day (in TIME_ZONE) its row was created, if it
+    is a like (not an unlike) when counted. Returns the number of likes
+    scanned, 0 once caught up.
+    """
+    cutoff = timezone.now() - timedelta(seconds=lag)
+    with transaction.atomic():
+        # Also keeps two runs from counting the same likes
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK)
+        rows = []
+        for row in (
+            Like.objects.filter(id__gt=watermark.last_id).order_by('id')
+            .values_list('id', 'post_id', 'post__user_id', 'created_at', 'like')[:batch_size]
+        ):
+            if row[3] > cutoff:
+                break
+            rows.append(row)
+        if not rows:
+            return 0
+
+        post_counts, author_counts = {}, {}
+        for _, post_id, author_id, created_at, like in rows:
+            if not like:
+                continue
+            day = timezone.localdate(created_at)
+            post_counts[post_id, day] = post_counts.get((post_id, day), 0) + 1
+            if author_id is not None:
+                author_counts[author_id, day] = author_counts.get((author_id, day), 0) + 1
+
+        add_counts(DailyPostLikes, 'post_id', post_counts)
+        add_counts(DailyAuthorLikes, 'author_id', author_counts)
+        watermark.last_id = rows[-1][0]
+        watermark.save(update_fields=['last_id', 'updated_at'])
+    return len(rows)
+
+
+def add_counts(model, key, counts):
+    """Add `counts` ((key, day) -> likes) to the rows of `model`, creating missing ones."""
+    if not counts:
+        return
+    totals = dict(counts)
+    existing = model.objects.select_for_update().filter(
+        **{f'{key}__in': {item for item, _ in counts}}, day__in={day for _, day in counts}
+    ).values_list(key, 'day', 'likes')
+    for item, day, likes in existing:
+        if (item, day) in totals:
+            totals[item, day] += likes
+    model.objects.bulk_create(
+        [model(**{key: item}, day=day, likes=likes) for (item, day), likes in totals.items()],
+        update_conflicts=True,
+        unique_fields=[key, 'day'],
+        update_fields=['likes'],
+    )
+
+
+def run_rollup(batch_size=5000, lag=60, max_batches=None, pause=0.0, progress=None):
+    """
+    Roll up likes batch by batch until caught up (or `max_batches` are done).
+    Every batch commits with its watermark, so an interrupted run, a first
+    backfill included, resumes where it stopped. Returns the likes scanned.
+    """
+    scanned = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = rollup_batch(batch_size, lag)
+        if not count:
+            break
+        scanned += count
+        batches += 1
+        if progress is not None:
+            progress(scanned)
+        if pause:
+            time.sleep(pause)
+    return scanned
+
+
+def reset_rollups():
+    with transaction.atomic():
+        DailyPostLikes.objects.all().delete()
+        DailyAuthorLikes.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK).delete()
+
+
+class InvalidRange(ValueError):
+    pass
+
+
+def parse_day_range(params, default_days, max_days):
+    """
+    Read `start` and `end` (YYYY-MM-DD, inclusive) from query params. `end`
+    defaults to today and `start` to `default_days` days ending with `end`.
+    """
+    try:
+        end = parse_date(params['end']) if params.get('end') else timezone.localdate()
+        start = parse_date(params['start']) if params.get('start') else end - timedelta(days=default_days - 1)
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        raise InvalidRange("start and end must be dates in YYYY-MM-DD format")
+    if start > end:
+        raise InvalidRange("start must not be after end")
+    if (end - start).days >= max_days:
+        raise InvalidRange(f"The range may span at most {max_days} days")
+    return start, end
+
+
+def post_likes_by_day(post_id, start, end):
+    """Likes per day of `post_id` from `start` to `end` (inclusive), with empty days as 0."""
+    likes = dict(
+        DailyPostLikes.objects.filter(post_id=post_id, day__range=(start, end)).values_list('day', 'likes')
+    )
+    return [
+        {'day': day.isoformat(), 'likes': likes.get(day, 0)}
+        for day in (start + timedelta(days=offset) for offset in range((end - start).days + 1))
+    ]
+
+
+def top_authors(start, end, limit):
+    """The `limit` active authors with the most likes from `start` to `end` (inclusive)."""
+    rows = list(
+        DailyAuthorLikes.objects.filter(day__range=(start, end))
+        .exclude(author_id__in=User.objects.filter(is_active=False).values('id'))
+        .values('author_id')
+        .annotate(likes=Sum('likes'))
+        .order_by('-likes', 'author_id')[:limit]
+    )
+    usernames = dict(User.objects.filter(id__in=[row['author_id'] for row in rows]).values_list('id', 'username'))
+    return [
+        {'author_id': row['author_id'], 'username': usernames.get(row['author_id']), 'likes': row['likes']}
+        for row in rows
+    ]
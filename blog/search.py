@@ -0,0 +1,69 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .feed_cache import FEED_FIELDS, visible_posts
+from .pagination import InvalidPage, decode_cursor, encode_cursor
+
+
+def ranked_matches(queryset, query):
+    """Filter `queryset` to posts matching `query` and annotate their `rank`."""
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, search_type='websearch', config='english')
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        )
+
+    # SQLite fallback over the blog_post_fts table (tests and local runs)
+    match = fts5_match_expression(query)
+    return queryset.filter(
+        id__in=RawSQL("SELECT rowid FROM blog_post_fts WHERE blog_post_fts MATCH %s", (match,))
+    ).annotate(rank=RawSQL(
+        "SELECT -bm25(blog_post_fts, 4.0, 2.0, 1.0) FROM blog_post_fts "
+        "WHERE blog_post_fts MATCH %s AND blog_post_fts.rowid = blog_post.id",
+        (match,),
+        output_field=FloatField(),
+    ))
+
+
+def fts5_match_expression(query):
+    # Quote every term so user input can never be parsed as FTS5 syntax
+    terms = ['"{}"'.format(term.replace('"', '""')) for term in query.split()]
+    return ' AND '.join(terms)
+
+
+def decode_rank_cursor(cursor):
+    position = decode_cursor(cursor)
+    if position is None:
+        return None
+    rank, last_id = position.get('rank'), position.get('id')
+    if not isinstance(rank, (int, float)) or not isinstance(last_id, int) \
+            or isinstance(rank, bool) or isinstance(last_id, bool):
+        raise InvalidPage("Invalid cursor")
+    return rank, last_id
+
+
+def search_posts(user, query, cursor, page_size):
+    """
+    Return one page of posts visible to `user` that match `query`, best first.
+
+    Pages are keyed on (rank, id) like the id cursor of all_post, so a deep
+    page costs no more than the first one.
+    """
+    posts = ranked_matches(visible_posts(user), query)
+    position = decode_rank_cursor(cursor)
+    if position is not None:
+        rank, last_id = position
+        posts = posts.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=last_id))
+
+    rows = list(
+        posts.order_by('-rank', '-id').values(*FEED_FIELDS, 'rank', likes_count=F('like_count'))[:page_size + 1]
+    )
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor({'rank': rows[-1]['rank'], 'id': rows[-1]['id']})
+    for row in rows:
+        del row['rank']
+    return rows, next_cursor
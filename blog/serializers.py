@@ -1,21 +1,55 @@
 from rest_framework import serializers
 from .models import User, Post, Like
 
+class InvalidFields(ValueError):
+    pass
+
+def parse_fields(value, allowed):
+    """
+    Parse a `fields=title,description` query parameter into a tuple of names.
+
+    Names come back in the order of `allowed` and always include `id`, which
+    the cursors and like counts are keyed on. Returns None when no subset was
+    asked for; unknown names raise InvalidFields.
+    """
+    if value is None:
+        return None
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    if not requested:
+        raise InvalidFields("fields must list at least one field")
+    unknown = requested - set(allowed)
+    if unknown:
+        raise InvalidFields(f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.add('id')
+    return tuple(name for name in allowed if name in requested)
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer taking a `fields` argument that limits the output to those fields."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def source_fields(cls, fields=None):
+        """Model columns to load with `.only()` for the given output fields."""
+        return [field.source for field in cls(fields=fields).fields.values()]
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'age', 'bio', 'is_active']
 
-class PostSerializer(serializers.ModelSerializer):
-    total_likes = serializers.SerializerMethodField()
+class PostSerializer(DynamicFieldsModelSerializer):
+    total_likes = serializers.IntegerField(source='like_count', read_only=True)
 
     class Meta:
         model = Post
         fields = ['id', 'title', 'description', 'content', 'total_likes']
 
-    def get_total_likes(self, obj):
-        return Like.objects.filter(post=obj, like=True).count()
-
 class LikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Like
@@ -0,0 +1,52 @@
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.settings import api_settings
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
+
+
+def get_json_renderer():
+    # The renderer regular responses use, so both modes emit the same bytes
+    return api_settings.DEFAULT_RENDERER_CLASSES[0]()
+
+
+def json_response(data, status=200):
+    """A plain HttpResponse with the same bytes a DRF Response of `data` renders to."""
+    renderer = get_json_renderer()
+    return HttpResponse(renderer.render(data), status=status, content_type=renderer.media_type)
+
+
+def stream_envelope(head, key, rows, tail):
+    """
+    Yield `head` as a JSON object with `rows` streamed as its `key` list.
+
+    `rows` is consumed lazily, one chunk of JSON per row, and `tail()` is
+    called once they are exhausted for the keys that follow the list. The
+    result is byte-for-byte what the renderer produces for the whole dict.
+    """
+    renderer = get_json_renderer()
+    item_separator, key_separator = SHORT_SEPARATORS if renderer.compact else LONG_SEPARATORS
+    item_separator = item_separator.encode()
+    key_separator = key_separator.encode()
+
+    def render(value):
+        # JSONRenderer renders None as an empty body rather than null
+        return b'null' if value is None else renderer.render(value)
+
+    yield render(head)[:-1] + item_separator + render(key) + key_separator + b'['
+    first = True
+    for row in rows:
+        if not first:
+            yield item_separator
+        yield render(row)
+        first = False
+    yield b']'
+    for name, value in tail().items():
+        yield item_separator + render(name) + key_separator + render(value)
+    yield b'}'
+
+
+def streaming_json_response(head, key, rows, tail, status=200):
+    return StreamingHttpResponse(
+        stream_envelope(head, key, rows, tail),
+        status=status,
+        content_type=get_json_renderer().media_type,
+    )
@@ -1,3 +1,1532 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import decimal
+import io
+import os
+import tempfile
+import threading
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from .authentication import token_cache
+from .db_router import PrimaryReplicaRouter, replica_is_healthy, reset_replica_health
+from .feed_cache import bump_feed_version, get_public_page, private_posts, public_posts
+from .hashing import HashingPoolBusy, PasswordHashingPool, password_hashing_pool
+from .like_buffer import LikeBuffer, read_spool
+from .likes import upsert_likes
+from .metrics import registry
+from .middleware import QueryMetricsMiddleware, ReadYourWritesMiddleware
+from .models import (
+    ArchivedLike, ArchivedPost, ArchivedUser, CustomToken, DailyAuthorLikes, DailyPostLikes, Like, Post, RollupWatermark,
+    TrendingScore, User, UserStats
+)
+from .pagination import encode_cursor
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .throttling import load_shedder, throttle
+from .transfer import Importer
+from .trending import likes_changed, recompute_scores
+from .user_stats import rebuild_stats
+
+
+def create_user(username, **kwargs):
+    return User.objects.create(
+        username=username, email=f'{username}@example.com', password='secret', age=30, bio='', **kwargs
+    )
+
+
+class BlogTestCase(TestCase):
+    """An author with a token and a fan without one; the token and feed caches start out empty."""
+
+    def setUp(self):
+        token_cache.clear()
+        # Pages cached by earlier tests outlive their rolled back rows
+        bump_feed_version()
+        self.author = create_user('author')
+        self.custom_token = CustomToken.generate_token(self.author)
+        self.token = self.custom_token.token
+        self.fan = create_user('fan')
+
+    def token_for(self, user):
+        return CustomToken.generate_token(user).token
+
+
+class TokenAuthenticationTests(BlogTestCase):
+    def user_update(self, **data):
+        data = {'username': 'renamed', 'email': 'author@example.com', 'age': 31, 'bio': 'b', **data}
+        return self.client.put('/user_update/', data, HTTP_TOKEN=self.token, content_type='application/json')
+
+    def test_token_is_cached(self):
+        self.assertEqual(self.client.get('/user_data/', HTTP_TOKEN=self.token).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/user_data/', HTTP_TOKEN=self.token)
+        self.assertFalse([q for q in queries if 'blog_customtoken' in q['sql']])
+        self.assertEqual(self.client.get('/user_data/', HTTP_TOKEN='unknown').status_code, 401)
+        self.assertEqual(self.client.get('/user_data/').status_code, 400)
+
+    def test_update_writes_only_the_sent_columns(self):
+        response = self.user_update()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['username'], 'renamed')
+        # The cache was invalidated, so the next request sees the new row
+        self.assertEqual(self.client.get('/user_data/', HTTP_TOKEN=self.token).json()['user']['age'], 31)
+
+    def test_stale_cached_user_is_not_written_back(self):
+        self.client.get('/user_data/', HTTP_TOKEN=self.token)
+        deleted_at = timezone.now()
+        User.objects.filter(pk=self.author.pk).update(is_active=False, deleted_at=deleted_at)
+
+        self.assertEqual(self.user_update().status_code, 404)
+        self.assertEqual(
+            User.objects.filter(pk=self.author.pk).values_list('username', 'is_active', 'deleted_at').get(),
+            ('author', False, deleted_at),
+        )
+
+    def test_delete_leaves_other_columns_alone(self):
+        self.client.get('/user_data/', HTTP_TOKEN=self.token)
+        User.objects.filter(pk=self.author.pk).update(bio='edited elsewhere')
+
+        response = self.client.delete('/delete_user/', HTTP_TOKEN=self.token)
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(pk=self.author.pk)
+        self.assertEqual((user.is_active, user.bio), (False, 'edited elsewhere'))
+        self.assertIsNotNone(user.deleted_at)
+
+
+class PasswordHashingTests(BlogTestCase):
+    def test_save_keeps_an_already_hashed_password(self):
+        self.assertTrue(check_password('secret', self.author.password))
+        hashed = self.author.password
+        self.author.bio = 'edited'
+        with mock.patch('blog.models.make_password') as make_password_mock:
+            self.author.save()
+        make_password_mock.assert_not_called()
+        self.assertEqual(User.objects.get(pk=self.author.pk).password, hashed)
+
+    def test_saturated_pool_refuses_work(self):
+        pool = PasswordHashingPool(workers=1, queue_size=0, timeout=5)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_make_password(raw_password):
+            started.set()
+            release.wait(5)
+            return 'hashed'
+
+        with mock.patch('blog.hashing.make_password', slow_make_password):
+            worker = threading.Thread(target=pool.make_password, args=('first',))
+            worker.start()
+            self.addCleanup(worker.join)
+            self.addCleanup(release.set)
+            started.wait(5)
+            with self.assertRaises(HashingPoolBusy):
+                pool.make_password('second')
+            release.set()
+            worker.join()
+            self.assertEqual(pool.make_password('third'), 'hashed')
+
+    def test_slow_hash_times_out(self):
+        pool = PasswordHashingPool(workers=1, queue_size=0, timeout=0.01)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with mock.patch('blog.hashing.make_password', lambda raw_password: release.wait(5)):
+            with self.assertRaises(HashingPoolBusy):
+                pool.make_password('first')
+
+    def test_endpoints_answer_503_when_the_pool_is_busy(self):
+        busy = mock.patch.object(password_hashing_pool, '_run', side_effect=HashingPoolBusy)
+        with busy:
+            response = self.client.post('/add_user/', {
+                'username': 'new', 'email': 'new@example.com', 'password': 'pw', 'age': 20
+            })
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json()['status'], 503)
+            self.assertFalse(User.objects.filter(email='new@example.com').exists())
+
+            response = self.client.post('/login/', {'email': 'author@example.com', 'password': 'secret'})
+            self.assertEqual(response.status_code, 503)
+
+
+class FeedPaginationTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = create_user('other')
+        self.visible = []
+        for i in range(7):
+            # Alternate authors; the other user's private posts and all inactive ones stay hidden
+            user = self.author if i % 2 else self.other
+            post = Post.objects.create(user=user, title=f'post {i}', description='d', content='c',
+                                       private=i % 3 == 0, is_active=i != 5)
+            if post.is_active and (user == self.author or not post.private):
+                self.visible.append(post.id)
+        self.visible.reverse()
+
+    def get(self, **params):
+        return self.client.get('/all_post/', params, HTTP_TOKEN=self.token)
+
+    def test_cursor_walks_visible_posts(self):
+        seen, cursor = [], None
+        while True:
+            body = self.get(page_size='2', **({'cursor': cursor} if cursor else {})).json()
+            self.assertEqual(body['total_post'], len(self.visible))
+            seen.extend(row['id'] for row in body['data'])
+            cursor = body['next']
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.visible)
+        self.assertEqual([row['id'] for row in self.get().json()['data']], self.visible)
+
+    def test_invalid_cursor_and_page_size(self):
+        for params in ({'cursor': 'not base64!'}, {'cursor': encode_cursor({'id': 'x'})}, {'cursor': 'WzFd'},
+                       {'page_size': '0'}, {'page_size': 'ten'}):
+            response = self.get(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.json()['status'], 400)
+
+
+class FeedCacheTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fan_token = self.token_for(self.fan)
+        self.post = Post.objects.create(user=self.author, title='public', description='d', content='c')
+        self.secret = Post.objects.create(user=self.author, title='secret', description='d', content='c', private=True)
+
+    def public_page(self):
+        rows, total = get_public_page(None, 20)
+        return [(row['id'], row['likes_count']) for row in rows], total
+
+    def fan_feed_ids(self):
+        return [row['id'] for row in self.client.get('/all_post/', HTTP_TOKEN=self.fan_token).json()['data']]
+
+    def test_writes_invalidate_the_cached_page(self):
+        self.assertEqual(self.public_page(), ([(self.post.id, 0)], 1))
+        # Cached: a change behind the API's back is not seen
+        Post.objects.filter(pk=self.post.pk).update(like_count=5)
+        self.assertEqual(self.public_page(), ([(self.post.id, 0)], 1))
+        Post.objects.filter(pk=self.post.pk).update(like_count=0)
+
+        self.client.post('/add_post/', {'title': 'new', 'description': 'd', 'content': 'c'}, HTTP_TOKEN=self.token)
+        new = Post.objects.get(title='new')
+        self.assertEqual(self.public_page(), ([(new.id, 0), (self.post.id, 0)], 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/add_like/', {'post_id': self.post.id, 'like': True}, HTTP_TOKEN=self.fan_token,
+                             content_type='application/json')
+        self.assertEqual(self.public_page(), ([(new.id, 0), (self.post.id, 1)], 2))
+
+        self.client.delete('/delete_post/', {'post_id': new.id}, HTTP_TOKEN=self.token,
+                           content_type='application/json')
+        self.assertEqual(self.public_page(), ([(self.post.id, 1)], 1))
+
+    def test_private_posts_stay_out_of_the_shared_page(self):
+        # The author's request merges their private post into their own feed only
+        own = [row['id'] for row in self.client.get('/all_post/', HTTP_TOKEN=self.token).json()['data']]
+        self.assertEqual(own, [self.secret.id, self.post.id])
+        self.assertEqual(self.public_page(), ([(self.post.id, 0)], 1))
+        self.assertEqual(self.fan_feed_ids(), [self.post.id])
+
+        self.client.post('/add_post/', {'title': 'also secret', 'description': 'd', 'content': 'c', 'private': True},
+                         HTTP_TOKEN=self.token, content_type='application/json')
+        self.assertTrue(Post.objects.filter(title='also secret', private=True).exists())
+        self.assertEqual(self.public_page(), ([(self.post.id, 0)], 1))
+        self.assertEqual(self.fan_feed_ids(), [self.post.id])
+
+
+class BulkLikeTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = Post.objects.create(user=self.author, title='first', description='d', content='c', like_count=1)
+        self.second = Post.objects.create(user=self.author, title='second', description='d', content='c')
+        Like.objects.create(post=self.first, user=self.author, like=True)
+
+    def add_likes(self, likes):
+        return self.client.post('/add_likes/', {'likes': likes}, HTTP_TOKEN=self.token, content_type='application/json')
+
+    def test_per_item_statuses(self):
+        response = self.add_likes([
+            {'post_id': self.first.id, 'like': True},
+            {'post_id': str(self.second.id), 'like': True},
+            {'post_id': 999, 'like': True},
+            {'post_id': True, 'like': True},
+            {'post_id': 1.7, 'like': True},
+            {'post_id': '1.7', 'like': True},
+            {'post_id': self.second.id, 'like': 'yes'},
+            'not an object',
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(item['status'], item['message']) for item in response.json()['data']],
+            [
+                (200, "Like updated successfully"),
+                (200, "Like updated successfully"),
+                (400, "Post does not exist"),
+                (400, "post_id is required and must be an integer"),
+                (400, "post_id is required and must be an integer"),
+                (400, "post_id is required and must be an integer"),
+                (400, "Invalid value for 'like'. It should be a boolean (True/False)"),
+                (400, "post_id is required and must be an integer"),
+            ],
+        )
+        self.assertEqual(Like.objects.filter(user=self.author).count(), 2)
+
+    def test_later_duplicates_win(self):
+        response = self.add_likes([
+            {'post_id': self.second.id, 'like': True},
+            {'post_id': self.first.id, 'like': True},
+            {'post_id': self.second.id, 'like': False},
+        ])
+        self.assertEqual(
+            [item['message'] for item in response.json()['data']],
+            ["Superseded by a later like for the same post", "Like updated successfully", "Like updated successfully"],
+        )
+        self.assertFalse(Like.objects.get(post=self.second, user=self.author).like)
+
+    def test_like_counts_follow_the_changes(self):
+        fan_token = self.token_for(self.fan)
+        self.add_likes([{'post_id': self.first.id, 'like': False}, {'post_id': self.second.id, 'like': True}])
+        self.client.post('/add_likes/', {'likes': [
+            {'post_id': self.first.id, 'like': True}, {'post_id': self.second.id, 'like': True}
+        ]}, HTTP_TOKEN=fan_token, content_type='application/json')
+        # Sending the same values again changes nothing
+        self.add_likes([{'post_id': self.first.id, 'like': False}, {'post_id': self.second.id, 'like': True}])
+        self.assertEqual(
+            list(Post.objects.order_by('id').values_list('like_count', flat=True)), [1, 2]
+        )
+
+    @override_settings(BULK_LIKE_MAX_ITEMS=2)
+    def test_request_is_validated(self):
+        for likes in ([], {'post_id': 1}, [{'post_id': self.first.id, 'like': True}] * 3):
+            response = self.add_likes(likes)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['status'], 400)
+
+    def test_posts_are_locked_before_the_likes_are_read(self):
+        # FOR UPDATE cannot lock like rows that do not exist yet, so concurrent
+        # batches inserting the same new pair are serialized on the posts
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch('blog.likes.Post.objects.select_for_update', wraps=Post.objects.select_for_update) as lock:
+            upsert_likes({(self.fan.id, self.second.id): True, (self.fan.id, self.first.id): True})
+        lock.assert_called_once_with()
+        first_read = next(q['sql'] for q in queries if q['sql'].startswith('SELECT'))
+        self.assertIn('FROM "blog_post"', first_read)
+        self.assertEqual(list(Post.objects.order_by('id').values_list('like_count', flat=True)), [2, 1])
+
+
+class LikeCountTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fan_token = self.token_for(self.fan)
+        self.post = Post.objects.create(user=self.author, title='post', description='d', content='c')
+
+    def like(self, like, token=None):
+        response = self.client.post('/add_like/', {'post_id': self.post.id, 'like': like},
+                                    HTTP_TOKEN=token or self.fan_token, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return Post.objects.get(pk=self.post.pk).like_count
+
+    def recount(self, *args):
+        out = io.StringIO()
+        call_command('recount_likes', '--batch-size', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_flips_move_like_count(self):
+        self.assertEqual(self.like(True), 1)
+        self.assertEqual(self.like(True), 1)
+        self.assertEqual(self.like(True, token=self.token), 2)
+        self.assertEqual(self.like(False), 1)
+        self.assertEqual(self.like(False), 1)
+        self.assertEqual(self.like(True), 2)
+        self.assertEqual(Like.objects.filter(post=self.post, like=True).count(), 2)
+
+    def test_recount_likes_repairs_drift(self):
+        other = Post.objects.create(user=self.author, title='other', description='d', content='c')
+        self.like(True)
+        Post.objects.filter(pk=self.post.pk).update(like_count=9)
+
+        self.assertIn('1 drifted', self.recount('--dry-run'))
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 9)
+        self.assertIn('2 posts checked, 1 repaired', self.recount())
+        self.assertEqual(
+            dict(Post.objects.filter(pk__in=[self.post.pk, other.pk]).values_list('id', 'like_count')),
+            {self.post.pk: 1, other.pk: 0},
+        )
+        self.assertIn('0 repaired', self.recount())
+
+
+class UserDataQueryCountTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        UserStats.objects.create(user=self.author)
+
+    def create_posts(self, count):
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            post = Post.objects.create(
+                user=self.author, title=f'post {i}', description='d', content='c', like_count=1
+            )
+            Like.objects.create(post=post, user=self.fan, like=True)
+
+    def get_user_data(self):
+        return self.client.get('/user_data/', HTTP_TOKEN=self.token)
+
+    def test_query_count_does_not_grow_with_posts(self):
+        # Token lookup, the ETag aggregate, the posts and the stats row
+        self.create_posts(2)
+        with self.assertNumQueries(4):
+            response = self.get_user_data()
+        self.assertEqual(len(response.json()['posts']), 2)
+
+        token_cache.clear()
+        self.create_posts(20)
+        with self.assertNumQueries(4):
+            response = self.get_user_data()
+        self.assertEqual(len(response.json()['posts']), 22)
+        self.assertTrue(all(post['total_likes'] == 1 for post in response.json()['posts']))
+
+    def test_inactive_posts_are_excluded(self):
+        self.create_posts(3)
+        Post.objects.filter(title='post 1').update(is_active=False)
+        titles = [post['title'] for post in self.get_user_data().json()['posts']]
+        self.assertEqual(titles, ['post 2', 'post 0'])
+
+    @override_settings(USER_DATA_MAX_POSTS=5)
+    def test_posts_are_bounded(self):
+        self.create_posts(8)
+        posts = self.get_user_data().json()['posts']
+        self.assertEqual([post['title'] for post in posts], [f'post {i}' for i in range(7, 2, -1)])
+
+
+class UserStatsTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fan_token = self.token_for(self.fan)
+
+    def stats(self):
+        return self.client.get('/user_data/', HTTP_TOKEN=self.token).json()['stats']
+
+    def add_post(self, title):
+        self.client.post('/add_post/', {'title': title, 'description': 'd', 'content': 'c'}, HTTP_TOKEN=self.token)
+        return Post.objects.get(title=title)
+
+    def like(self, post, like, token=None):
+        self.client.post('/add_like/', {'post_id': post.id, 'like': like}, HTTP_TOKEN=token or self.fan_token,
+                         content_type='application/json')
+
+    def test_write_paths_keep_stats_current(self):
+        # Built on first read for a user without a summary
+        self.assertEqual(self.stats()['post_count'], 0)
+        first = self.add_post('first')
+        second = self.add_post('second')
+        self.like(first, True)
+        self.like(second, True)
+        self.like(second, True, token=self.token)
+        self.like(first, False)
+        self.client.post('/add_likes/', {'likes': [{'post_id': first.id, 'like': True}]},
+                         HTTP_TOKEN=self.token, content_type='application/json')
+        self.client.delete('/delete_post/', {'post_id': second.id}, HTTP_TOKEN=self.token,
+                           content_type='application/json')
+        # Deleting twice, or liking a deleted post, changes nothing
+        self.client.delete('/delete_post/', {'post_id': second.id}, HTTP_TOKEN=self.token,
+                           content_type='application/json')
+        self.like(second, False)
+
+        stats = self.stats()
+        self.assertEqual(stats, {
+            'post_count': 2, 'active_post_count': 1, 'total_likes': 1,
+            'last_post_at': stats['last_post_at'],
+        })
+        self.assertEqual(
+            UserStats.objects.filter(user=self.author).values(
+                'post_count', 'active_post_count', 'total_likes', 'last_post_at'
+            ).get(),
+            dict(
+                post_count=2, active_post_count=1, total_likes=1,
+                last_post_at=Post.objects.get(pk=first.pk).created_at,
+            ),
+        )
+        call_command('check_user_stats', stdout=io.StringIO())
+
+    def test_check_and_rebuild(self):
+        Post.objects.create(user=self.author, title='raw', description='d', content='c', like_count=3)
+        UserStats.objects.create(user=self.author, post_count=0)
+        with self.assertRaises(CommandError):
+            call_command('check_user_stats', '--seed', '1', stdout=io.StringIO())
+
+        call_command('rebuild_user_stats', '--batch-size', '1', stdout=io.StringIO())
+        call_command('check_user_stats', '--seed', '1', stdout=io.StringIO())
+        self.assertEqual(UserStats.objects.get(user=self.author).total_likes, 3)
+        self.assertEqual(UserStats.objects.get(user=self.fan).post_count, 0)
+
+
+@override_settings(TRENDING_HALF_LIFE=3600, TRENDING_WINDOW=86400)
+class TrendingTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = self.token_for(create_user('reader'))
+        self.fans = [create_user(f'fan{i}') for i in range(4)]
+
+    def post(self, title, **kwargs):
+        return Post.objects.create(user=self.author, title=title, description='d', content='c', **kwargs)
+
+    def like(self, post, fans, hours_ago=0):
+        for fan in fans:
+            Like.objects.create(post=post, user=fan, like=True)
+        Like.objects.filter(post=post).update(updated_at=timezone.now() - datetime.timedelta(hours=hours_ago))
+
+    def trending(self):
+        return self.client.get('/trending/', HTTP_TOKEN=self.token).json()['data']
+
+    def test_recent_likes_outrank_older_ones(self):
+        old, new, private, deleted = (
+            self.post('old'), self.post('new'), self.post('private', private=True), self.post('deleted', is_active=False)
+        )
+        # Four likes three half-lives ago are worth half a like each now
+        self.like(old, self.fans, hours_ago=3)
+        self.like(new, self.fans[:1])
+        self.like(private, self.fans)
+        self.like(deleted, self.fans)
+        self.like(self.post('expired'), self.fans, hours_ago=25)
+        self.assertEqual(recompute_scores(), (4, 0))
+
+        data = self.trending()
+        self.assertEqual([row['title'] for row in data], ['new', 'old'])
+        self.assertAlmostEqual(data[0]['score'], 1, places=2)
+        self.assertAlmostEqual(data[1]['score'], 0.5, places=2)
+
+        # The author also sees their private post
+        own = self.custom_token.token
+        titles = [row['title'] for row in self.client.get('/trending/', HTTP_TOKEN=own).json()['data']]
+        self.assertEqual(titles, ['private', 'new', 'old'])
+
+    def test_like_writes_update_scores(self):
+        first, second = self.post('first'), self.post('second')
+        fan_token = self.token_for(self.fans[0])
+        self.client.post('/add_like/', {'post_id': first.id, 'like': True}, HTTP_TOKEN=fan_token,
+                         content_type='application/json')
+        self.client.post('/add_likes/', {'likes': [
+            {'post_id': second.id, 'like': True}, {'post_id': first.id, 'like': False}
+        ]}, HTTP_TOKEN=self.token, content_type='application/json')
+        self.client.post('/add_likes/', {'likes': [
+            {'post_id': second.id, 'like': True}
+        ]}, HTTP_TOKEN=fan_token, content_type='application/json')
+
+        data = self.trending()
+        self.assertEqual([row['title'] for row in data], ['second', 'first'])
+        self.assertAlmostEqual(data[0]['score'], 2, places=2)
+        self.assertAlmostEqual(data[1]['score'], 1, places=2)
+
+        # An unlike drops the score to (almost) nothing, and recomputing agrees
+        self.client.post('/add_like/', {'post_id': first.id, 'like': False}, HTTP_TOKEN=fan_token,
+                         content_type='application/json')
+        self.assertAlmostEqual(self.trending()[1]['score'], 0, places=2)
+        recompute_scores()
+        self.assertEqual([row['title'] for row in self.trending()], ['second'])
+
+    def test_scores_far_from_the_epoch(self):
+        post = self.post('post')
+        likes_changed({post.id: 1}, now=timezone.now() - datetime.timedelta(days=3650))
+        likes_changed({post.id: 1})
+        self.assertAlmostEqual(self.trending()[0]['score'], 1, places=2)
+        self.assertEqual(TrendingScore.objects.count(), 1)
+
+
+class LikeRollupTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = create_user('other')
+        self.token = self.token_for(self.other)
+        self.fans = [create_user(f'fan{i}') for i in range(3)]
+        self.post = Post.objects.create(user=self.author, title='p', description='d', content='c')
+        self.other_post = Post.objects.create(user=self.other, title='o', description='d', content='c')
+        self.today = timezone.localdate()
+
+    def like(self, post, fan, days_ago=0, like=True):
+        like = Like.objects.create(post=post, user=fan, like=like)
+        Like.objects.filter(pk=like.pk).update(created_at=timezone.now() - datetime.timedelta(days=days_ago))
+
+    def rollup(self, *args):
+        call_command('rollup_likes', '--lag', '0', *args, stdout=io.StringIO())
+
+    def test_incremental_rollup(self):
+        self.like(self.post, self.fans[0], days_ago=2)
+        self.like(self.post, self.fans[1], days_ago=2)
+        self.like(self.post, self.fans[2], like=False)
+        self.like(self.other_post, self.fans[0])
+        self.rollup('--batch-size', '1', '--max-batches', '2')
+        self.assertEqual(RollupWatermark.objects.get().last_id, Like.objects.order_by('id')[1].id)
+
+        # Resumes past the watermark and never counts a like twice
+        self.rollup('--batch-size', '2')
+        self.rollup()
+        self.like(self.post, self.author)
+        self.rollup()
+        two_days_ago = self.today - datetime.timedelta(days=2)
+        self.assertEqual(
+            sorted(DailyPostLikes.objects.values_list('post_id', 'day', 'likes')),
+            [(self.post.id, two_days_ago, 2), (self.post.id, self.today, 1), (self.other_post.id, self.today, 1)],
+        )
+        self.assertEqual(
+            sorted(DailyAuthorLikes.objects.values_list('author_id', 'day', 'likes')),
+            [(self.author.id, two_days_ago, 2), (self.author.id, self.today, 1), (self.other.id, self.today, 1)],
+        )
+
+    def test_recent_likes_wait_for_the_lag(self):
+        self.like(self.post, self.fans[0], days_ago=1)
+        self.like(self.post, self.fans[1])
+        call_command('rollup_likes', '--lag', '60', stdout=io.StringIO())
+        self.assertEqual(list(DailyPostLikes.objects.values_list('likes', flat=True)), [1])
+
+    def test_analytics_endpoints(self):
+        self.like(self.post, self.fans[0], days_ago=1)
+        self.like(self.post, self.fans[1], days_ago=1)
+        self.like(self.post, self.fans[2], days_ago=10)
+        self.like(self.other_post, self.fans[0])
+        self.rollup()
+
+        start = (self.today - datetime.timedelta(days=2)).isoformat()
+        response = self.client.get('/analytics/post_likes/', {'post_id': self.post.id, 'start': start},
+                                   HTTP_TOKEN=self.token)
+        self.assertEqual([row['likes'] for row in response.json()['data']], [0, 2, 0])
+
+        # Answered from the rollups, without touching blog_like
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/analytics/top_authors/', HTTP_TOKEN=self.token)
+        self.assertFalse([q for q in queries if 'blog_like"' in q['sql']])
+        self.assertEqual(
+            [(row['username'], row['likes']) for row in response.json()['data']], [('author', 2), ('other', 1)]
+        )
+
+        response = self.client.get('/analytics/top_authors/', {'start': self.today.isoformat(), 'end': start},
+                                   HTTP_TOKEN=self.token)
+        self.assertEqual(response.status_code, 400)
+        Post.objects.filter(pk=self.post.pk).update(private=True)
+        response = self.client.get('/analytics/post_likes/', {'post_id': self.post.id}, HTTP_TOKEN=self.token)
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fan_token = self.token_for(self.fan)
+
+    def post(self, title, content='c', **kwargs):
+        return Post.objects.create(user=self.author, title=title, description='d', content=content, **kwargs)
+
+    def search(self, q, token=None, **params):
+        return self.client.get('/search_post/', {'q': q, **params}, HTTP_TOKEN=token or self.fan_token)
+
+    def titles(self, q, token=None):
+        return [row['title'] for row in self.search(q, token).json()['data']]
+
+    def test_only_visible_posts_match(self):
+        self.post('apple pie')
+        self.post('apple secret', private=True)
+        self.post('apple deleted', is_active=False)
+        self.post('banana')
+        self.assertEqual(self.titles('apple'), ['apple pie'])
+        self.assertEqual(sorted(self.titles('apple', self.token)), ['apple pie', 'apple secret'])
+
+    def test_title_matches_rank_first(self):
+        # Created first, so an id order would put it last
+        in_title = self.post('apple', content='first')
+        in_content = self.post('first', content='apple')
+        self.assertEqual([row['id'] for row in self.search('apple').json()['data']], [in_title.id, in_content.id])
+
+    def test_cursor_walks_every_match_once(self):
+        # Same rank for all five, so the id breaks the ties
+        ids = [self.post(f'post {i}', content='apple').id for i in range(5)]
+        self.post('other')
+        seen, cursor = [], None
+        while True:
+            body = self.search('apple', page_size=2, **({'cursor': cursor} if cursor else {})).json()
+            seen.extend(row['id'] for row in body['data'])
+            cursor = body['next']
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(ids, reverse=True))
+
+    def test_query_syntax_is_matched_literally(self):
+        self.post('apple pie')
+        for q in ('apple OR banana', 'apple*', '"apple', 'title:apple', 'NEAR(apple pie)'):
+            response = self.search(q)
+            self.assertEqual(response.status_code, 200, q)
+        self.assertEqual(self.titles('apple pie'), ['apple pie'])
+        self.assertEqual(self.titles('appl*'), [])
+
+    def test_index_follows_post_update(self):
+        post = self.post('apple pie')
+        self.client.put('/post_update/', {'post_id': post.id, 'title': 'cherry tart'}, HTTP_TOKEN=self.token,
+                        content_type='application/json')
+        self.assertEqual(self.titles('apple'), [])
+        self.assertEqual(self.titles('cherry'), ['cherry tart'])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.search('').status_code, 400)
+        self.assertEqual(self.search('apple', cursor='not a cursor').status_code, 400)
+        self.assertEqual(self.search('apple', page_size='0').status_code, 400)
+
+
+class StreamingFeedTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            Post.objects.create(user=self.author, title=f'post "{i}" é', description='d', content='c' * i,
+                                private=i == 3, like_count=i)
+        Post.objects.create(user=create_user('other'), title='hidden', description='d', content='c', private=True)
+
+    def get(self, **params):
+        return self.client.get('/all_post/', params, HTTP_TOKEN=self.token)
+
+    def assertSameBody(self, **params):
+        buffered = self.get(**params)
+        streamed = self.get(stream='1', **params)
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(b''.join(streamed.streaming_content), buffered.content)
+        return buffered.json()
+
+    def test_streamed_body_matches_buffered_body(self):
+        self.assertIsNone(self.assertSameBody()['next'])
+        self.assertSameBody(fields='title,likes_count')
+        body = self.assertSameBody(page_size='2')
+        self.assertIsNotNone(body['next'])
+        # And on every page reached through the cursor
+        while body['next']:
+            body = self.assertSameBody(page_size='2', cursor=body['next'])
+        self.assertEqual(body['data'][-1]['title'], 'post "0" é')
+
+
+class AsyncViewParityTests(BlogTestCase):
+    """The /async/ views must answer exactly like their sync counterparts."""
+
+    def setUp(self):
+        super().setUp()
+        self.fan_token = self.token_for(self.fan)
+        for i in range(4):
+            Post.objects.create(user=self.author, title=f'post {i}', description='d', content='c',
+                                private=i == 2, like_count=i)
+        self.post = Post.objects.first()
+
+    def assertSameResponse(self, method, path, token=None, async_token=None, **params):
+        responses = []
+        for prefix, header in (('/', token), ('/async/', async_token or token)):
+            headers = {'HTTP_TOKEN': header} if header else {}
+            if method == 'post':
+                response = self.client.post(prefix + path, params, content_type='application/json', **headers)
+            else:
+                response = self.client.get(prefix + path, params, **headers)
+            responses.append((response.status_code, response.json()))
+        self.assertEqual(responses[0], responses[1], path)
+        return responses[0]
+
+    def test_reads_match(self):
+        status, body = self.assertSameResponse('get', 'all_post/', self.token, page_size='2')
+        self.assertEqual(status, 200)
+        self.assertSameResponse('get', 'all_post/', self.token, page_size='2', cursor=body['next'])
+        self.assertSameResponse('get', 'all_post/', self.fan_token, fields='title,likes_count')
+        self.assertSameResponse('get', 'user_data/', self.token)
+        self.assertSameResponse('get', 'user_data/', self.token, fields='title')
+
+    def test_errors_match(self):
+        for path in ('all_post/', 'user_data/'):
+            self.assertEqual(self.assertSameResponse('get', path)[0], 400)
+            self.assertEqual(self.assertSameResponse('get', path, 'unknown')[0], 401)
+        self.assertEqual(self.assertSameResponse('get', 'all_post/', self.token, cursor='x')[0], 400)
+        self.assertEqual(self.assertSameResponse('get', 'all_post/', self.token, page_size='0')[0], 400)
+        self.assertEqual(self.assertSameResponse('get', 'user_data/', self.token, fields='password')[0], 400)
+
+    def test_add_like_matches(self):
+        # Each side likes as its own user, so both see the same row changes
+        for data in (
+            {'post_id': self.post.id, 'like': True},
+            {'post_id': self.post.id, 'like': False},
+            {'post_id': self.post.id},
+            {},
+            {'post_id': 999, 'like': True},
+            {'post_id': self.post.id, 'like': 'yes'},
+        ):
+            self.assertSameResponse('post', 'add_like/', self.fan_token, self.token, **data)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 0)
+
+
+class SparseFieldsetTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        Post.objects.create(user=self.author, title='public', description='d', content='long content')
+        Post.objects.create(user=self.author, title='private', description='d', content='long content', private=True)
+
+    def get(self, path, fields):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, {'fields': fields}, HTTP_TOKEN=self.token)
+        post_queries = [query['sql'] for query in queries if 'FROM "blog_post"' in query['sql']]
+        return response, post_queries
+
+    def test_all_post_reads_only_requested_columns(self):
+        response, post_queries = self.get('/all_post/', 'title,likes_count')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['data'],
+            [{'id': 2, 'title': 'private', 'likes_count': 0}, {'id': 1, 'title': 'public', 'likes_count': 0}],
+        )
+        self.assertTrue(post_queries)
+        self.assertFalse(any('"content"' in sql for sql in post_queries))
+
+    def test_user_data_reads_only_requested_columns(self):
+        response, post_queries = self.get('/user_data/', 'title')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['posts'], [{'id': 2, 'title': 'private'}, {'id': 1, 'title': 'public'}])
+        self.assertFalse(any('"content"' in sql for sql in post_queries))
+
+    def test_unknown_fields_are_rejected(self):
+        for path, fields in (('/all_post/', 'title,password'), ('/user_data/', 'total_likes,likes_count')):
+            response, _ = self.get(path, fields)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['status'], 400)
+
+
+class ConditionalGetTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fan_token = self.token_for(self.fan)
+        self.post = Post.objects.create(user=self.author, title='public', description='d', content='c')
+
+    def get(self, path, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(path, HTTP_TOKEN=self.token, **headers)
+
+    def assertNotModified(self, path, etag):
+        # Only the ETag aggregate runs; the token is cached by now
+        with self.assertNumQueries(1):
+            response = self.get(path, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_unchanged_data_is_not_modified(self):
+        for path in ('/all_post/', '/user_data/', '/async/all_post/', '/async/user_data/'):
+            response = self.get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Token', response['Vary'])
+            self.assertNotModified(path, response['ETag'])
+
+    def test_likes_change_the_etag(self):
+        etags = {path: self.get(path)['ETag'] for path in ('/all_post/', '/user_data/')}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/add_like/', {'post_id': self.post.id, 'like': True},
+                content_type='application/json', HTTP_TOKEN=self.fan_token,
+            )
+        for path, etag in etags.items():
+            response = self.get(path, etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_own_private_posts_change_the_etag(self):
+        etag = self.get('/all_post/')['ETag']
+        # Written behind the API's back, so the feed version stays the same
+        private = Post.objects.create(user=self.author, title='private', description='d', content='c', private=True)
+        response = self.get('/all_post/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_post'], 2)
+
+        etag = response['ETag']
+        private.title = 'renamed'
+        private.save()
+        self.assertEqual(self.get('/all_post/', etag).status_code, 200)
+
+    def test_pages_and_fields_have_their_own_etags(self):
+        Post.objects.create(user=self.author, title='second', description='d', content='c')
+        first = self.get('/all_post/?page_size=1')
+        second_path = f"/all_post/?page_size=1&cursor={first.json()['next']}"
+        for path in (second_path, '/async' + second_path):
+            response = self.get(path, first['ETag'])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([row['id'] for row in response.json()['data']], [self.post.id])
+
+        etags = {
+            self.get(path)['ETag']
+            for path in ('/all_post/', '/all_post/?page_size=1', '/all_post/?fields=title',
+                         '/all_post/?stream=1')
+        }
+        self.assertEqual(len(etags), 4)
+        # The same subset spelled differently is the same representation
+        self.assertNotModified('/all_post/?fields=title,id', self.get('/all_post/?fields=id,title')['ETag'])
+
+        etag = self.get('/user_data/')['ETag']
+        self.assertEqual(self.get('/user_data/?fields=title', etag).status_code, 200)
+
+    def test_profile_update_in_another_worker_changes_the_user_data_etag(self):
+        etag = self.get('/user_data/')['ETag']
+        # Another worker updated the user; this process still has the old one cached
+        User.objects.filter(pk=self.author.pk).update(
+            bio='edited elsewhere', updated_at=timezone.now() + datetime.timedelta(seconds=1)
+        )
+        for path in ('/user_data/', '/async/user_data/'):
+            self.assertEqual(self.get(path, etag).status_code, 200)
+
+    def test_post_edits_change_the_user_data_etag(self):
+        etag = self.get('/user_data/')['ETag']
+        Post.objects.filter(id=self.post.id).update(like_count=5)
+        self.assertEqual(self.get('/user_data/', etag).status_code, 200)
+
+
+class IndexUsageTests(TestCase):
+    """The feed and like queries must be answered from the indexes in 0013_indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('author')
+        for i in range(30):
+            post = Post.objects.create(
+                user=cls.user, title=f'post {i}', description='d', content='c',
+                private=i % 3 == 0, is_active=i % 5 != 0,
+            )
+            Like.objects.create(post=post, user=cls.user, like=i % 2 == 0)
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be scanned sequentially
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def unique_index_name(self, name, table):
+        # SQLite builds unique constraints into the table as autoindexes
+        if connection.vendor == 'sqlite':
+            return f'sqlite_autoindex_{table}'
+        return name
+
+    def test_public_feed_uses_partial_index(self):
+        self.assertUsesIndex(public_posts().order_by('-id')[:21], 'post_public_feed_idx')
+
+    def test_own_posts_use_partial_index(self):
+        self.assertUsesIndex(private_posts(self.user).order_by('-id')[:21], 'post_user_active_idx')
+        self.assertUsesIndex(
+            Post.objects.filter(user=self.user, is_active=True).order_by('-id')[:100],
+            'post_user_active_idx',
+        )
+
+    def test_title_lookup_uses_unique_index(self):
+        self.assertUsesIndex(
+            Post.objects.filter(title='post 1'),
+            self.unique_index_name('post_title_unique', 'blog_post'),
+        )
+
+    def test_like_queries_use_indexes(self):
+        post = Post.objects.first()
+        self.assertUsesIndex(Like.objects.filter(post=post, like=True), 'like_post_liked_idx')
+        self.assertUsesIndex(
+            Like.objects.filter(post=post, user=self.user),
+            self.unique_index_name('like_post_user_unique', 'blog_like'),
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], READ_YOUR_WRITES_CACHE_ALIAS='default')
+class ReadReplicaRoutingTests(TestCase):
+    """Routing decisions only; the replica alias itself is never queried here."""
+
+    def setUp(self):
+        reset_replica_health()
+        patcher = mock.patch('blog.db_router.replica_is_healthy', return_value=True)
+        self.replica_is_healthy = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+
+    def read_alias_during(self, request):
+        seen = {}
+
+        def get_response(request):
+            with mock.patch.object(connection, 'in_atomic_block', False):
+                seen['alias'] = self.router.db_for_read(Post)
+            return HttpResponse(status=200)
+
+        ReadYourWritesMiddleware(get_response)(request)
+        return seen['alias']
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        self.assertEqual(self.read_alias_during(self.factory.get('/all_post/', HTTP_TOKEN='t')), 'replica')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        self.assertEqual(self.read_alias_during(self.factory.post('/add_post/', HTTP_TOKEN='t')), 'default')
+        self.assertEqual(self.read_alias_during(self.factory.get('/all_post/', HTTP_TOKEN='t')), 'default')
+        # Other clients are not affected
+        self.assertEqual(self.read_alias_during(self.factory.get('/all_post/', HTTP_TOKEN='u')), 'replica')
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        self.replica_is_healthy.return_value = False
+        self.assertEqual(self.read_alias_during(self.factory.get('/all_post/', HTTP_TOKEN='t')), 'default')
+
+    def test_unknown_replica_alias_is_unhealthy(self):
+        self.assertFalse(replica_is_healthy('replica'))
+
+    def test_shared_feed_page_is_filled_from_primary(self):
+        # Cached for every caller, so it must not come from a lagging replica
+        Post.objects.create(user=create_user('author'), title='p', description='d', content='c')
+        bump_feed_version()
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+            rows, total = get_public_page(None, 21)
+        self.assertEqual(([row['title'] for row in rows], total), (['p'], 1))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], READ_YOUR_WRITES_CACHE_ALIAS='default')
+class ReplicaEndToEndTests(TransactionTestCase):
+    """Requests through the full middleware stack with the replica alias configured in settings."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        reset_replica_health()
+        token_cache.clear()
+        bump_feed_version()
+        self.author = create_user('author')
+        self.token = CustomToken.generate_token(self.author).token
+        self.other = create_user('other')
+        Post.objects.create(user=self.author, title='first', description='d', content='c')
+        # Built up front: user_data would otherwise write them on its first read
+        rebuild_stats([self.author.id, self.other.id])
+
+    def blog_queries(self, method, path, data=None, token=None):
+        """Run the request and return the number of blog table queries sent to each alias."""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(path, data, HTTP_TOKEN=token or self.token)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return tuple(
+            len([q for q in queries if 'blog_post' in q['sql']]) for queries in (primary, replica)
+        )
+
+    def test_reads_go_to_the_replica_until_the_client_writes(self):
+        primary, replica = self.blog_queries('get', '/user_data/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        primary, replica = self.blog_queries(
+            'post', '/add_post/', {'title': 'second', 'description': 'd', 'content': 'c'}
+        )
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Sticky: the same client now reads from the primary
+        primary, replica = self.blog_queries('get', '/user_data/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Another client is still served by the replica
+        primary, replica = self.blog_queries('get', '/user_data/', token=CustomToken.generate_token(self.other).token)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_streamed_feed_follows_the_routing_of_its_request(self):
+        self.blog_queries('post', '/add_post/', {'title': 'second', 'description': 'd', 'content': 'c'})
+        # The rows are read while the response is consumed, after the middleware returned
+        self.assertEqual(self.blog_queries('get', '/all_post/', {'stream': '1'})[1], 0)
+
+        other_token = CustomToken.generate_token(self.other).token
+        self.assertEqual(self.blog_queries('get', '/all_post/', {'stream': '1'}, token=other_token)[0], 0)
+
+    def test_streamed_rows_are_queried_inside_the_view(self):
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get('/all_post/', {'stream': '1'}, HTTP_TOKEN=self.token)
+        self.assertTrue([q for q in replica if 'ORDER BY "blog_post"."id" DESC' in q['sql']])
+        self.assertIn(b'"first"', b''.join(response.streaming_content))
+
+
+@override_settings(METRICS_BEARER_TOKEN='secret')
+class QueryMetricsTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+
+    def metrics(self):
+        return self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+
+    def test_server_timing_counts_queries_and_duplicates(self):
+        def get_response(request):
+            for post_id in (1, 2):
+                Post.objects.filter(id=post_id).exists()
+            User.objects.count()
+            return HttpResponse()
+
+        response = QueryMetricsMiddleware(get_response)(RequestFactory().get('/all_post/'))
+        self.assertIn('desc="3 queries, 1 duplicates"', response['Server-Timing'])
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        response = self.client.get('/all_post/', HTTP_TOKEN=self.token)
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('view="all_post"', self.metrics())
+
+    def test_metrics_endpoint_aggregates_per_view(self):
+        for _ in range(2):
+            self.client.get('/all_post/', HTTP_TOKEN=self.token)
+        self.client.get('/user_data/')
+
+        body = self.metrics()
+        self.assertIn('blog_http_requests_total{view="all_post",code="200"} 2', body)
+        self.assertIn('blog_http_requests_total{view="user_data",code="400"} 1', body)
+        self.assertIn('blog_db_queries_count{view="all_post"} 2', body)
+        self.assertNotIn('view="metrics"', body)
+
+    def test_metrics_endpoint_checks_bearer_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    @override_settings(METRICS_BEARER_TOKEN=None)
+    def test_metrics_endpoint_needs_a_token_outside_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class PurgeDeletedTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fan_token = self.token_for(self.fan)
+        self.live = Post.objects.create(user=self.author, title='live', description='d', content='c', like_count=1)
+        self.dead = Post.objects.create(user=self.author, title='dead', description='d', content='c', like_count=1)
+        Like.objects.create(post=self.live, user=self.fan, like=True)
+        Like.objects.create(post=self.dead, user=self.fan, like=True)
+        Like.objects.create(post=self.dead, user=self.author, like=False)
+
+    def age(self, model, pk, days):
+        model.objects.filter(pk=pk).update(is_active=False, deleted_at=timezone.now() - datetime.timedelta(days=days))
+
+    def purge(self, *args):
+        call_command('purge_deleted', '--pause', '0', '--batch-size', '1', *args, stdout=io.StringIO())
+
+    def test_delete_endpoints_stamp_deleted_at(self):
+        self.client.delete('/delete_post/', {'post_id': self.dead.id}, content_type='application/json',
+                           HTTP_TOKEN=self.token)
+        self.client.delete('/delete_user/', HTTP_TOKEN=self.fan_token)
+        self.assertIsNotNone(Post.objects.get(pk=self.dead.pk).deleted_at)
+        self.assertIsNotNone(User.objects.get(pk=self.fan.pk).deleted_at)
+
+    def test_archives_old_deletes_and_fixes_like_counts(self):
+        self.age(Post, self.dead.pk, 40)
+        self.age(User, self.fan.pk, 40)
+        self.purge()
+
+        self.assertEqual(list(Post.objects.values_list('title', flat=True)), ['live'])
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['author'])
+        self.assertFalse(Like.objects.exists())
+        self.assertFalse(CustomToken.objects.filter(user_id=self.fan.pk).exists())
+        # The fan's like on the live post is gone, and so is its count
+        self.assertEqual(Post.objects.get(pk=self.live.pk).like_count, 0)
+
+        self.assertEqual(ArchivedPost.objects.get().title, 'dead')
+        self.assertEqual(ArchivedUser.objects.get().email, 'fan@example.com')
+        self.assertEqual(ArchivedLike.objects.count(), 3)
+
+    def test_recent_deletes_are_kept(self):
+        self.age(Post, self.dead.pk, 5)
+        self.purge()
+        self.assertTrue(Post.objects.filter(pk=self.dead.pk).exists())
+        self.assertEqual(Like.objects.count(), 3)
+
+    def test_purged_users_live_posts_leave_the_cached_feed(self):
+        all_post = self.client.get('/all_post/', HTTP_TOKEN=self.fan_token)
+        self.assertEqual(all_post.json()['total_post'], 2)
+        self.assertEqual(get_public_page(None, 20)[1], 2)
+        self.age(User, self.author.pk, 40)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.purge()
+
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(get_public_page(None, 20), ([], 0))
+        response = self.client.get('/all_post/', HTTP_TOKEN=self.fan_token, HTTP_IF_NONE_MATCH=all_post['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], [])
+
+    def test_delete_mode_skips_the_archive(self):
+        self.age(Post, self.dead.pk, 40)
+        self.purge('--mode', 'delete')
+        self.assertFalse(Post.objects.filter(pk=self.dead.pk).exists())
+        self.assertFalse(ArchivedPost.objects.exists())
+        self.assertFalse(ArchivedLike.objects.exists())
+
+
+@override_settings(TOKEN_ABSOLUTE_TTL=3600, TOKEN_SLIDING_TTL=600, TOKEN_RENEWAL_INTERVAL=60)
+class TokenExpiryTests(BlogTestCase):
+    def shift(self, **kwargs):
+        CustomToken.objects.filter(pk=self.custom_token.pk).update(**{
+            field: timezone.now() - datetime.timedelta(seconds=seconds) for field, seconds in kwargs.items()
+        })
+
+    def get(self, path='/user_data/'):
+        return self.client.get(path, HTTP_TOKEN=self.token)
+
+    def test_expired_tokens_are_refused(self):
+        self.shift(created_at=3601, last_used_at=10)
+        response = self.get()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['message'], 'Token has expired')
+
+        token_cache.clear()
+        self.shift(created_at=10, last_used_at=601)
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get('/async/user_data/').status_code, 401)
+
+    def test_cached_token_expires_without_a_query(self):
+        self.assertEqual(self.get().status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get().status_code, 200)
+        self.assertFalse([q for q in queries if 'blog_customtoken' in q['sql']])
+
+        # The cached copy is now past the sliding window; the row is re-read
+        with mock.patch('blog.authentication.timezone.now', return_value=timezone.now() + datetime.timedelta(seconds=700)):
+            self.assertEqual(self.get().status_code, 401)
+
+    def test_renewal_is_throttled(self):
+        self.shift(last_used_at=30)
+        with CaptureQueriesContext(connection) as queries:
+            self.get()
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "blog_customtoken"')])
+
+        self.shift(last_used_at=120)
+        token_cache.clear()
+        self.get()
+        renewed = CustomToken.objects.get(pk=self.custom_token.pk).last_used_at
+        self.assertGreater(renewed, timezone.now() - datetime.timedelta(seconds=5))
+        with CaptureQueriesContext(connection) as queries:
+            self.get()
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "blog_customtoken"')])
+
+    def test_sweep_tokens_deletes_expired(self):
+        other = create_user('other')
+        CustomToken.generate_token(other)
+        CustomToken.objects.filter(pk=CustomToken.generate_token(self.fan).pk).update(
+            last_used_at=timezone.now() - datetime.timedelta(seconds=601)
+        )
+        self.shift(created_at=3601)
+        call_command('sweep_tokens', '--pause', '0', '--batch-size', '1', stdout=io.StringIO())
+        self.assertEqual(list(CustomToken.objects.values_list('user_id', flat=True)), [other.id])
+
+    def test_login_reissues_token(self):
+        self.author.set_password('password')
+        self.author.save()
+        self.shift(created_at=3601)
+        self.assertEqual(self.get().status_code, 401)
+
+        response = self.client.post('/login/', {'email': 'author@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post('/login/', {'email': 'author@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['token'], self.token)
+
+        self.token = response.json()['token']
+        self.assertEqual(self.get().status_code, 200)
+        self.assertFalse(CustomToken.objects.filter(token=self.custom_token.token).exists())
+
+    def test_login_hashes_for_unknown_emails_too(self):
+        with mock.patch.object(password_hashing_pool, '_run', wraps=password_hashing_pool._run) as run:
+            response = self.client.post('/login/', {'email': 'nobody@example.com', 'password': 'password'})
+            self.assertEqual(response.status_code, 401)
+            run.assert_called_once()
+            self.assertEqual(run.call_args.args[0], make_password)
+
+            run.reset_mock()
+            response = self.client.post('/login/', {'email': 'author@example.com', 'password': 'wrong'})
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(run.call_args.args[0], check_password)
+        self.assertEqual(
+            self.client.post('/login/', {'email': 'nobody@example.com', 'password': 'password'}).json(),
+            response.json(),
+        )
+
+    def test_login_upgrades_outdated_hash(self):
+        outdated = make_password('password', hasher='pbkdf2_sha1')
+        User.objects.filter(pk=self.author.pk).update(password=outdated)
+
+        response = self.client.post('/login/', {'email': 'author@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(User.objects.get(pk=self.author.pk).password, outdated)
+
+        response = self.client.post('/login/', {'email': 'author@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        password = User.objects.get(pk=self.author.pk).password
+        self.assertTrue(password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(check_password('password', password))
+
+
+@override_settings(THROTTLE_RATES={'add_post': '2/min', 'add_like': '100/min'}, SHED_MAX_IN_FLIGHT=64, SHED_DB_LATENCY=0.05)
+class ThrottleTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        throttle.reset()
+        load_shedder.reset()
+        self.addCleanup(load_shedder.reset)
+
+    def add_post(self, token, title):
+        return self.client.post('/add_post/', {'title': title, 'description': 'd', 'content': 'c'}, HTTP_TOKEN=token)
+
+    def test_bucket_per_token(self):
+        self.assertEqual(self.add_post(self.token, 'a').status_code, 200)
+        self.assertEqual(self.add_post(self.token, 'b').status_code, 200)
+        response = self.add_post(self.token, 'c')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '30')
+
+        # Other clients have their own budget; unthrottled views are unaffected
+        self.assertEqual(self.add_post(self.token_for(self.fan), 'c').status_code, 200)
+        self.assertEqual(self.client.get('/all_post/', HTTP_TOKEN=self.token).status_code, 200)
+
+    def test_refused_before_token_lookup(self):
+        self.add_post('unknown', 'a')
+        self.add_post('unknown', 'b')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.add_post('unknown', 'c')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(queries), 0)
+
+    def test_bucket_refills(self):
+        with mock.patch('blog.throttling.time.monotonic', return_value=1000.0):
+            self.add_post(self.token, 'a')
+            self.add_post(self.token, 'b')
+            self.assertEqual(self.add_post(self.token, 'c').status_code, 429)
+        with mock.patch('blog.throttling.time.monotonic', return_value=1030.0):
+            self.assertEqual(self.add_post(self.token, 'c').status_code, 200)
+
+    def test_sheds_writes_while_database_is_slow(self):
+        load_shedder.db_latency = 1.0
+        with mock.patch('blog.throttling.time.monotonic', return_value=load_shedder.updated):
+            response = self.client.post('/add_like/', {'post_id': 1, 'like': True}, HTTP_TOKEN=self.token)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(self.client.get('/user_data/', HTTP_TOKEN=self.token).status_code, 200)
+
+        # The average decays while nothing is measured
+        with mock.patch('blog.throttling.time.monotonic', return_value=load_shedder.updated + 60):
+            self.assertIsNone(load_shedder.reason())
+
+    @override_settings(SHED_MAX_IN_FLIGHT=0)
+    def test_sheds_writes_over_in_flight_limit(self):
+        response = self.add_post(self.token, 'a')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(load_shedder.in_flight, 0)
+
+    def test_only_throttled_requests_count_as_in_flight(self):
+        with mock.patch.object(load_shedder, 'enter', wraps=load_shedder.enter) as enter:
+            self.client.get('/user_data/', HTTP_TOKEN=self.token)
+            self.client.get('/all_post/', HTTP_TOKEN=self.token)
+            self.assertEqual(enter.call_count, 0)
+            self.add_post(self.token, 'a')
+            self.assertEqual(enter.call_count, 1)
+        self.assertEqual(load_shedder.in_flight, 0)
+
+
+class ExportImportTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            post = Post.objects.create(user=self.author, title=f'post {i}', description='d', content='c',
+                                       private=i == 0, like_count=1)
+            Like.objects.create(post=post, user=self.fan, like=True)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'blog.ndjson')
+        call_command('export_blog', self.path, '--batch-size', '2', stderr=io.StringIO())
+
+    def snapshot(self):
+        return (
+            sorted(User.objects.values_list('email', 'password', 'created_at', 'updated_at')),
+            sorted(Post.objects.values_list('title', 'user__email', 'private', 'like_count', 'updated_at')),
+            sorted(Like.objects.values_list('post__title', 'user__email', 'like', 'updated_at')),
+        )
+
+    def clear(self):
+        Like.objects.all().delete()
+        Post.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_round_trip_with_new_ids(self):
+        expected = self.snapshot()
+        self.clear()
+        create_user('other')
+        call_command('import_blog', self.path, '--batch-size', '2', stdout=io.StringIO(), stderr=io.StringIO())
+
+        User.objects.filter(email='other@example.com').delete()
+        self.assertEqual(self.snapshot(), expected)
+        self.assertFalse(os.path.exists(self.path + '.checkpoint'))
+
+    def test_resumes_from_checkpoint(self):
+        expected = self.snapshot()
+        self.clear()
+        calls = []
+        import_chunk = Importer.import_chunk
+
+        def failing(importer, name, records):
+            calls.append(name)
+            if len(calls) == 4:
+                raise RuntimeError('connection lost')
+            return import_chunk(importer, name, records)
+
+        with mock.patch.object(Importer, 'import_chunk', failing), self.assertRaises(RuntimeError):
+            call_command('import_blog', self.path, '--batch-size', '2', stdout=io.StringIO(), stderr=io.StringIO())
+        # The users and two chunks of posts were committed
+        self.assertEqual(Post.objects.count(), 4)
+
+        call_command('import_blog', self.path, '--batch-size', '2', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(self.snapshot(), expected)
+
+
+class LikeBufferTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.create(user=self.author, title='p', description='d', content='c')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spool_dir = directory.name
+
+    def start_buffer(self):
+        like_buffer = LikeBuffer(self.spool_dir, fsync=False)
+        # Flushed by hand below rather than from the background thread
+        with mock.patch('blog.like_buffer.threading.Thread'), mock.patch('blog.like_buffer.atexit.register'):
+            like_buffer.start()
+        self.addCleanup(like_buffer._spool.close)
+        return like_buffer
+
+    def test_spool_left_under_the_same_pid_is_replayed(self):
+        with open(os.path.join(self.spool_dir, f'likes-{os.getpid()}.ndjson'), 'w') as spool:
+            spool.write(f'[{self.fan.id}, {self.post.id}, true, false]\n')
+
+        like_buffer = self.start_buffer()
+        self.assertEqual(like_buffer.stats()['pending'], 1)
+        self.assertEqual(len(read_spool(like_buffer.spool_path)), 1)
+
+        like_buffer.flush()
+        self.assertTrue(Like.objects.get(post=self.post, user=self.fan).like)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 1)
+        self.assertEqual(read_spool(like_buffer.spool_path), [])
+
+    def test_async_add_like_writes_the_spool_off_the_event_loop(self):
+        like_buffer = self.start_buffer()
+        on_event_loop = []
+
+        def add(*args):
+            try:
+                asyncio.get_running_loop()
+                on_event_loop.append(True)
+            except RuntimeError:
+                on_event_loop.append(False)
+            return LikeBuffer.add(like_buffer, *args)
+
+        with override_settings(LIKE_WRITE_BEHIND=True), mock.patch('blog.like_buffer._like_buffer', like_buffer), \
+                mock.patch.object(like_buffer, 'add', add):
+            response = self.client.post('/async/add_like/', {'post_id': self.post.id, 'like': True},
+                                        content_type='application/json', HTTP_TOKEN=self.token_for(self.fan))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(on_event_loop, [False])
+        self.assertTrue(like_buffer.pending_like(self.fan.id, self.post.id))
+
+    def test_bulk_likes_go_through_the_buffer(self):
+        like_buffer = self.start_buffer()
+        other = Post.objects.create(user=self.author, title='o', description='d', content='c')
+        fan_token = self.token_for(self.fan)
+        with override_settings(LIKE_WRITE_BEHIND=True), mock.patch('blog.like_buffer._like_buffer', like_buffer):
+            self.client.post('/add_like/', {'post_id': self.post.id, 'like': True}, HTTP_TOKEN=fan_token,
+                             content_type='application/json')
+            response = self.client.post('/add_likes/', {'likes': [
+                {'post_id': self.post.id, 'like': False}, {'post_id': other.id, 'like': True}
+            ]}, HTTP_TOKEN=fan_token, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            # The later bulk value replaced the pending single like
+            self.assertFalse(Like.objects.exists())
+            self.assertEqual(like_buffer.pending_count_delta(self.post.id), 0)
+            self.assertEqual(like_buffer.pending_count_delta(other.id), 1)
+
+            like_buffer.flush()
+        self.assertEqual(
+            sorted(Like.objects.values_list('post__title', 'like')), [('o', True), ('p', False)]
+        )
+        self.assertEqual(
+            sorted(Post.objects.values_list('title', 'like_count')), [('o', 1), ('p', 0)]
+        )
+
+    def test_deleted_targets_do_not_block_the_flush(self):
+        like_buffer = self.start_buffer()
+        gone = Post.objects.create(user=self.author, title='gone', description='d', content='c')
+        like_buffer.add(self.fan.id, self.post.id, True, False)
+        like_buffer.add(self.fan.id, gone.id, True, False)
+        # Purged after the like was accepted
+        gone.delete()
+
+        self.assertEqual(like_buffer.flush(), 1)
+        self.assertEqual(list(Like.objects.values_list('post_id', flat=True)), [self.post.id])
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 1)
+        self.assertEqual(like_buffer.pending_count_delta(gone.id), 0)
+        self.assertEqual((like_buffer.stats()['pending'], like_buffer.stats()['dropped']), (0, 1))
+        self.assertEqual(read_spool(like_buffer.spool_path), [])
+
+    def test_failing_post_is_retried_on_its_own(self):
+        like_buffer = self.start_buffer()
+        other = Post.objects.create(user=self.author, title='o', description='d', content='c')
+        like_buffer.add(self.fan.id, self.post.id, True, False)
+        like_buffer.add(self.fan.id, other.id, True, False)
+
+        def failing_upsert(likes):
+            if (self.fan.id, other.id) in likes:
+                raise RuntimeError('cannot write')
+            return upsert_likes(likes)
+
+        with mock.patch('blog.like_buffer.upsert_likes', failing_upsert), self.assertLogs('blog.like_buffer', 'ERROR'):
+            self.assertEqual(like_buffer.flush(), 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 1)
+        self.assertEqual(like_buffer.stats()['last_error'], 'RuntimeError: cannot write')
+        self.assertEqual(read_spool(like_buffer.spool_path), [(self.fan.id, other.id, True, False)])
+
+        self.assertEqual(like_buffer.flush(), 1)
+        self.assertEqual(Post.objects.get(pk=other.pk).like_count, 1)
+        self.assertIsNone(like_buffer.stats()['last_error'])
+
+
+class FastJSONTests(SimpleTestCase):
+    """FastJSONRenderer and FastJSONParser must be drop-in replacements for DRF's classes."""
+
+    def test_renders_same_bytes_as_drf(self):
+        payloads = [
+            {"status": 200, "data": [{"id": 1, "title": "caf\u00e9 \u2028 \u2029 \"quoted\"", "next": None}]},
+            {
+                "aware": timezone.now(),
+                "naive": datetime.datetime(2024, 1, 2, 3, 4, 5, 678901),
+                "date": datetime.date(2024, 1, 2),
+                "time": datetime.time(3, 4, 5),
+                "timedelta": datetime.timedelta(seconds=90),
+                "decimal": decimal.Decimal('1.10'),
+                "uuid": uuid.UUID(int=1),
+            },
+            {"big": 2 ** 70, 1: "int key"},
+        ]
+        for payload in payloads:
+            self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+        self.assertEqual(
+            FastJSONRenderer().render({"a": [1]}, 'application/json; indent=2'),
+            JSONRenderer().render({"a": [1]}, 'application/json; indent=2'),
+        )
+
+    def test_parses_like_drf(self):
+        body = '{"title": "caf\u00e9", "likes": [{"post_id": 1, "like": true}]}'.encode()
+        self.assertEqual(
+            FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body))
+        )
+        for body in (b'{"a": NaN}', b'{"a": '):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
@@ -0,0 +1,196 @@
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    Turn a DRF style rate such as '30/min' into (capacity, refill per second):
+    a bucket of 30 requests that refills at 30 per minute.
+    """
+    num, period = rate.split('/')
+    num = int(num)
+    return num, num / PERIODS[period[0]]
+
+
+class LocalBucketStore:
+    """
+    Token buckets held in this process. Each worker enforces its own budget,
+    so a client spread over N workers gets up to N times the configured rate.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill, now):
+        """Take one token from `key`'s bucket; returns 0 or the seconds until one is available."""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / refill
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # Evicting the least recently seen client refills its bucket, which
+            # errs on the side of letting it through
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class CacheBucketStore:
+    """
+    Token buckets in a shared cache, so the budget holds across workers.
+
+    The read and the write are not atomic, so two workers handling the same
+    client at the same instant can both spend the last token; a budget may be
+    overrun by about one request per concurrent worker.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def take(self, key, capacity, refill, now):
+        cache = caches[self.alias]
+        tokens, updated = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * refill)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / refill
+        # An untouched bucket is full again after capacity / refill seconds
+        cache.set(key, (tokens, now), timeout=int(capacity / refill) + 1)
+        return wait
+
+
+class Throttle:
+    """
+    Per-client token buckets for the URL names in THROTTLE_RATES.
+
+    Clients are told apart by their Token header, or by address for requests
+    without one (add_user, login). Buckets live in this process unless
+    THROTTLE_CACHE_ALIAS names a shared cache.
+    """
+
+    def __init__(self):
+        self._rates = None
+        self._store = None
+
+    @property
+    def rates(self):
+        if self._rates is None:
+            self._rates = {
+                name: parse_rate(rate) for name, rate in getattr(settings, 'THROTTLE_RATES', {}).items()
+            }
+        return self._rates
+
+    @property
+    def store(self):
+        if self._store is None:
+            alias = getattr(settings, 'THROTTLE_CACHE_ALIAS', None)
+            self._store = CacheBucketStore(alias) if alias else LocalBucketStore()
+        return self._store
+
+    def reset(self):
+        """Re-read the settings; this process's buckets start out full again."""
+        self._rates = None
+        self._store = None
+
+    def wait(self, url_name, request):
+        """Seconds until `request` may be served, or 0 if it may be served now."""
+        rate = self.rates.get(url_name)
+        if rate is None:
+            return 0.0
+        return self.store.take(bucket_key(url_name, request), *rate, time.monotonic())
+
+
+def bucket_key(url_name, request):
+    token = request.headers.get('Token')
+    client = 'token:' + token if token else 'addr:' + request.META.get('REMOTE_ADDR', '')
+    return f'blog:throttle:{url_name}:' + hashlib.sha256(client.encode()).hexdigest()[:32]
+
+
+class LoadShedder:
+    """
+    Refuse throttled (write) requests early while the process is overloaded.
+
+    Overload is either more than SHED_MAX_IN_FLIGHT throttled requests being
+    handled at once, or an average query time above SHED_DB_LATENCY seconds. The
+    latter is a moving average fed by QueryMetricsMiddleware's samples; past
+    the threshold requests are shed with a probability that rises to 1 at
+    twice the threshold, and the average decays with SHED_DECAY_HALF_LIFE so
+    a process that sheds everything still recovers.
+    """
+
+    alpha = 0.2
+
+    def __init__(self):
+        self.in_flight = 0
+        self.db_latency = 0.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.in_flight = 0
+            self.db_latency = 0.0
+            self.updated = time.monotonic()
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def observe(self, metrics):
+        if not metrics.queries:
+            return
+        with self._lock:
+            latency = self.current_latency(time.monotonic())
+            self.db_latency = latency + self.alpha * (metrics.db_time / metrics.queries - latency)
+            self.updated = time.monotonic()
+
+    def current_latency(self, now):
+        half_life = getattr(settings, 'SHED_DECAY_HALF_LIFE', 5)
+        return self.db_latency * 0.5 ** ((now - self.updated) / half_life)
+
+    def reason(self):
+        """Why the next throttled request should be shed, or None."""
+        max_in_flight = getattr(settings, 'SHED_MAX_IN_FLIGHT', None)
+        # The request asking is already counted
+        if max_in_flight is not None and self.in_flight > max_in_flight:
+            return 'Too many requests in progress'
+        threshold = getattr(settings, 'SHED_DB_LATENCY', None)
+        if threshold:
+            excess = self.current_latency(time.monotonic()) / threshold - 1
+            if excess > 0 and random.random() < excess:
+                return 'Database is overloaded'
+        return None
+
+
+throttle = Throttle()
+load_shedder = LoadShedder()
+
+
+def reset_throttle(setting, **kwargs):
+    if setting.startswith('THROTTLE_'):
+        throttle.reset()
+
+
+setting_changed.connect(reset_throttle, dispatch_uid='blog.throttling.reset_throttle')
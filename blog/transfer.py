@@ -0,0 +1,253 @@
+import contextlib
+import csv
+import io
+import json
+import os
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+
+from .feed_cache import bump_feed_version
+from .models import Like, Post, User, is_password_hashed
+from .renderers import orjson
+
+# Exported columns per model, in dependency order. search_vector is left out:
+# the PostgreSQL trigger fills it in again on insert.
+TRANSFER_FIELDS = {
+    'user': (User, (
+        'id', 'username', 'email', 'password', 'age', 'bio', 'is_active', 'created_at', 'updated_at', 'deleted_at',
+    )),
+    'post': (Post, (
+        'id', 'user_id', 'title', 'description', 'content', 'private', 'is_active', 'like_count',
+        'created_at', 'updated_at', 'deleted_at',
+    )),
+    'like': (Like, ('id', 'post_id', 'user_id', 'like', 'created_at', 'updated_at', 'deleted_at')),
+}
+
+
+def encode_value(value):
+    # Full precision, unlike DjangoJSONEncoder, which drops microseconds
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(record):
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, default=encode_value, separators=(',', ':')) + '\n').encode()
+
+
+def loads(line):
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def export_records(batch_size, progress=None):
+    """
+    Yield every user, post and like as an NDJSON line ({"model": ..., "fields": ...}).
+
+    Each table is read in keyset batches of `batch_size` ids, and each batch
+    through a server-side cursor, so memory stays flat and no query scans
+    past its batch.
+    """
+    for name, (model, fields) in TRANSFER_FIELDS.items():
+        last_id = 0
+        exported = 0
+        while True:
+            rows = model.objects.filter(id__gt=last_id).order_by('id').values(*fields)[:batch_size]
+            count = 0
+            for row in rows.iterator(chunk_size=batch_size):
+                count += 1
+                yield dumps({'model': name, 'fields': row})
+            if not count:
+                break
+            last_id = row['id']
+            exported += count
+            if progress is not None:
+                progress(name, exported)
+
+
+@contextlib.contextmanager
+def keep_auto_now(*models):
+    """
+    Let bulk_create write the imported updated_at values instead of the
+    current time. Only for single-threaded commands: it changes the fields
+    for the whole process while active.
+    """
+    fields = [field for model in models for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+    for field in fields:
+        field.auto_now = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now = True
+
+
+class Importer:
+    """
+    Load an export_blog file chunk by chunk.
+
+    By default rows get new ids and foreign keys are remapped through the
+    ids given to the users and posts already imported. Users are matched on
+    email and posts on title, both unique, so rows that already exist are
+    mapped rather than duplicated. With `keep_ids` rows keep their ids, and
+    on PostgreSQL each chunk is loaded with COPY.
+
+    Every chunk commits on its own, then its line offset and new id mappings
+    are appended to the checkpoint file. A failed run started again with the
+    same checkpoint skips what was committed; a chunk committed but not yet
+    checkpointed is imported again, which the matching above makes harmless.
+    """
+
+    def __init__(self, path, checkpoint_path, batch_size=2000, keep_ids=False, use_copy=True, progress=None):
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.keep_ids = keep_ids
+        self.use_copy = use_copy and keep_ids and connection.vendor == 'postgresql'
+        self.progress = progress
+        self.offset = 0
+        self.line = 0
+        self.id_maps = {'user': {}, 'post': {}}
+        self.totals = {name: 0 for name in TRANSFER_FIELDS}
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path, 'rb') as checkpoint:
+            for entry in checkpoint:
+                try:
+                    entry = loads(entry)
+                except ValueError:
+                    # A line torn by the crash; its chunk is imported again
+                    break
+                self.offset, self.line = entry['offset'], entry['line']
+                self.totals = entry['totals']
+                for name, mapping in entry['ids'].items():
+                    self.id_maps[name].update((int(old), new) for old, new in mapping.items())
+        return True
+
+    def run(self):
+        with keep_auto_now(User, Post, Like), open(self.path, 'rb') as source:
+            source.seek(self.offset)
+            for name, records, size in self.chunks(source):
+                new_ids = self.import_chunk(name, records)
+                self.offset += size
+                self.line += len(records)
+                self.totals[name] += len(records)
+                self.save_checkpoint({name: new_ids} if new_ids else {})
+                if self.progress is not None:
+                    self.progress(name, self.totals[name], self.line)
+        if self.keep_ids:
+            self.reset_sequences()
+        bump_feed_version()
+        return self.totals
+
+    def chunks(self, source):
+        """Yield (model name, records, bytes read) for runs of up to batch_size lines of one model."""
+        name, records, size = None, [], 0
+        for raw in source:
+            if not raw.strip():
+                size += len(raw)
+                continue
+            try:
+                record = loads(raw)
+                model = record['model']
+                if model not in TRANSFER_FIELDS:
+                    raise ValueError(f"unknown model {model!r}")
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"line {self.line + len(records) + 1}: {e}")
+            if records and (model != name or len(records) >= self.batch_size):
+                yield name, records, size
+                records, size = [], 0
+            name = model
+            records.append(record['fields'])
+            size += len(raw)
+        if records:
+            yield name, records, size
+
+    def import_chunk(self, name, records):
+        model, fields = TRANSFER_FIELDS[name]
+        rows = [self.prepare(name, dict(row)) for row in records]
+        rows = [row for row in rows if row is not None]
+        with transaction.atomic():
+            if self.use_copy:
+                try:
+                    with transaction.atomic():
+                        self.copy(model, fields, rows)
+                    return {}
+                except IntegrityError:
+                    # Rows of a chunk committed before the checkpoint was written
+                    pass
+            if self.keep_ids:
+                model.objects.bulk_create([model(**row) for row in rows], ignore_conflicts=True)
+                return {}
+            return self.insert_remapped(name, model, rows)
+
+    def prepare(self, name, row):
+        """Remap the row's foreign keys; None when they point at rows that were not imported."""
+        if name == 'user':
+            # Already hashed passwords are kept as they are, with no re-hashing
+            if not is_password_hashed(row['password']):
+                row['password'] = make_password(row['password'])
+            return row
+        if self.keep_ids:
+            return row
+        for key, target in (('user_id', 'user'), ('post_id', 'post')):
+            if key in row and row[key] is not None:
+                row[key] = self.id_maps[target].get(row[key])
+                if row[key] is None:
+                    return None
+        return row
+
+    def insert_remapped(self, name, model, rows):
+        """Insert `rows` under new ids and return {old id: new id} for users and posts."""
+        old_ids = [row.pop('id') for row in rows]
+        if name == 'like':
+            model.objects.bulk_create([model(**row) for row in rows], ignore_conflicts=True)
+            return {}
+
+        key = 'email' if name == 'user' else 'title'
+        existing = dict(model.objects.filter(**{f'{key}__in': [row[key] for row in rows]}).values_list(key, 'id'))
+        model.objects.bulk_create([model(**row) for row in rows if row[key] not in existing])
+        # Read back by natural key, so this works without RETURNING support
+        new_ids = dict(model.objects.filter(**{f'{key}__in': [row[key] for row in rows]}).values_list(key, 'id'))
+        mapping = {old_id: new_ids[row[key]] for old_id, row in zip(old_ids, rows)}
+        self.id_maps[name].update(mapping)
+        return mapping
+
+    def copy(self, model, fields, rows):
+        buffer = io.StringIO()
+        # Quoting every string tells an empty string apart from NULL
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+        for row in rows:
+            writer.writerow([row[field] for field in fields])
+        buffer.seek(0)
+        columns = ', '.join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
+        sql = f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)'
+        with connection.cursor() as cursor:
+            if hasattr(cursor.cursor, 'copy_expert'):
+                cursor.cursor.copy_expert(sql, buffer)
+            else:
+                # psycopg 3
+                with cursor.cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+
+    def reset_sequences(self):
+        # Ids were inserted explicitly, so move the sequences past them
+        statements = connection.ops.sequence_reset_sql(no_style(), [User, Post, Like])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def save_checkpoint(self, ids):
+        entry = {
+            'offset': self.offset, 'line': self.line, 'totals': self.totals,
+            'ids': {name: {str(old): new for old, new in mapping.items()} for name, mapping in ids.items()},
+        }
+        with open(self.checkpoint_path, 'ab') as checkpoint:
+            checkpoint.write(dumps(entry))
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
@@ -0,0 +1,148 @@
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Exp, Greatest, Ln
+from django.utils import timezone
+
+from .feed_cache import FEED_FIELDS, FEED_ROW_FIELDS
+from .models import Like, Post, TrendingScore
+
+# Scores are stored relative to this moment; any fixed point works
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+# What is left of a score after an unlike takes away more than it had
+MIN_WEIGHT = 1e-9
+# exp() of anything lower is zero as far as a float sum is concerned
+MIN_EXPONENT = -700.0
+
+
+def decay_rate():
+    return math.log(2) / getattr(settings, 'TRENDING_HALF_LIFE', 6 * 60 * 60)
+
+
+def log_weight(moment):
+    """Log of the weight a like at `moment` adds: it doubles every half-life after the epoch."""
+    return decay_rate() * (moment - TRENDING_EPOCH).total_seconds()
+
+
+def current_score(score, now):
+    """A stored score as the number of fresh likes it is worth at `now`."""
+    return math.exp(score - log_weight(now))
+
+
+def added_score(delta, moment):
+    """
+    The UPDATE expression adding `delta` likes at `moment` to the stored score.
+
+    Computed as log-sum-exp around the larger of the two logs, so neither
+    exponential overflows however far `moment` is from the epoch. Exponents
+    are clamped at MIN_EXPONENT, as PostgreSQL raises on underflow.
+    """
+    weight = Value(log_weight(moment))
+    largest = Greatest(F('score'), weight)
+
+    def exp(value):
+        return Exp(Greatest(value - largest, Value(MIN_EXPONENT), output_field=FloatField()))
+
+    total = exp(F('score')) + delta * exp(weight)
+    return largest + Ln(Greatest(total, Value(MIN_WEIGHT), output_field=FloatField()))
+
+
+def trending_rows(user, limit, fields=None):
+    """
+    The `limit` highest scored posts `user` may see, as feed rows with their
+    current score, read in order from the score index.
+    """
+    fields = fields or FEED_ROW_FIELDS
+    now = timezone.now()
+    columns = {name: F('post_id' if name == 'id' else f'post__{name}') for name in fields if name in FEED_FIELDS}
+    if 'likes_count' in fields:
+        columns['likes_count'] = F('post__like_count')
+    rows = list(
+        TrendingScore.objects.filter(Q(post__is_active=True) & (Q(post__user=user) | Q(post__private=False)))
+        .order_by('-score')
+        .values(**columns, stored_score=F('score'))[:limit]
+    )
+    for row in rows:
+        row['score'] = round(current_score(row.pop('stored_score'), now), 4)
+    return rows
+
+
+def likes_changed(deltas, now=None):
+    """
+    Add the like changes in `deltas` (post id -> change) to the posts' scores.
+
+    An unlike takes away a fresh like's weight, not the weight the like was
+    added with, so posts slightly lose score on a like and unlike pair;
+    recompute_trending restores the exact figures.
+    """
+    if not deltas:
+        return
+    now = now or timezone.now()
+    if len(deltas) == 1:
+        post_id, delta = next(iter(deltas.items()))
+        updated = TrendingScore.objects.filter(post_id=post_id).update(score=added_score(delta, now))
+        if not updated and delta > 0:
+            TrendingScore.objects.bulk_create(
+                [TrendingScore(post_id=post_id, score=log_weight(now) + math.log(delta))], ignore_conflicts=True
+            )
+        return
+
+    # Rows start out worthless (exp(-1e9) is 0) and get the change below
+    TrendingScore.objects.bulk_create(
+        [TrendingScore(post_id=post_id, score=-1e9) for post_id, delta in deltas.items() if delta > 0],
+        ignore_conflicts=True,
+    )
+    delta = Case(
+        *[When(post_id=post_id, then=Value(float(delta))) for post_id, delta in deltas.items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    TrendingScore.objects.filter(post_id__in=deltas).update(score=added_score(delta, now))
+
+
+async def alikes_changed(post_id, delta):
+    now = timezone.now()
+    updated = await TrendingScore.objects.filter(post_id=post_id).aupdate(score=added_score(delta, now))
+    if not updated and delta > 0:
+        await TrendingScore.objects.abulk_create(
+            [TrendingScore(post_id=post_id, score=log_weight(now) + math.log(delta))], ignore_conflicts=True
+        )
+
+
+def recompute_scores(now=None, batch_size=1000, progress=None):
+    """
+    Rebuild every score from the likes of the last TRENDING_WINDOW seconds
+    and drop the rows that have decayed below the window.
+
+    A like counts from its row's updated_at, the last time it was set. Likes
+    written while this runs may be overwritten; the next run counts them.
+    Returns (scores written, rows dropped).
+    """
+    now = now or timezone.now()
+    start = now - timedelta(seconds=getattr(settings, 'TRENDING_WINDOW', 3 * 24 * 60 * 60))
+    rate = decay_rate()
+
+    # Summed relative to now, so every weight is between exp(-rate * window) and 1
+    weights = {}
+    likes = Like.objects.filter(like=True, updated_at__gte=start).values_list('post_id', 'updated_at')
+    for post_id, updated_at in likes.iterator(chunk_size=batch_size):
+        weights[post_id] = weights.get(post_id, 0.0) + math.exp(rate * (min(updated_at, now) - now).total_seconds())
+
+    base = log_weight(now)
+    post_ids = list(weights)
+    for offset in range(0, len(post_ids), batch_size):
+        # Skips posts purged since their likes were read
+        batch = Post.objects.filter(id__in=post_ids[offset:offset + batch_size]).values_list('id', flat=True)
+        TrendingScore.objects.bulk_create(
+            [TrendingScore(post_id=post_id, score=base + math.log(weights[post_id])) for post_id in batch],
+            update_conflicts=True,
+            unique_fields=['post'],
+            update_fields=['score'],
+        )
+        if progress is not None:
+            progress(min(offset + batch_size, len(post_ids)))
+
+    dropped, _ = TrendingScore.objects.filter(score__lt=log_weight(start)).delete()
+    return len(post_ids), dropped
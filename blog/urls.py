@@ -1,14 +1,30 @@
 from django.urls import path
-from .views import UserAPIView,PostAPIView,LikeAPIView,UserDataAPIView,UserUpdateAPIView,PostUpdateAPIView,PostListAPIView,UserDeleteAPIView,PostDeleteAPIView
+from .async_views import AsyncLikeView, AsyncPostListView, AsyncUserDataView
+from .metrics import metrics_view
+from .views import UserAPIView,LoginAPIView,PostAPIView,LikeAPIView,BulkLikeAPIView,UserDataAPIView,UserUpdateAPIView,PostUpdateAPIView,PostListAPIView,PostSearchAPIView,TrendingAPIView,PostLikesAnalyticsAPIView,TopAuthorsAnalyticsAPIView,UserDeleteAPIView,PostDeleteAPIView
 
 urlpatterns = [
     path('add_user/', UserAPIView.as_view(), name='add_user'),
+    path('login/', LoginAPIView.as_view(), name='login'),
     path('add_post/', PostAPIView.as_view(), name='add_post'),
     path('add_like/', LikeAPIView.as_view(), name='add_like'),
+    path('add_likes/', BulkLikeAPIView.as_view(), name='add_likes'),
     path('user_data/', UserDataAPIView.as_view(), name='user_data'),
     path('user_update/', UserUpdateAPIView.as_view(), name='user_update'),
     path('post_update/', PostUpdateAPIView.as_view(), name='post_update'),
     path('all_post/', PostListAPIView.as_view(), name='all_post'),
+    path('search_post/', PostSearchAPIView.as_view(), name='search_post'),
+    path('trending/', TrendingAPIView.as_view(), name='trending'),
+    path('analytics/post_likes/', PostLikesAnalyticsAPIView.as_view(), name='analytics_post_likes'),
+    path('analytics/top_authors/', TopAuthorsAnalyticsAPIView.as_view(), name='analytics_top_authors'),
     path('delete_user/', UserDeleteAPIView.as_view(), name='delete_user'),
     path('delete_post/', PostDeleteAPIView.as_view(), name='delete_post'),
+
+    # native async variants, for deployments served through blog_project/asgi.py
+    path('async/add_like/', AsyncLikeView.as_view(), name='async_add_like'),
+    path('async/user_data/', AsyncUserDataView.as_view(), name='async_user_data'),
+    path('async/all_post/', AsyncPostListView.as_view(), name='async_all_post'),
+
+    # Prometheus metrics of QueryMetricsMiddleware
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,134 @@
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Post, UserStats
+
+STATS_FIELDS = ('post_count', 'active_post_count', 'total_likes', 'last_post_at')
+
+
+def compute_stats(user_ids):
+    """Recompute the summary of each of `user_ids` from blog_post, in one aggregate."""
+    active = Q(is_active=True)
+    rows = (
+        Post.objects.filter(user_id__in=user_ids)
+        .values('user_id')
+        .annotate(
+            post_count=Count('id'),
+            active_post_count=Count('id', filter=active),
+            total_likes=Coalesce(Sum('like_count', filter=active), 0),
+            last_post_at=Max('created_at', filter=active),
+        )
+        .order_by()
+    )
+    stats = {user_id: {'post_count': 0, 'active_post_count': 0, 'total_likes': 0, 'last_post_at': None}
+             for user_id in user_ids}
+    for row in rows:
+        stats[row.pop('user_id')] = row
+    return stats
+
+
+def rebuild_stats(user_ids):
+    """
+    Overwrite the summaries of `user_ids` with freshly computed ones.
+
+    Existing rows are locked before counting, so an incremental update that
+    commits meanwhile waits and then applies its change on top of the new
+    value, the same way recount_likes handles like_count.
+    """
+    with transaction.atomic():
+        list(UserStats.objects.select_for_update().filter(user_id__in=user_ids).values_list('user_id'))
+        stats = compute_stats(user_ids)
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=user_id, **values) for user_id, values in stats.items()],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=STATS_FIELDS,
+        )
+    return stats
+
+
+def get_stats(user):
+    """`user`'s summary, built on first use for users that predate it."""
+    try:
+        return UserStats.objects.get(user=user)
+    except UserStats.DoesNotExist:
+        return UserStats(user_id=user.id, **rebuild_stats([user.id])[user.id])
+
+
+async def aget_stats(user):
+    try:
+        return await UserStats.objects.aget(user=user)
+    except UserStats.DoesNotExist:
+        return UserStats(user_id=user.id, **(await sync_to_async(rebuild_stats)([user.id]))[user.id])
+
+
+def stats_data(stats):
+    return {
+        'post_count': stats.post_count,
+        'active_post_count': stats.active_post_count,
+        'total_likes': stats.total_likes,
+        'last_post_at': stats.last_post_at,
+    }
+
+
+def post_created(post):
+    """Count a new active post in its author's summary."""
+    UserStats.objects.filter(user_id=post.user_id).update(
+        post_count=F('post_count') + 1,
+        active_post_count=F('active_post_count') + 1,
+        total_likes=F('total_likes') + post.like_count,
+        last_post_at=Case(
+            When(last_post_at__gte=post.created_at, then=F('last_post_at')),
+            default=Value(post.created_at),
+        ),
+    )
+
+
+def post_deleted(post):
+    """Take a post that was just made inactive out of its author's active figures."""
+    UserStats.objects.filter(user_id=post.user_id).update(
+        active_post_count=F('active_post_count') - 1,
+        # Read in the same statement, so likes counted meanwhile are included
+        total_likes=F('total_likes') - Subquery(Post.objects.filter(pk=post.pk).values('like_count')[:1]),
+        last_post_at=Subquery(
+            Post.objects.filter(user_id=OuterRef('user_id'), is_active=True)
+            .order_by('-created_at').values('created_at')[:1]
+        ),
+    )
+
+
+def like_count_changed(deltas):
+    """
+    Add the like_count changes in `deltas` (post id -> change) to the
+    authors' total_likes. Inactive posts are left out, as they are of
+    total_likes.
+    """
+    if not deltas:
+        return
+    if len(deltas) == 1:
+        post_id, delta = next(iter(deltas.items()))
+        UserStats.objects.filter(
+            user_id=Subquery(Post.objects.filter(pk=post_id, is_active=True).values('user_id')[:1])
+        ).update(total_likes=F('total_likes') + delta)
+        return
+
+    by_user = {}
+    for post_id, user_id in Post.objects.filter(pk__in=deltas, is_active=True).values_list('id', 'user_id'):
+        by_user[user_id] = by_user.get(user_id, 0) + deltas[post_id]
+    by_user = {user_id: delta for user_id, delta in by_user.items() if delta}
+    if by_user:
+        UserStats.objects.filter(user_id__in=by_user).update(
+            total_likes=F('total_likes') + Case(
+                *[When(user_id=user_id, then=Value(delta)) for user_id, delta in by_user.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+
+
+async def alike_count_changed(post_id, delta):
+    await UserStats.objects.filter(
+        user_id=Subquery(Post.objects.filter(pk=post_id, is_active=True).values('user_id')[:1])
+    ).aupdate(total_likes=F('total_likes') + delta)
@@ -1,11 +1,53 @@
+from itertools import chain, islice
+
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import User, Post, Like
-from .serializers import UserSerializer,PostSerializer
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from .authentication import CustomTokenAuthentication, token_cache
+from .conditional import all_post_etag, not_modified, set_etag, user_data_etag
+from .hashing import HashingPoolBusy, password_hashing_pool
+from .like_buffer import get_like_buffer
+from .likes import set_like, stored_likes, upsert_likes
+from .feed_cache import (
+    FEED_ROW_FIELDS, bump_feed_version, get_public_page, merge_rows, post_rows, post_rows_queryset, private_posts,
+    visible_posts
+)
+from .pagination import InvalidPage, build_page, decode_id_cursor, encode_cursor, get_page_size
+from .search import search_posts
+from .streaming import streaming_json_response
+from .trending import trending_rows
+from .rollups import InvalidRange, parse_day_range, post_likes_by_day, top_authors
+from .user_stats import get_stats, post_created, post_deleted, stats_data
+from .models import User, Post, Like, UserStats
+from .serializers import InvalidFields, UserSerializer, PostSerializer, parse_fields
 from .models import User, CustomToken
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
 from django.utils import timezone
-from django.db.models import Q,Count
+
+# base view for every endpoint that needs the Token header
+class TokenAPIView(APIView):
+    authentication_classes = [CustomTokenAuthentication]
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Check if token is present in the request header
+        if request.auth is None:
+            raise NotAuthenticated("Token is required in the request header")
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotAuthenticated):
+            return Response({
+                "status": 400,
+                "message": str(exc.detail)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(exc, AuthenticationFailed):
+            return Response({
+                "status": 401,
+                "message": str(exc.detail)
+            }, status=status.HTTP_401_UNAUTHORIZED)
+        return super().handle_exception(exc)
 
 #add user 
 class UserAPIView(APIView):
@@ -32,6 +74,15 @@ class UserAPIView(APIView):
                 "message": "Email is already exists, please use another email"
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        # Hash the password on the bounded hashing pool
+        try:
+            password = password_hashing_pool.make_password(password)
+        except HashingPoolBusy:
+            return Response({
+                "status": 503,
+                "message": "Server is busy, please try again later"
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
         try:
             user = User.objects.create(
                 username=username,
@@ -42,6 +93,8 @@ class UserAPIView(APIView):
                 is_active=True
             )
 
+            UserStats.objects.create(user=user)
+
             # Generate and save custom token
             custom_token = CustomToken.generate_token(user)
 
@@ -56,27 +109,66 @@ class UserAPIView(APIView):
                 "message": f"An error occurred: {str(e)}"
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-#add post
-class PostAPIView(APIView):
+#login
+class LoginAPIView(APIView):
     def post(self, request):
-        # Check if token is present in the request header
-        token = request.headers.get('Token')
-        if not token:
+        required_fields = ['email', 'password']
+        missing_fields = [field for field in required_fields if field not in request.data]
+
+        if missing_fields:
             return Response({
                 "status": 400,
-                "message": "Token is required in the request header"
+                "message": f"{', '.join(missing_fields)} {'is' if len(missing_fields) == 1 else 'are'} required field{'s' if len(missing_fields) > 1 else ''}"
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if the token is valid and fetch the associated user
+        user = User.objects.filter(email=request.data.get('email'), is_active=True).first()
+
+        def rehash(raw_password):
+            # The hash was made with an outdated hasher or iteration count
+            try:
+                user.password = password_hashing_pool.make_password(raw_password)
+            except HashingPoolBusy:
+                # Upgraded on a later login instead
+                return
+            user.save(update_fields=['password'])
+
+        # Check the password on the bounded hashing pool
         try:
-            custom_token = CustomToken.objects.get(token=token)
-            user = custom_token.user
-        except CustomToken.DoesNotExist:
+            if user is None:
+                # Hash anyway, so the response time does not tell whether the email is registered
+                password_hashing_pool.make_password(request.data.get('password'))
+                valid = False
+            else:
+                valid = password_hashing_pool.check_password(
+                    request.data.get('password'), user.password, setter=rehash
+                )
+        except HashingPoolBusy:
+            return Response({
+                "status": 503,
+                "message": "Server is busy, please try again later"
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if not valid:
             return Response({
                 "status": 401,
-                "message": "Invalid token"
+                "message": "Invalid email or password"
             }, status=status.HTTP_401_UNAUTHORIZED)
 
+        # Replace the previous (possibly expired) token
+        custom_token = CustomToken.reissue(user)
+        token_cache.invalidate_user(user.id)
+
+        return Response({
+            "status": 200,
+            "message": "Logged in successfully",
+            "token": custom_token.token
+        }, status=status.HTTP_200_OK)
+
+#add post
+class PostAPIView(TokenAPIView):
+    def post(self, request):
+        user = request.user
+
         # Check if required fields are present
         required_fields = ['title', 'description', 'content']
         missing_fields = [field for field in required_fields if field not in request.data]
@@ -107,10 +199,18 @@ class PostAPIView(APIView):
                 created_at=timezone.now(),
                 updated_at=timezone.now()  # Assuming initial creation and update times are the same
             )
+            post_created(post)
+            bump_feed_version()
             return Response({
                 "status": 200,
                 "message": "Post added successfully"
             }, status=status.HTTP_200_OK)
+        except IntegrityError:
+            # Another request took the title after the check above
+            return Response({
+                "status": 400,
+                "message": "A post with this title already exists, please use different title"
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 "status": 500,
@@ -118,25 +218,9 @@ class PostAPIView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 #add like
-class LikeAPIView(APIView):
+class LikeAPIView(TokenAPIView):
     def post(self, request):
-        # Check if token is present in the request header
-        token = request.headers.get('Token')
-        if not token:
-            return Response({
-                "status": 400,
-                "message": "Token is required in the request header"
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        # Check if the token is valid and fetch the associated user
-        try:
-            custom_token = CustomToken.objects.get(token=token)
-            user = custom_token.user
-        except CustomToken.DoesNotExist:
-            return Response({
-                "status": 401,
-                "message": "Invalid token"
-            }, status=status.HTTP_401_UNAUTHORIZED)
+        user = request.user
 
         # Check if required fields are present
         required_fields = ['like', 'post_id']
@@ -168,16 +252,18 @@ class LikeAPIView(APIView):
                 "message": "Invalid value for 'like'. It should be a boolean (True/False)"
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create the like
+        # Create or update the like, through the write-behind buffer when enabled
+        like_buffer = get_like_buffer()
         try:
-            like_instance, created = Like.objects.get_or_create(
-                post=post,
-                user=user,
-                defaults={'like': like, 'created_at': timezone.now()}
-            )
-            if not created:
-                like_instance.like = like
-                like_instance.save()
+            if like_buffer is not None:
+                stored_like = False
+                if like_buffer.pending_like(user.id, post.id) is None:
+                    stored_like = bool(
+                        Like.objects.filter(post=post, user=user).values_list('like', flat=True).first()
+                    )
+                like_buffer.add(user.id, post.id, like, stored_like)
+            else:
+                set_like(post, user, like)
             return Response({
                 "status": 200,
                 "message": "Like updated successfully"
@@ -188,28 +274,89 @@ class LikeAPIView(APIView):
                 "message": f"An error occurred: {str(e)}"
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-#############################################
-        
-# show a specific user data
-class UserDataAPIView(APIView):
-    def get(self, request):
-        # Check if token is present in the request header
-        token = request.headers.get('Token')
-        if not token:
+#add likes in bulk
+class BulkLikeAPIView(TokenAPIView):
+    def post(self, request):
+        user = request.user
+
+        # Check if the likes list is present
+        items = request.data.get('likes')
+        if not isinstance(items, list) or not items:
             return Response({
                 "status": 400,
-                "message": "Token is required in the request header"
+                "message": "likes is a required field and must be a non-empty list"
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Fetch the current user using the token
+        max_items = getattr(settings, 'BULK_LIKE_MAX_ITEMS', 500)
+        if len(items) > max_items:
+            return Response({
+                "status": 400,
+                "message": f"At most {max_items} likes can be sent at once"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Validate every item before touching the database
+        results = []
+        wanted = {}
+        for item in items:
+            post_id = item.get('post_id') if isinstance(item, dict) else None
+            like = item.get('like') if isinstance(item, dict) else None
+            result = {"post_id": post_id}
+            results.append(result)
+            # Only real integers or digit strings; int() would take true or 1.7 as 1
+            if isinstance(post_id, str) and post_id.isascii() and post_id.isdigit():
+                post_id = int(post_id)
+            elif not isinstance(post_id, int) or isinstance(post_id, bool):
+                result.update(status=400, message="post_id is required and must be an integer")
+                continue
+            if not isinstance(like, bool):
+                result.update(status=400, message="Invalid value for 'like'. It should be a boolean (True/False)")
+                continue
+            # The last value sent for a post wins
+            wanted[post_id] = (like, result)
+
+        # Check all posts exist with one query
+        posts = Post.objects.only('id').in_bulk(list(wanted))
+        likes = {}
+        for post_id, (like, result) in wanted.items():
+            if post_id not in posts:
+                result.update(status=400, message="Post does not exist")
+                continue
+            likes[(user.id, post_id)] = like
+
+        # Write the likes, through the write-behind buffer when enabled so
+        # they are ordered with the single likes already waiting in it
+        like_buffer = get_like_buffer()
         try:
-            custom_token = CustomToken.objects.get(token=token)
-            user = custom_token.user
-        except CustomToken.DoesNotExist:
+            if like_buffer is not None:
+                unbuffered = [key for key in likes if like_buffer.pending_like(*key) is None]
+                like_buffer.add_many(likes, stored_likes(unbuffered))
+            else:
+                upsert_likes(likes)
+        except Exception as e:
             return Response({
-                "status": 401,
-                "message": "Invalid token"
-            }, status=status.HTTP_401_UNAUTHORIZED)
+                "status": 500,
+                "message": f"An error occurred: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        for post_id, (like, result) in wanted.items():
+            if "status" not in result:
+                result.update(status=200, message="Like updated successfully")
+        for result in results:
+            if "status" not in result:
+                result.update(status=200, message="Superseded by a later like for the same post")
+
+        return Response({
+            "status": 200,
+            "message": "Likes processed",
+            "data": results
+        }, status=status.HTTP_200_OK)
+
+#############################################
+        
+# show a specific user data
+class UserDataAPIView(TokenAPIView):
+    def get(self, request):
+        user = request.user
         
         if not user.is_active:
             return Response({
@@ -217,49 +364,52 @@ class UserDataAPIView(APIView):
                 "message": "User not found"
             }, status=status.HTTP_404_NOT_FOUND)
 
+        # Check if only some post fields were asked for
+        try:
+            fields = parse_fields(request.query_params.get('fields'), PostSerializer.Meta.fields)
+        except InvalidFields as e:
+            return Response({
+                "status": 400,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Check if the client already has the current data
+        etag = user_data_etag(user, fields)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
         # Fetch user data
         user_serializer = UserSerializer(user)
 
-        # Fetch all posts created by the current user
-        user_posts = Post.objects.filter(user=user)
+        # Fetch the newest active posts of the current user in one query,
+        # loading only the columns of the requested fields; total_likes
+        # comes from the like_count column
+        max_posts = getattr(settings, 'USER_DATA_MAX_POSTS', 100)
+        user_posts = Post.objects.filter(user=user, is_active=True).only(
+            *PostSerializer.source_fields(fields)
+        ).order_by('-id')[:max_posts]
 
-        # Serialize posts along with total number of likes for each active post
-        posts_data = []
-        for post in user_posts:
-            if post.is_active:
-                post_data = PostSerializer(post).data
-                total_likes = Like.objects.filter(post=post, like=True).count()
-                post_data['total_likes'] = total_likes
-                posts_data.append(post_data)
+        posts_data = PostSerializer(user_posts, many=True, fields=fields).data
+        like_buffer = get_like_buffer()
+        if like_buffer is not None:
+            like_buffer.apply_pending_counts(posts_data, 'total_likes')
 
         data = {
             "status": status.HTTP_200_OK,
             "message": "User data fetched successfully",
             "user": user_serializer.data,
+            "stats": stats_data(get_stats(user)),
             "posts": posts_data
         }
-        return Response(data)
+        return set_etag(Response(data), etag)
     
 #############################################
     
 #update user
-class UserUpdateAPIView(APIView):
+class UserUpdateAPIView(TokenAPIView):
     def put(self, request):
-        token = request.headers.get('Token')
-        if not token:
-            return Response({
-                "status": 400,
-                "message": "Token is required in the request header"
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            custom_token = CustomToken.objects.get(token=token)
-            user = custom_token.user
-        except CustomToken.DoesNotExist:
-            return Response({
-                "status": 401,
-                "message": "Invalid token"
-            }, status=status.HTTP_401_UNAUTHORIZED)
+        user = request.user
 
         allowed_fields = ['username', 'email', 'age', 'bio']
 
@@ -272,12 +422,20 @@ class UserUpdateAPIView(APIView):
                 "message": f"Unexpected fields: {', '.join(extra_fields)}"
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        # Write only these columns: request.user comes from the token cache
+        # and may be stale, e.g. deleted by another worker meanwhile
+        now = timezone.now()
+        if not User.objects.filter(pk=user.pk, is_active=True).update(**update_data, updated_at=now):
+            token_cache.invalidate_user(user.id)
+            return Response({
+                "status": 404,
+                "message": "User not found"
+            }, status=status.HTTP_404_NOT_FOUND)
+        token_cache.invalidate_user(user.id)
+
         for key, value in update_data.items():
             setattr(user, key, value)
-
-        user.updated_at = timezone.now()
-
-        user.save()
+        user.updated_at = now
 
         serializer = UserSerializer(user)
         data = {
@@ -288,23 +446,9 @@ class UserUpdateAPIView(APIView):
         return Response(data)
     
 #update post
-class PostUpdateAPIView(APIView):
+class PostUpdateAPIView(TokenAPIView):
     def put(self, request):
-        token = request.headers.get('Token')
-        if not token:
-            return Response({
-                "status": 400,
-                "message": "Token is required in the request header"
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            custom_token = CustomToken.objects.get(token=token)
-            user = custom_token.user
-        except CustomToken.DoesNotExist:
-            return Response({
-                "status": 401,
-                "message": "Invalid token"
-            }, status=status.HTTP_401_UNAUTHORIZED)
+        user = request.user
 
         post_id = request.data.get('post_id')
         if not post_id:
@@ -345,7 +489,14 @@ class PostUpdateAPIView(APIView):
                 setattr(post, key, value)
 
         post.updated_at = timezone.now()
-        post.save()
+        try:
+            post.save()
+        except IntegrityError:
+            return Response({
+                "status": 400,
+                "message": "A post with this title already exists, please use a different title"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        bump_feed_version()
 
         serializer = PostSerializer(post)
 
@@ -362,23 +513,9 @@ class PostUpdateAPIView(APIView):
 #############################################
 
 # get all post
-class PostListAPIView(APIView):
+class PostListAPIView(TokenAPIView):
     def get(self, request):
-        token = request.headers.get('Token')
-        if not token:
-            return Response({
-                "status": 400,
-                "message": "Token is required in the request header"
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        try:
-            custom_token = CustomToken.objects.get(token=token)
-            user = custom_token.user
-        except CustomToken.DoesNotExist:
-            return Response({
-                "status": 401,
-                "message": "Invalid token"
-            }, status=status.HTTP_401_UNAUTHORIZED)
+        user = request.user
         
         # posts = Post.objects.filter(Q(is_active=True) & Q(Q(user_id=user) | Q(private=False))).order_by('-id')
 
@@ -395,50 +532,209 @@ class PostListAPIView(APIView):
         #     }
 
         #     posts_data.append(post_data)
-        posts = Post.objects.filter(
-            Q(is_active=True) &
-            (Q(user_id=user) | Q(private=False))
-        ).annotate(likes_count=Count('like__id', filter=Q(like__like=True))).order_by('-id')
+        stream = request.query_params.get('stream') in ('1', 'true')
+        try:
+            last_id = decode_id_cursor(request.query_params.get('cursor'))
+            page_size = get_page_size(
+                request.query_params,
+                maximum=getattr(settings, 'FEED_STREAM_MAX_PAGE_SIZE', 10000) if stream else None
+            )
+            fields = parse_fields(request.query_params.get('fields'), FEED_ROW_FIELDS)
+        except (InvalidPage, InvalidFields) as e:
+            return Response({
+                "status": 400,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-        posts_data = list(posts.values('id', 'title', 'description', 'content', 'likes_count'))
+        # Check if the client already has the current page
+        etag = all_post_etag(user, last_id, page_size, fields, stream)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        if stream:
+            return set_etag(self.stream_posts(user, last_id, page_size, fields), etag)
+
+        # Visible posts are Q(is_active=True) & (Q(user_id=user) | Q(private=False)):
+        # the public part comes from the shared feed cache, the caller's own
+        # private posts are merged in from a small per-user query
+        public_rows, public_total = get_public_page(last_id, page_size + 1, fields)
+        own_private = private_posts(user)
+        private_rows = post_rows(own_private, last_id, page_size + 1, fields)
+        total_post = public_total + own_private.count()
+
+        rows = merge_rows(public_rows, private_rows, page_size + 1)
+        posts_data, next_cursor = build_page(rows, page_size)
+        like_buffer = get_like_buffer()
+        if like_buffer is not None:
+            like_buffer.apply_pending_counts(posts_data, 'likes_count')
 
         response_data = {
             "status": status.HTTP_200_OK,
             "message": "Posts fetched successfully",
-            "total_post": posts.count(),
-            "data": posts_data
+            "total_post": total_post,
+            "data": posts_data,
+            "next": next_cursor
         }
-
-        response_data = {
+        return set_etag(Response(response_data), etag)
+
+    def stream_posts(self, user, last_id, page_size, fields=None):
+        # Same envelope as above, written row by row from a server-side cursor
+        # so large pages never sit in memory as a whole. The body is only
+        # iterated after the middleware has returned, so the database is
+        # chosen here, while ReadYourWritesMiddleware still pins the request,
+        # and the count and rows come from the same one.
+        posts = visible_posts(user).using(router.db_for_read(Post))
+        head = {
             "status": status.HTTP_200_OK,
             "message": "Posts fetched successfully",
-            "total_post":posts.count(),
-            "data": posts_data
+            "total_post": posts.count()
         }
-        return Response(response_data)
+        chunk_size = getattr(settings, 'FEED_STREAM_CHUNK_SIZE', 500)
+        rows = post_rows_queryset(posts, last_id, page_size + 1, fields).iterator(chunk_size=chunk_size)
+        # Run the query now, so QueryMetricsMiddleware measures it
+        first = list(islice(rows, 1))
+        like_buffer = get_like_buffer()
+        tail = {"next": None}
+
+        def page():
+            try:
+                for index, row in enumerate(chain(first, rows)):
+                    if index == page_size:
+                        tail["next"] = encode_cursor({'id': last_row_id})
+                        break
+                    if like_buffer is not None:
+                        like_buffer.apply_pending_counts([row], 'likes_count')
+                    last_row_id = row['id']
+                    yield row
+            finally:
+                rows.close()
+
+        return streaming_json_response(head, "data", page(), lambda: tail)
     
 
-#############################################
-#delete user
-class UserDeleteAPIView(APIView):
-    def delete(self, request):
-        # Check if token is present in the request header
-        token = request.headers.get('Token')
-        if not token:
+# search posts
+class PostSearchAPIView(TokenAPIView):
+    def get(self, request):
+        user = request.user
+
+        query = request.query_params.get('q', '').strip()
+        if not query:
             return Response({
                 "status": 400,
-                "message": "Token is required in the request header"
+                "message": "q is a required query parameter"
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Fetch the current user using the token
         try:
-            custom_token = CustomToken.objects.get(token=token)
-            user = custom_token.user
-        except CustomToken.DoesNotExist:
+            page_size = get_page_size(request.query_params)
+            posts_data, next_cursor = search_posts(user, query, request.query_params.get('cursor'), page_size)
+        except InvalidPage as e:
             return Response({
-                "status": 401,
-                "message": "Invalid token"
-            }, status=status.HTTP_401_UNAUTHORIZED)
+                "status": 400,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        like_buffer = get_like_buffer()
+        if like_buffer is not None:
+            like_buffer.apply_pending_counts(posts_data, 'likes_count')
+
+        return Response({
+            "status": status.HTTP_200_OK,
+            "message": "Posts fetched successfully",
+            "data": posts_data,
+            "next": next_cursor
+        })
+
+
+#trending posts
+class TrendingAPIView(TokenAPIView):
+    def get(self, request):
+        user = request.user
+
+        # Check the page size and the requested fields
+        try:
+            page_size = get_page_size(request.query_params)
+            fields = parse_fields(request.query_params.get('fields'), FEED_ROW_FIELDS)
+        except (InvalidPage, InvalidFields) as e:
+            return Response({
+                "status": 400,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Highest scored visible posts, ranked by recompute_trending and like writes
+        posts_data = trending_rows(user, page_size, fields)
+        like_buffer = get_like_buffer()
+        if like_buffer is not None:
+            like_buffer.apply_pending_counts(posts_data, 'likes_count')
+
+        return Response({
+            "status": status.HTTP_200_OK,
+            "message": "Trending posts fetched successfully",
+            "data": posts_data
+        })
+
+
+#likes per day of a post
+class PostLikesAnalyticsAPIView(TokenAPIView):
+    def get(self, request):
+        user = request.user
+
+        # Check the date range
+        try:
+            start, end = parse_day_range(
+                request.query_params, 30, getattr(settings, 'ANALYTICS_MAX_DAYS', 366)
+            )
+        except InvalidRange as e:
+            return Response({
+                "status": 400,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Check if the post exists and is visible to the current user
+        post_id = request.query_params.get('post_id')
+        if not post_id or not post_id.isdigit() or not visible_posts(user).filter(id=post_id).exists():
+            return Response({
+                "status": 404,
+                "message": "Post not found"
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            "status": status.HTTP_200_OK,
+            "message": "Post likes fetched successfully",
+            "post_id": int(post_id),
+            "data": post_likes_by_day(int(post_id), start, end)
+        })
+
+
+#authors with the most likes
+class TopAuthorsAnalyticsAPIView(TokenAPIView):
+    def get(self, request):
+        # Check the date range and the number of authors
+        try:
+            start, end = parse_day_range(
+                request.query_params, 7, getattr(settings, 'ANALYTICS_MAX_DAYS', 366)
+            )
+            limit = get_page_size(request.query_params)
+        except (InvalidRange, InvalidPage) as e:
+            return Response({
+                "status": 400,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "status": status.HTTP_200_OK,
+            "message": "Top authors fetched successfully",
+            "start": start,
+            "end": end,
+            "data": top_authors(start, end, limit)
+        })
+
+
+#############################################
+#delete user
+class UserDeleteAPIView(TokenAPIView):
+    def delete(self, request):
+        user = request.user
 
         # Check if the user is active
         if not user.is_active:
@@ -447,9 +743,18 @@ class UserDeleteAPIView(APIView):
                 "message": "User not found"
             }, status=status.HTTP_404_NOT_FOUND)
 
-        # Deactivate the user
-        user.is_active = False
-        user.save()
+        # Deactivate the user with a conditional UPDATE rather than saving
+        # the (possibly stale) cached instance over the row
+        now = timezone.now()
+        deleted = User.objects.filter(pk=user.pk, is_active=True).update(
+            is_active=False, deleted_at=now, updated_at=now
+        )
+        token_cache.invalidate_user(user.id)
+        if not deleted:
+            return Response({
+                "status": 404,
+                "message": "User not found"
+            }, status=status.HTTP_404_NOT_FOUND)
 
         return Response({
             "status": status.HTTP_200_OK,
@@ -457,25 +762,9 @@ class UserDeleteAPIView(APIView):
         })
 
 #delete post
-class PostDeleteAPIView(APIView):
+class PostDeleteAPIView(TokenAPIView):
     def delete(self, request):
-        # Check if token is present in the request header
-        token = request.headers.get('Token')
-        if not token:
-            return Response({
-                "status": 400,
-                "message": "Token is required in the request header"
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        # Fetch the current user using the token
-        try:
-            custom_token = CustomToken.objects.get(token=token)
-            user = custom_token.user
-        except CustomToken.DoesNotExist:
-            return Response({
-                "status": 401,
-                "message": "Invalid token"
-            }, status=status.HTTP_401_UNAUTHORIZED)
+        user = request.user
         
         if not user.is_active:
             return Response({
@@ -500,9 +789,12 @@ class PostDeleteAPIView(APIView):
                 "message": "Post not found or does not belong to the current user"
             }, status=status.HTTP_404_NOT_FOUND)
 
-        # Deactivate the post
-        post.is_active = False
-        post.save()
+        # Deactivate the post; only the request that does it updates the stats
+        now = timezone.now()
+        with transaction.atomic():
+            if Post.objects.filter(pk=post.pk, is_active=True).update(is_active=False, deleted_at=now, updated_at=now):
+                post_deleted(post)
+        bump_feed_version()
 
         return Response({
             "status": status.HTTP_200_OK,
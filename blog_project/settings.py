@@ -43,9 +43,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog.middleware.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'blog.middleware.ReadYourWritesMiddleware',
+    'blog.middleware.ThrottleMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -94,6 +97,26 @@ DATABASES = {
         }
     }
 
+# Read replicas. Add an alias per replica to DATABASES and list it here, e.g.
+#
+#     DATABASES["replica"] = {**DATABASES["default"], "HOST": "replica-host",
+#                             "TEST": {"MIRROR": "default"}}
+#     DATABASE_REPLICAS = ["replica"]
+#
+# GET requests then read from a healthy replica (blog.db_router), except for
+# READ_YOUR_WRITES_WINDOW seconds after the same Token made a successful write
+# (blog.middleware.ReadYourWritesMiddleware).
+DATABASE_ROUTERS = ['blog.db_router.PrimaryReplicaRouter']
+
+# A second connection to the primary, mirrored onto the primary's test
+# database, so the tests can route reads through a real replica alias. Reads
+# only go to it when it is listed in DATABASE_REPLICAS.
+DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+DATABASE_REPLICAS = []
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+READ_YOUR_WRITES_WINDOW = 5
+READ_YOUR_WRITES_CACHE_ALIAS = 'feed'
+
 
 
 # Password validation
@@ -138,3 +161,139 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # AUTH_USER_MODEL = 'blog.User'
+
+# Token authentication cache (blog.authentication.CustomTokenAuthentication).
+# Entries are per process, so TOKEN_CACHE_TTL bounds how long another worker
+# may keep serving a user that was updated or deactivated elsewhere.
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_TTL = 60
+
+# Token lifetime (blog.authentication). A token expires TOKEN_ABSOLUTE_TTL
+# seconds after it was issued, or TOKEN_SLIDING_TTL seconds after its last
+# use; use is written back at most every TOKEN_RENEWAL_INTERVAL seconds.
+# Expired tokens get a 401 and are replaced through login; sweep_tokens
+# deletes them. Set either TTL to None to disable it.
+TOKEN_ABSOLUTE_TTL = 30 * 24 * 60 * 60
+TOKEN_SLIDING_TTL = 7 * 24 * 60 * 60
+TOKEN_RENEWAL_INTERVAL = 300
+TOKEN_SWEEP_BATCH_SIZE = 1000
+TOKEN_SWEEP_BATCH_PAUSE = 0.1
+
+# Password hashing pool used by add_user (blog.hashing.PasswordHashingPool).
+# Signups beyond workers + queue size get a 503 instead of tying up workers.
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_QUEUE_SIZE = 8
+PASSWORD_HASHING_TIMEOUT = 10
+
+# Cursor pagination for all_post (blog.pagination).
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+
+# Upper bound on the posts returned by user_data (newest first).
+USER_DATA_MAX_POSTS = 100
+
+# Caches. The public all_post feed (blog.feed_cache) lives in FEED_CACHE_ALIAS
+# and must be shared by all workers, because post and like writes invalidate
+# it by bumping a version key; the file backend does that on a single host.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'feed': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'feed',
+    },
+}
+FEED_CACHE_ALIAS = 'feed'
+FEED_CACHE_TIMEOUT = 300
+
+# Largest batch accepted by add_likes.
+BULK_LIKE_MAX_ITEMS = 500
+
+# Write-behind mode for add_like and add_likes (blog.like_buffer.LikeBuffer).
+# Accepted likes are spooled to LIKE_BUFFER_SPOOL_DIR (one file per process)
+# and flushed in batches of up to LIKE_BUFFER_MAX_PENDING or every
+# LIKE_BUFFER_FLUSH_INTERVAL seconds. Pending likes are merged into reads
+# served by the same process only; other workers see them once flushed, so
+# with several workers a user may not see their own like for up to
+# LIKE_BUFFER_FLUSH_INTERVAL.
+LIKE_WRITE_BEHIND = False
+LIKE_BUFFER_SPOOL_DIR = BASE_DIR / '.spool' / 'likes'
+LIKE_BUFFER_MAX_PENDING = 500
+LIKE_BUFFER_FLUSH_INTERVAL = 1.0
+LIKE_BUFFER_FSYNC = True
+
+# all_post?stream=1 writes the page straight from a server-side cursor, so it
+# accepts much larger pages.
+FEED_STREAM_MAX_PAGE_SIZE = 10000
+FEED_STREAM_CHUNK_SIZE = 500
+
+# JSON rendering and parsing go through orjson when it is installed
+# (blog.renderers, blog.parsers); output is identical to DRF's JSON classes.
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'blog.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'blog.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Per-request SQL metrics (blog.middleware.QueryMetricsMiddleware). Sampled
+# requests get a Server-Timing header and feed the histograms on /metrics,
+# which requires "Authorization: Bearer <METRICS_BEARER_TOKEN>". Set the token
+# before deploying: without one /metrics is a 404 unless DEBUG is on.
+METRICS_SAMPLE_RATE = 1.0
+METRICS_SERVER_TIMING = True
+METRICS_BEARER_TOKEN = None
+
+# purge_deleted: users, posts and likes deleted more than PURGE_DELETED_AFTER_DAYS
+# ago are archived (or hard-deleted) in PURGE_BATCH_SIZE row transactions with
+# PURGE_BATCH_PAUSE seconds between them. A purged user's posts go with them,
+# including the ones still live.
+PURGE_DELETED_AFTER_DAYS = 30
+PURGE_BATCH_SIZE = 500
+PURGE_BATCH_PAUSE = 0.1
+
+# Per-client token buckets for write endpoints (blog.middleware.ThrottleMiddleware),
+# keyed on the Token header or, without one, the client address. Rates are
+# "<requests>/<period>" and also set the burst size. Buckets are per process
+# unless THROTTLE_CACHE_ALIAS names a cache shared by all workers.
+THROTTLE_RATES = {
+    'add_user': '10/min',
+    'login': '10/min',
+    'add_post': '30/min',
+    'add_like': '120/min',
+    'async_add_like': '120/min',
+    'add_likes': '30/min',
+    'user_update': '30/min',
+    'post_update': '60/min',
+    'delete_user': '10/min',
+    'delete_post': '30/min',
+}
+THROTTLE_CACHE_ALIAS = None
+
+# Load shedding of the throttled endpoints (blog.throttling.LoadShedder): 503
+# while more than SHED_MAX_IN_FLIGHT requests to them run in the process, or
+# while the sampled average query time exceeds SHED_DB_LATENCY seconds. None
+# disables either check.
+SHED_MAX_IN_FLIGHT = 64
+SHED_DB_LATENCY = 0.05
+SHED_DECAY_HALF_LIFE = 5
+
+# Trending posts (blog.trending): each like is worth 1 when it happens and
+# half as much every TRENDING_HALF_LIFE seconds after. recompute_trending
+# rebuilds the scores from the likes of the last TRENDING_WINDOW seconds;
+# run it from cron every few minutes.
+TRENDING_HALF_LIFE = 6 * 60 * 60
+TRENDING_WINDOW = 3 * 24 * 60 * 60
+
+# Daily like rollups (blog.rollups) behind the analytics endpoints. rollup_likes
+# counts ROLLUP_BATCH_SIZE likes per transaction and leaves likes younger than
+# ROLLUP_LAG seconds for its next run; run it from cron.
+ROLLUP_BATCH_SIZE = 5000
+ROLLUP_LAG = 60
+ANALYTICS_MAX_DAYS = 366